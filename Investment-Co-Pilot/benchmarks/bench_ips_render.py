@@ -0,0 +1,79 @@
+"""
+bench_ips_render.py
+
+Micro-benchmark for `generate_ips_markdown`: time per render (timeit) and
+peak memory allocated while rendering (tracemalloc; intermediate strings and
+dicts included), over a few representative profiles.
+
+Usage:
+    python benchmarks/bench_ips_render.py [--number 20000]
+"""
+import argparse
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution.generate_ips import generate_ips_markdown
+
+
+PROFILES = {
+    "lifecycle": dict(
+        age=35, region="EU", esg_preference=False,
+        goals={"liquidity": "Emergency Fund", "longevity": "Retirement"},
+        wealth_context={"housing_status": "own", "income_stability": "stable", "risk_profile": "moderate"},
+        allocation={
+            "equity_pct": 76, "bonds_pct": 19, "fun_bucket_pct": 5, "strategy": "LIFECYCLE_V2",
+            "housing_adjustment": True,
+            "trace": [
+                "1. Starting Capital: 95% (after 5% Fun Bucket)",
+                "2. Base Equity Ratio: 90% (Age 35, Risk 'moderate')",
+                "3. Housing Adjustment: -10% (Real Estate exposure adjustment)",
+                "4. Final Equity: 76%",
+            ],
+        },
+    ),
+    "legacy": dict(
+        age=70, region="US", esg_preference=True,
+        goals={"liquidity": "Emergency Fund", "longevity": "Legacy"},
+        wealth_context={"housing_status": "rent", "has_high_interest_debt": True},
+        allocation={"equity_pct": 100, "bonds_pct": 0, "fun_bucket_pct": 0, "strategy": "LEGACY_GROWTH"},
+    ),
+    "defaults": dict(),
+}
+
+
+def measure(kwargs: dict, number: int) -> dict:
+    render = lambda: generate_ips_markdown(**kwargs)
+    render()  # Warm up
+    seconds = min(timeit.repeat(render, number=number, repeat=5)) / number
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    document = render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_render": seconds * 1e6,
+        "peak_kb": (peak - before) / 1024,
+        "output_kb": len(document.encode("utf-8")) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IPS rendering.")
+    parser.add_argument("--number", type=int, default=20000, help="Renders per timing run")
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'us/render':>10} {'peak KB':>9} {'output KB':>10}")
+    for name, kwargs in PROFILES.items():
+        result = measure(kwargs, args.number)
+        print(f"{name:<12} {result['us_per_render']:>10.2f} {result['peak_kb']:>9.1f} {result['output_kb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+bench_rebalance_solver.py
+
+Benchmark for the N-asset-class rebalancer: time to solve a book of portfolios
+in one vectorized pass, across class counts, plus the per-portfolio cost.
+
+Usage:
+    python benchmarks/bench_rebalance_solver.py [--portfolios 100000] [--classes 2 3 5 10 20]
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from execution.rebalance_solver import solve_rebalance
+
+
+def book(portfolios: int, classes: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    values = rng.exponential(10_000, (portfolios, classes))
+    targets = rng.dirichlet(np.ones(classes), portfolios) * 100
+    cash = rng.choice([0.0, 0.0, 1_000.0, 10_000.0], portfolios)
+    return values, targets, cash
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rebalance solver.")
+    parser.add_argument("--portfolios", type=int, default=100_000, help="Portfolios per solve")
+    parser.add_argument("--classes", type=int, nargs="+", default=[2, 3, 5, 10, 20], help="Asset class counts")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'classes':>7} {'ms/solve':>10} {'us/portfolio':>13} {'rebalanced':>11}")
+    for classes in args.classes:
+        values, targets, cash = book(args.portfolios, classes)
+        plan = solve_rebalance(values, targets, cash)  # Warm up
+        seconds = min(timeit.repeat(lambda: solve_rebalance(values, targets, cash), number=1, repeat=args.repeat))
+        print(
+            f"{classes:>7} {seconds * 1e3:>10.1f} {seconds * 1e6 / args.portfolios:>13.3f} "
+            f"{plan['rebalanced'].mean():>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
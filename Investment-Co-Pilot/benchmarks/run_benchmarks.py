@@ -0,0 +1,351 @@
+"""
+run_benchmarks.py
+
+Benchmark suite for the deterministic hot paths and the API:
+- `calculate_holistic_allocation` across the full input grid
+- `generate_ips_markdown` for each strategy
+- `build_ips_context`
+- `check_rebalancing`
+- the FastAPI endpoints through an in-process client
+- the orchestrator's `_process_response` (text, tool call, malformed-call fallback)
+
+Every operation is timed individually. For each benchmark the results give
+throughput and p50/p95/p99 latency, written as JSON (default
+`.tmp/benchmarks.json`). The results are then compared with the stored baseline
+(`benchmarks/baseline.json`). A benchmark whose p50 latency is more than
+--tolerance above the baseline counts as a regression, and the run exits with
+status 1. Throughput changes are reported too, but the mean behind them is too
+sensitive to outliers to gate on.
+
+Chat runs use the offline fake Gemini client from tests/fake_genai.py. Transcript
+logging and transcript reads (`orchestrator.read_session_messages`) are stubbed
+out, so no transcript or index file is written to logs/. Baselines depend on the
+machine: record one per machine with --save-baseline before comparing.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--only allocation api.chat] [--output results.json]
+    python benchmarks/run_benchmarks.py --save-baseline     # record this machine's numbers
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import numpy as np
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-key")
+
+from execution import api, orchestrator, rate_limit
+from execution.check_rebalancing import check_rebalancing
+from execution.confirmation import parse_confirmation
+from execution.data_mapper import build_ips_context
+from execution.financial_utils import calculate_holistic_allocation
+from execution.generate_ips import generate_ips_markdown
+from execution.session_store import SessionStore
+from tests.fake_genai import FakeClient, function_call_response, malformed_response, text_response
+
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+OUTPUT_PATH = Path(__file__).parent.parent / ".tmp" / "benchmarks.json"
+
+# Allocation input grid (quick mode keeps every 5th age)
+AGES = range(18, 101)
+RISKS = ("aggressive", "moderate", "conservative")
+GOALS = ("longevity", "legacy", "liquidity")
+HOUSING = ("rent", "own_no_mortgage", "own_with_mortgage")
+FUN_BUCKETS = (0, 5, 100)
+DEBT = (False, True)
+SAVINGS = (1, 6)
+
+# One profile per strategy the rules can produce
+STRATEGY_PROFILES = {
+    "DEBT_PAYOFF": dict(age=30, has_high_interest_debt=True),
+    "CASH_BUILDER": dict(age=30, months_savings=1),
+    "SPECULATION_ONLY": dict(age=30, fun_bucket_pct=100),
+    "LIQUIDITY_FOCUS": dict(age=45, goal="liquidity", region="US"),
+    "LEGACY_GROWTH": dict(age=70, goal="legacy", esg_preference=True),
+    "LIFECYCLE_V2": dict(age=35, risk_profile="moderate", housing_status="own_with_mortgage", fun_bucket_pct=5),
+}
+
+CONFIRMATION = """- **Age:** 44
+- **Region:** US
+- **Housing:** Own
+- **Goal:** Longevity
+- **Risk Profile:** Conservative
+- **Fun Bucket:** 2%
+- **ESG:** Yes"""
+
+
+def allocation_grid(quick: bool) -> list:
+    ages = AGES[::5] if quick else AGES
+    return [
+        dict(age=age, risk_profile=risk, goal=goal, housing_status=housing, fun_bucket_pct=fun,
+             has_high_interest_debt=debt, months_savings=savings)
+        for age, risk, goal, housing, fun, debt, savings in itertools.product(
+            ages, RISKS, GOALS, HOUSING, FUN_BUCKETS, DEBT, SAVINGS)
+    ]
+
+
+def sample(items: list, n: int, seed: int = 0) -> list:
+    return random.Random(seed).sample(items, min(n, len(items)))
+
+
+# Timing rounds per benchmark; the fastest round is reported (as with timeit's best-of-N)
+ROUNDS = 3
+
+
+def measure(op, inputs: list, setup=None, warmup: int = 20) -> dict:
+    """Times `op(x)` once per input (`setup(x)` runs untimed before each call), best of ROUNDS rounds."""
+    for x in inputs[:warmup]:
+        if setup is not None:
+            setup(x)
+        op(x)
+    clock = time.perf_counter
+    best = None
+    for _ in range(ROUNDS):
+        latencies = np.empty(len(inputs))
+        # As timeit does: no collector pauses inside the timed calls
+        gc.collect()
+        gc.disable()
+        try:
+            for i, x in enumerate(inputs):
+                if setup is not None:
+                    setup(x)
+                start = clock()
+                op(x)
+                latencies[i] = clock() - start
+        finally:
+            gc.enable()
+        if best is None or latencies.sum() < best.sum():
+            best = latencies
+    latencies = best
+    total = float(latencies.sum())
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e6
+    return {
+        "ops": len(inputs),
+        "seconds": round(total, 6),
+        "throughput_per_s": round(len(inputs) / total, 1) if total else 0.0,
+        "mean_us": round(total / len(inputs) * 1e6, 2),
+        "p50_us": round(float(p50), 2),
+        "p95_us": round(float(p95), 2),
+        "p99_us": round(float(p99), 2),
+    }
+
+
+# --- Benchmarks: each yields (name, result) ---
+
+def bench_allocation(quick: bool):
+    grid = allocation_grid(quick)
+    yield "allocation.rules_grid", measure(lambda args: calculate_holistic_allocation(**args), grid)
+
+
+def bench_ips(quick: bool):
+    number = 200 if quick else 2000
+    for strategy, args in STRATEGY_PROFILES.items():
+        context = build_ips_context(calculate_holistic_allocation(**args), args)
+        assert context["allocation"]["strategy"] == strategy, (strategy, context["allocation"]["strategy"])
+        yield f"ips.{strategy}", measure(lambda ctx: generate_ips_markdown(**ctx), [context] * number)
+
+
+def bench_build_ips_context(quick: bool):
+    grid = sample(allocation_grid(quick), 2000 if quick else 20000)
+    pairs = [(calculate_holistic_allocation(**args), args) for args in grid]
+    yield "build_ips_context", measure(lambda pair: build_ips_context(*pair), pairs)
+
+
+def bench_check_rebalancing(quick: bool):
+    rng = random.Random(0)
+    cases = []
+    for _ in range(5000 if quick else 50000):
+        equity = rng.randint(0, 100)
+        fun = rng.randint(0, 10)
+        cases.append((
+            {"equity_value": rng.uniform(0, 1e6), "bonds_value": rng.uniform(0, 1e6), "fun_value": rng.uniform(0, 5e4)},
+            {"equity_pct": equity, "bonds_pct": max(0, 100 - equity - fun), "fun_bucket_pct": fun},
+        ))
+    yield "check_rebalancing", measure(lambda case: check_rebalancing(case[0], case[1], 0), cases)
+
+
+@contextlib.contextmanager
+def offline_app():
+    """The API with the fake Gemini client, fresh sessions, no transcript reads or writes and no rate limit."""
+    patches = [
+        mock.patch.object(orchestrator, "_client", FakeClient()),
+        mock.patch.object(orchestrator, "_sessions", SessionStore(sizer=orchestrator.estimate_session_bytes)),
+        mock.patch.object(orchestrator, "_backend", None),
+        mock.patch.object(api, "log_message", lambda *args, **kwargs: None),
+        # New sessions would otherwise open (and create) logs/transcripts.index.sqlite3
+        mock.patch.object(orchestrator, "read_session_messages", lambda session_id: []),
+        mock.patch.object(rate_limit, "RATE_LIMIT_MAX_REQUESTS", 10 ** 9),
+        mock.patch.object(rate_limit, "RATE_LIMIT_IP_MAX_REQUESTS", 0),
+    ]
+    with contextlib.ExitStack() as stack:
+        for p in patches:
+            stack.enter_context(p)
+        yield
+
+
+def bench_api(quick: bool):
+    number = 200 if quick else 2000
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench")
+
+    def post(path):
+        def op(body):
+            response = loop.run_until_complete(client.post(path, json=body))
+            assert response.status_code == 200, (path, response.status_code, response.text)
+        return op
+
+    with offline_app():
+        yield "api.health", measure(lambda _: loop.run_until_complete(client.get("/health")), [None] * number)
+        allocations = [{"age": 18 + i % 80, "risk": RISKS[i % 3], "goal": GOALS[i % 3]} for i in range(number)]
+        yield "api.calculate_allocation", measure(post("/calculate-allocation"), allocations)
+        # A distinct name per request, so every document is rendered rather than served from the IPS cache
+        ips_bodies = [{
+            "name": f"Investor {i}", "age": 35, "wealth_context": {"housing_status": "own"},
+            "allocation": {"equity_pct": 76, "bonds_pct": 19, "fun_bucket_pct": 5},
+        } for i in range(number)]
+        yield "api.generate_ips", measure(post("/generate-ips"), ips_bodies)
+        rebalances = [{
+            "current_portfolio": {"equity_value": 70_000 + i, "bonds_value": 30_000, "fun_value": 1_000},
+            "target_allocation": {"equity_pct": 60, "bonds_pct": 35, "fun_bucket_pct": 5},
+        } for i in range(number)]
+        yield "api.check_rebalancing", measure(post("/check-rebalancing"), rebalances)
+        # Chat turns spread over a few sessions, so histories grow as in a real conversation
+        chats = [{"message": f"message {i}", "sessionId": f"bench-{i % 8}"} for i in range(number // 2)]
+        yield "api.chat", measure(post("/chat"), chats)
+    loop.run_until_complete(client.aclose())
+    loop.close()
+
+
+def bench_process_response(quick: bool):
+    number = 200 if quick else 2000
+    with offline_app():
+        chat = orchestrator.create_chat(session_id="bench-process")
+        reply = text_response("Thanks! How old are you, and which region do you invest from?")
+        yield "process_response.text", measure(chat._process_response, [reply] * number * 5)
+
+        # Tool calls over varied profiles; each runs on a fresh chat so histories stay the same size
+        tool_calls = [function_call_response("calculate_holistic_allocation", {"region": "EU", **args})
+                      for args in sample(allocation_grid(quick), number)]
+        reset = lambda _: setattr(chat, "chat", chat._create_chat([]))
+        yield "process_response.tool_call", measure(chat._process_response, tool_calls, setup=reset)
+
+        slots = parse_confirmation(CONFIRMATION)
+        def confirm(_):
+            chat._confirmed = dict(slots)
+        yield "process_response.malformed_fallback", measure(chat._process_response, [malformed_response()] * number,
+                                                             setup=confirm)
+
+
+BENCHMARKS = {
+    "allocation": bench_allocation,
+    "ips": bench_ips,
+    "build_ips_context": bench_build_ips_context,
+    "check_rebalancing": bench_check_rebalancing,
+    "api": bench_api,
+    "process_response": bench_process_response,
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Rows (name, p50 change, throughput change, regressed) for benchmarks present in both runs; p50 decides."""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        p50_change = result["p50_us"] / base["p50_us"] - 1 if base["p50_us"] else 0.0
+        throughput_change = result["throughput_per_s"] / base["throughput_per_s"] - 1 if base["throughput_per_s"] else 0.0
+        regressed = p50_change > tolerance
+        rows.append((name, p50_change, throughput_change, regressed))
+    return rows
+
+
+def main():
+    global ROUNDS
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against a baseline.")
+    parser.add_argument("--quick", action="store_true", help="Smaller grids and fewer repetitions (CI smoke run)")
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="Run benchmarks whose name starts with one of these")
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH, help="Where to write the JSON results")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="Baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="Timing rounds per benchmark (best is reported)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    ROUNDS = max(1, args.rounds)
+    results = {}
+    print(f"{'benchmark':<38} {'ops':>7} {'ops/s':>11} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}")
+    # The orchestrator logs every step; keep the report readable
+    with open(os.devnull, "w") as devnull:
+        for group, bench in BENCHMARKS.items():
+            if args.only and not any(group.startswith(p) or p.startswith(group) for p in args.only):
+                continue
+            runs = bench(args.quick)
+            while True:
+                with contextlib.redirect_stdout(devnull):
+                    item = next(runs, None)
+                if item is None:
+                    break
+                name, result = item
+                if args.only and not any(name.startswith(p) for p in args.only):
+                    continue
+                results[name] = result
+                print(f"{name:<38} {result['ops']:>7} {result['throughput_per_s']:>11,.0f} "
+                      f"{result['p50_us']:>10.1f} {result['p95_us']:>10.1f} {result['p99_us']:>10.1f}")
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["meta"].get("quick") != args.quick:
+        print("[WARN] Baseline and this run differ in --quick; workloads are not identical")
+    rows = compare(results, baseline["results"], args.tolerance)
+    print(f"\nCompared with {args.baseline} (recorded {baseline['meta']['created'][:10]}, tolerance {args.tolerance:.0%})")
+    print(f"{'benchmark':<38} {'p50':>9} {'ops/s':>9}")
+    for name, p50_change, throughput_change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<38} {p50_change:>+9.1%} {throughput_change:>+9.1%}{flag}")
+    regressions = [row[0] for row in rows if row[3]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,44 +1,74 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, model_validator
+from typing import Optional, Dict, List
+from contextlib import asynccontextmanager
+import io
 import json
 import os
 import subprocess
+import tempfile
+import time
 from dotenv import load_dotenv
-from execution.financial_utils import calculate_holistic_allocation, get_recommended_portfolio
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from execution.financial_utils import calculate_holistic_allocation
+from execution.batch_allocation import calculate_allocation_batch, glide_path, GLIDE_PATH_MAX_AGE
+from execution.check_rebalancing import DRIFT_THRESHOLD, check_rebalancing
+from execution.batch_rebalancing import check_rebalancing_batch
+from execution.rebalance_solver import plan_rebalance
 from execution.generate_ips import generate_ips_markdown
-from execution.orchestrator import create_chat
-from execution.logging_utils import log_message
+from execution.ips_cache import cached_generate_ips_markdown, get_ips_cache_stats
+from execution.batch_ips import (BATCH_IPS_MAX_BYTES, BATCH_IPS_SPOOL_BYTES, BATCH_IPS_WORKERS, generate_ips_batch, get_pool,
+                                 iter_jsonl, iter_zip, read_profiles, shutdown_pool)
+from execution.orchestrator import create_chat_async, get_session_stats, get_context_cache_stats, get_history_stats, clear_session
+from execution.logging_utils import log_message, flush_transcripts
+from execution.rate_limit import RateLimiter, create_rate_limit_backend, is_trusted_proxy
+from execution.metrics import HTTP_REQUEST_SECONDS, RATE_LIMITED, STAGE_SECONDS, render as render_metrics, timed
+from execution import profiling
 
 # Load environment variables
 load_dotenv()
 
 # --- Rate Limiting Setup ---
-import time
-_rate_limit_store = {}
-RATE_LIMIT_MAX_REQUESTS = 20
-RATE_LIMIT_WINDOW_SECONDS = 1800 # 30 minutes
+# Per-session, per-IP and global sliding-window limits (see rate_limit.py for configuration)
+_rate_limiter = RateLimiter(create_rate_limit_backend())
 
-def check_rate_limit(session_id: str) -> bool:
+def check_rate_limit(session_id: str, client_ip: Optional[str] = None) -> bool:
     """Returns True if request is allowed, False if rate limited."""
-    now = time.time()
-    if session_id not in _rate_limit_store:
-        _rate_limit_store[session_id] = []
-    
-    # Filter valid timestamps within window
-    timestamps = [t for t in _rate_limit_store[session_id] if now - t < RATE_LIMIT_WINDOW_SECONDS]
-    
-    # Check limit
-    if len(timestamps) >= RATE_LIMIT_MAX_REQUESTS:
-        return False
-        
-    # Update store
-    timestamps.append(now)
-    _rate_limit_store[session_id] = timestamps
-    return True
+    with timed(STAGE_SECONDS, session_id, stage="rate_limit"):
+        allowed = _rate_limiter.check(session_id, client_ip)
+    if not allowed:
+        RATE_LIMITED.inc()
+    return allowed
+
+def log_chat_message(session_id: str, role: str, message: str, metadata: Optional[dict] = None):
+    """`log_message`, timed as the transcript_log stage of the chat endpoints."""
+    with timed(STAGE_SECONDS, session_id, stage="transcript_log"):
+        log_message(session_id, role, message, metadata)
+
+def get_client_ip(request: Request) -> Optional[str]:
+    """
+    Client address for per-IP limits. Behind the Coolify/Traefik proxy the socket peer
+    is the proxy, so the last X-Forwarded-For hop (appended by the proxy) is used, but
+    only when the peer is one of TRUSTED_PROXIES; otherwise the header is client-controlled.
+    """
+    peer = request.client.host if request.client else None
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and is_trusted_proxy(peer):
+        return forwarded.split(",")[-1].strip()
+    return peer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Commit any transcript lines still queued in the background writer
+    flush_transcripts()
+    # Stop the batch IPS pool if a batch request started it
+    shutdown_pool()
 
-app = FastAPI(title="Investment Co-Pilot API", version="1.0.0")
+app = FastAPI(title="Investment Co-Pilot API", version="1.0.0", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -64,6 +94,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """
+    Per-route latency histogram (streamed responses are timed until the first byte),
+    plus the opt-in per-request profiler (see profiling.py).
+    """
+    start = time.perf_counter()
+    status = 500
+    profile = None
+    if profiling.PROFILING_ENABLED:
+        reason = profiling.profile_reason(request.url.path, request.headers)
+        if reason:
+            request_id = profiling.request_id_for(request.headers, reason)
+            profile = profiling.start(request_id, request.method, request.url.path, reason)
+    try:
+        if profile is None:
+            response = await call_next(request)
+        else:
+            with profiling.capture(profile):
+                response = await call_next(request)
+            response.headers["X-Profile-Id"] = profile.request_id
+        status = response.status_code
+        return response
+    finally:
+        if profile is not None:
+            profiling.finish(profile, status)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=route.path if route is not None else "unmatched", status=status)
+
 # --- Data Models ---
 class WealthContext(BaseModel):
     housing_status: str = "rent"
@@ -77,6 +137,60 @@ class AllocationRequest(BaseModel):
     goal: str = "longevity" # liquidity, longevity, legacy
     wealth_context: Optional[WealthContext] = None
 
+class BatchAllocationProfile(BaseModel):
+    age: int
+    risk: str = "moderate"
+    goal: str = "longevity"
+    fun_bucket_pct: int = 0
+    wealth_context: Optional[WealthContext] = None
+
+class BatchAllocationRequest(BaseModel):
+    profiles: List[BatchAllocationProfile]
+    include_trace: bool = False
+
+class PortfolioValues(BaseModel):
+    equity_value: float = 0
+    bonds_value: float = 0
+    fun_value: float = 0
+    cash_value: float = 0
+
+class RebalancingRequest(BaseModel):
+    id: Optional[str] = None
+    current_portfolio: PortfolioValues
+    target_allocation: Dict[str, float] # equity_pct, bonds_pct, fun_bucket_pct
+
+class BatchRebalancingRequest(BaseModel):
+    portfolios: List[RebalancingRequest]
+    threshold: float = DRIFT_THRESHOLD
+
+class SimulationResult(BaseModel):
+    """A `monte_carlo.simulate_outcomes` result, checked so the IPS section can be rendered."""
+    paths: int
+    years: int
+    seed: Optional[int] = None
+    allocation: Dict[str, float] = {}
+    initial_value: float
+    annual_contribution: float = 0
+    target_value: float
+    percentiles: Dict[int, List[float]] # percentile -> portfolio value for years 0..years
+    shortfall_probability: float
+    mean_final_value: Optional[float] = None
+
+    @model_validator(mode="after")
+    def check_shape(self):
+        if self.paths < 1 or self.years < 1:
+            raise ValueError("paths and years must be at least 1")
+        if not self.percentiles:
+            raise ValueError("percentiles must not be empty")
+        for pct, values in self.percentiles.items():
+            if not 0 <= pct <= 100:
+                raise ValueError(f"percentile {pct} is outside 0-100")
+            if len(values) != self.years + 1:
+                raise ValueError(f"percentile {pct} needs {self.years + 1} values (years 0..{self.years}), got {len(values)}")
+        if not 0 <= self.shortfall_probability <= 1:
+            raise ValueError("shortfall_probability must be between 0 and 1")
+        return self
+
 class IPSRequest(BaseModel):
     name: str = "Investor"
     age: int
@@ -85,6 +199,8 @@ class IPSRequest(BaseModel):
     goals: Dict[str, str] = {"liquidity": "Emergency Fund", "longevity": "Retirement"}
     wealth_context: WealthContext
     allocation: Dict[str, int]
+    simulation: Optional[SimulationResult] = None
+    glide_path: Optional[List[dict]] = None # batch_allocation.glide_path rows
 
 # --- Chat Models ---
 class ChatRequest(BaseModel):
@@ -99,18 +215,74 @@ class ChatRequest(BaseModel):
 def health_check():
     return {"status": "ok", "service": "Investment Co-Pilot"}
 
+def require_admin(request: Request):
+    """
+    Guards the admin endpoints (sessions, profiles) with PROFILE_ADMIN_KEY, sent as
+    `X-Admin-Key`. They answer 404 while no key is configured.
+    """
+    if not profiling.PROFILE_ADMIN_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="Invalid admin key.")
+
+@app.get("/sessions")
+def list_sessions(request: Request):
+    """Session store occupancy plus hit/miss/eviction counters (admin only)."""
+    require_admin(request)
+    return {**get_session_stats(), "rate_limit": _rate_limiter.stats(), "ips_cache": get_ips_cache_stats(),
+            "context_cache": get_context_cache_stats(), "history": get_history_stats()}
+
+@app.delete("/session/{session_id}")
+def delete_session(session_id: str, request: Request):
+    """Drops a chat session from memory and the persistent backend (admin only)."""
+    require_admin(request)
+    if not clear_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"status": "deleted", "session_id": session_id}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: request path histograms/counters plus store and cache gauges."""
+    sessions, context, history = get_session_stats(), get_context_cache_stats(), get_history_stats()
+    gauges = {
+        "copilot_sessions_in_memory": ("Chat sessions held in this process.", sessions["entries"]),
+        "copilot_sessions_bytes": ("Estimated bytes held by in-memory chat sessions.", sessions["bytes"]),
+        "copilot_context_cache_hit_rate": ("Share of prompt tokens served from the Gemini context cache.",
+                                           context.get("cache_hit_rate", 0.0)),
+        "copilot_history_tokens_saved": ("Estimated prompt tokens removed by history compaction.",
+                                         history.get("tokens_saved", 0)),
+    }
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiles")
+def list_request_profiles(request: Request):
+    """Stored request profiles, newest first."""
+    require_admin(request)
+    return {"profiles": profiling.list_profiles()}
+
+@app.get("/admin/profiles/{request_id}")
+def download_request_profile(request_id: str, request: Request, format: str = "prof", limit: int = 60):
+    """One stored profile: `format=prof` (pstats file) or `format=text` (top `limit` functions by cumulative time)."""
+    require_admin(request)
+    path = profiling.profile_path(request_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    if format == "text":
+        return PlainTextResponse(profiling.render_profile(path, limit=limit))
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
 @app.post("/chat")
-async def chat_endpoint(req: ChatRequest):
+async def chat_endpoint(req: ChatRequest, request: Request):
     """
     Orchestration Layer: Handles natural language conversation + Tool Calling.
     """
     try:
         # Rate Limit Check
-        if not check_rate_limit(req.sessionId):
+        if not check_rate_limit(req.sessionId, get_client_ip(request)):
             raise HTTPException(status_code=429, detail="Rate limit exceeded. Please try again later.")
 
         # Log user message immediately (before processing)
-        log_message(req.sessionId, "user", req.message, req.metadata)
+        log_chat_message(req.sessionId, "user", req.message, req.metadata)
 
         # Extract user context
         user_name = req.metadata.get("user_name") if req.metadata else None
@@ -118,13 +290,14 @@ async def chat_endpoint(req: ChatRequest):
         # Create chat session (stateful via memory)
         # We explicitly do NOT pass user_name to the orchestrator to ensure anonymity.
         # The agent will not know the user's name, preventing it from being sent to Gemini.
-        orchestrator = create_chat(session_id=req.sessionId, history=req.history, user_name=None)
+        orchestrator = await create_chat_async(session_id=req.sessionId, history=req.history, user_name=None)
 
-        # Send User Message through Orchestrator to ensure tool calling/fallbacks work
-        reply_text = orchestrator.send_message(req.message)
+        # Send User Message through Orchestrator to ensure tool calling/fallbacks work.
+        # Runs off the event loop so one slow Gemini call does not stall the worker.
+        reply_text = await orchestrator.send_message_async(req.message)
         
         # Log model response (after processing)
-        log_message(req.sessionId, "model", reply_text, req.metadata)
+        log_chat_message(req.sessionId, "model", reply_text, req.metadata)
 
         return {"reply": reply_text}
 
@@ -132,40 +305,178 @@ async def chat_endpoint(req: ChatRequest):
         print(f"Error: {e}")
         error_msg = "I'm having trouble connecting to my brain. Please try again."
         # Log error as model response
-        log_message(req.sessionId, "model", f"[ERROR] {str(e)}", req.metadata)
+        log_chat_message(req.sessionId, "model", f"[ERROR] {str(e)}", req.metadata)
         return {"reply": error_msg}
 
+def _sse(payload: dict, event: Optional[str] = None) -> str:
+    """Formats one Server-Sent Event frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(payload)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest, request: Request):
+    """
+    Streaming variant of /chat using Server-Sent Events.
+    
+    Emits `data: {"delta": ...}` frames while the reply is generated, then a
+    final `event: done` frame carrying the full reply (or `event: error`).
+    """
+    # Rate Limit Check (before the stream opens so the client gets a real 429)
+    if not check_rate_limit(req.sessionId, get_client_ip(request)):
+        raise HTTPException(status_code=429, detail="Rate limit exceeded. Please try again later.")
+
+    # Log user message immediately (before processing)
+    log_chat_message(req.sessionId, "user", req.message, req.metadata)
+
+    async def event_stream():
+        # Flush headers right away so the widget can show a typing state
+        yield ": stream-open\n\n"
+        chunks = []
+        try:
+            # Same anonymity rule as /chat: the user's name never reaches the orchestrator
+            orchestrator = await create_chat_async(session_id=req.sessionId, history=req.history, user_name=None)
+            async for delta in orchestrator.stream_message_async(req.message):
+                chunks.append(delta)
+                yield _sse({"delta": delta})
+
+            reply_text = "".join(chunks)
+            log_chat_message(req.sessionId, "model", reply_text, req.metadata)
+            yield _sse({"reply": reply_text}, event="done")
+
+        except Exception as e:
+            print(f"Error: {e}")
+            error_msg = "I'm having trouble connecting to my brain. Please try again."
+            log_chat_message(req.sessionId, "model", f"[ERROR] {str(e)}", req.metadata)
+            yield _sse({"reply": error_msg}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/calculate-allocation")
+@profiling.threaded
 def calculate_allocation(req: AllocationRequest):
 
     """
     Calculates the recommended asset allocation based on holistic profile.
     """
     try:
-        # Pydantic to Dict
-        wealth_ctx = req.wealth_context.dict() if req.wealth_context else {}
+        # Pydantic to Dict (housing, income stability, debt and savings are allocation inputs)
+        wealth_ctx = req.wealth_context.model_dump() if req.wealth_context else {}
         
         result = calculate_holistic_allocation(
             age=req.age,
             risk_profile=req.risk,
-            wealth_context=wealth_ctx,
-            goal=req.goal
+            goal=req.goal,
+            **wealth_ctx
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/calculate-allocation/batch")
+def calculate_allocation_batch_endpoint(req: BatchAllocationRequest):
+    """
+    Calculates allocations for a whole book of profiles in one vectorized pass.
+    Results are returned in request order; traces only when `include_trace` is set.
+    """
+    if not req.profiles:
+        return {"count": 0, "results": []}
+    try:
+        default_ctx = WealthContext()
+        columns = {
+            "age": [], "risk_profile": [], "goal": [], "fun_bucket_pct": [],
+            "housing_status": [], "has_high_interest_debt": [], "months_savings": []
+        }
+        for profile in req.profiles:
+            ctx = profile.wealth_context or default_ctx
+            columns["age"].append(profile.age)
+            columns["risk_profile"].append(profile.risk)
+            columns["goal"].append(profile.goal)
+            columns["fun_bucket_pct"].append(profile.fun_bucket_pct)
+            columns["housing_status"].append(ctx.housing_status)
+            columns["has_high_interest_debt"].append(ctx.has_high_interest_debt)
+            columns["months_savings"].append(ctx.months_savings)
+        
+        results = calculate_allocation_batch(columns, include_trace=req.include_trace)
+        return {"count": len(results), "results": results.to_dict(orient="records")}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/check-rebalancing")
+def check_rebalancing_endpoint(req: RebalancingRequest, solver: bool = False):
+    """
+    Checks one portfolio for drift against its target allocation (5% band).
+    With `solver=true` the trades come from the rebalance solver instead: `cash_value`
+    is invested first and only the trades needed to bring every class back inside
+    the band are proposed.
+    """
+    if solver:
+        report = plan_rebalance(req.current_portfolio.model_dump(), req.target_allocation)
+    else:
+        report = check_rebalancing(req.current_portfolio.model_dump(), req.target_allocation, 0)
+    if isinstance(report, str):
+        raise HTTPException(status_code=400, detail=report)
+    return report
+
+@app.post("/check-rebalancing/batch")
+def check_rebalancing_batch_endpoint(req: BatchRebalancingRequest):
+    """
+    Checks a whole book of portfolios in one vectorized pass.
+    Results are returned in request order with drift, status and signed trade amounts.
+    """
+    if not req.portfolios:
+        return {"count": 0, "results": []}
+    try:
+        columns = {name: [] for name in (
+            "id", "equity_value", "bonds_value", "fun_value", "cash_value",
+            "equity_pct", "bonds_pct", "fun_bucket_pct"
+        )}
+        for i, portfolio in enumerate(req.portfolios):
+            columns["id"].append(portfolio.id or str(i))
+            for name, value in portfolio.current_portfolio.model_dump().items():
+                columns[name].append(value)
+            for name in ("equity_pct", "bonds_pct", "fun_bucket_pct"):
+                columns[name].append(portfolio.target_allocation.get(name, 0))
+        
+        results = check_rebalancing_batch(columns, threshold=req.threshold)
+        return {"count": len(results), "results": results.to_dict(orient="records")}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/glide-path")
+def glide_path_endpoint(req: BatchAllocationProfile):
+    """
+    Returns the year-by-year allocation from the profile's age to 100 in one call.
+    Same profile fields as a batch allocation row.
+    """
+    try:
+        ctx = (req.wealth_context or WealthContext()).model_dump()
+        path = glide_path(
+            age=req.age,
+            risk_profile=req.risk,
+            goal=req.goal,
+            fun_bucket_pct=req.fun_bucket_pct,
+            **ctx
+        )
+        return {"from_age": req.age, "to_age": GLIDE_PATH_MAX_AGE, "path": path}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/generate-ips")
+@profiling.threaded
 def generate_ips(req: IPSRequest):
     """
     Generates the Markdown content for an IPS.
     """
     try:
         # Convert Pydantic object to simple dict for the utility function
-        data = req.dict()
+        data = req.model_dump()
         
-        # Generate Markdown
-        markdown_content = generate_ips_markdown(**data)
+        # Generate Markdown (identical inputs on the same day are served from the cache)
+        markdown_content = cached_generate_ips_markdown(**data)
         
         return {
             "status": "success",
@@ -175,6 +486,52 @@ def generate_ips(req: IPSRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-ips/batch")
+async def generate_ips_batch_endpoint(request: Request, format: str = "jsonl"):
+    """
+    Generates one IPS per profile in the request body and streams the results.
+    
+    Body: JSONL (one profile per line, same fields as the allocation tool plus
+    optional `id`/`name`), or CSV when sent with `Content-Type: text/csv`.
+    Response: `format=jsonl` (one result per line) or `format=zip` (one .md per
+    profile, errors/ and manifest.jsonl). Bad records are reported, not fatal.
+    Admin only; bodies over BATCH_IPS_MAX_BYTES are refused with 413.
+    """
+    require_admin(request)
+    if format not in ("jsonl", "zip"):
+        raise HTTPException(status_code=400, detail="format must be 'jsonl' or 'zip'")
+    too_large = HTTPException(status_code=413, detail=f"Upload exceeds {BATCH_IPS_MAX_BYTES} bytes.")
+    if int(request.headers.get("content-length") or 0) > BATCH_IPS_MAX_BYTES:
+        raise too_large
+    
+    # Spool the upload chunk by chunk (in memory up to BATCH_IPS_SPOOL_BYTES, then on disk)
+    # and parse it line by line from there, so the body is never held as one string.
+    # Writes may hit the disk, so they run on the threadpool, not the event loop.
+    spool = tempfile.SpooledTemporaryFile(max_size=BATCH_IPS_SPOOL_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > BATCH_IPS_MAX_BYTES:
+            spool.close()
+            raise too_large
+        await run_in_threadpool(spool.write, chunk)
+    spool.seek(0)
+    lines = io.TextIOWrapper(spool, encoding="utf-8", errors="replace", newline=None)
+    
+    input_fmt = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    records = read_profiles(lines, input_fmt)
+    pool = get_pool() if BATCH_IPS_WORKERS > 0 else None
+    results = generate_ips_batch(records, workers=BATCH_IPS_WORKERS, pool=pool)
+    
+    if format == "zip":
+        return StreamingResponse(
+            iter_zip(results),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="ips_batch.zip"'},
+            background=BackgroundTask(lines.close),
+        )
+    return StreamingResponse(iter_jsonl(results), media_type="application/x-ndjson", background=BackgroundTask(lines.close))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,254 @@
+"""
+backtest.py
+
+Historical backtest of rebalancing policies.
+
+Replays a local return series (CSV or NumPy file) against a target allocation
+and compares policies such as the 5% absolute band used by `check_rebalancing`,
+a 5/25 relative band, annual rebalancing and never rebalancing. Each policy is
+run over every rolling start date at once: the windows are a NumPy axis, and
+policies are spread over a process pool.
+
+Band policies call the drift helpers from check_rebalancing.py. The absolute
+band, like the live check, only tests the equity and bonds columns, so its
+trades happen in exactly the situations where the live check would report
+"Drift Detected". The relative band tests every class, the fun bucket included.
+
+Return files:
+    CSV:  optional `date` column, then one column of periodic returns (decimals)
+          per asset class, named like the allocation (equity, bonds, fun)
+    .npz: `returns` (periods x assets), `assets` (names), optional `dates`
+    .npy: returns (periods x assets) in equity, bonds, fun order
+
+Usage:
+    python -m execution.backtest --returns data/returns.csv --equity 80 --bonds 20 --window_years 10
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from execution.check_rebalancing import DRIFT_THRESHOLD, drift_pct
+
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+DEFAULT_ASSETS = ("equity", "bonds", "fun")
+
+# Columns whose drift `check_rebalancing` tests against the band
+BAND_ASSETS = ("equity", "bonds")
+
+# Policy name -> rule. "absolute": rebalance when equity or bonds drift more than `band`
+# percentage points; "relative": when any class drifts more than `band` points or
+# more than `relative` % of its own target;
+# "calendar": every `months`; "never": buy and hold.
+DEFAULT_POLICIES = {
+    "5% absolute band": {"type": "absolute", "band": DRIFT_THRESHOLD},
+    "5/25 relative band": {"type": "relative", "band": DRIFT_THRESHOLD, "relative": 25.0},
+    "annual": {"type": "calendar", "months": 12},
+    "never": {"type": "never"},
+}
+
+
+def load_returns(path: str) -> dict:
+    """Loads a periodic return series: {"assets": [...], "returns": (periods, assets), "dates": [...] or None}."""
+    path = str(path)
+    if path.endswith(".npz"):
+        data = np.load(path, allow_pickle=False)
+        dates = [str(d) for d in data["dates"]] if "dates" in data else None
+        return {"assets": [str(a) for a in data["assets"]], "returns": data["returns"].astype(np.float64), "dates": dates}
+    if path.endswith(".npy"):
+        returns = np.load(path, allow_pickle=False).astype(np.float64)
+        return {"assets": list(DEFAULT_ASSETS[:returns.shape[1]]), "returns": returns, "dates": None}
+
+    frame = pd.read_csv(path)
+    dates = frame.pop("date").astype(str).tolist() if "date" in frame.columns else None
+    return {"assets": list(frame.columns), "returns": frame.to_numpy(dtype=np.float64), "dates": dates}
+
+
+def target_weights(allocation: dict, assets) -> np.ndarray:
+    """Target % per asset column from an allocation dict (fun -> fun_bucket_pct), normalized to 100."""
+    targets = np.array([
+        allocation.get("fun_bucket_pct" if asset == "fun" else f"{asset}_pct", 0) for asset in assets
+    ], dtype=np.float64)
+    if targets.sum() <= 0:
+        raise ValueError("Allocation has no weight in any of the return series' asset classes")
+    return targets * 100.0 / targets.sum()
+
+
+def _breach(
+    policy: dict,
+    holdings: np.ndarray,
+    target_pct: np.ndarray,
+    period: int,
+    periods_per_year: int,
+    banded: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Which windows rebalance at the end of this period."""
+    kind = policy["type"]
+    if kind == "never":
+        return np.zeros(holdings.shape[0], dtype=bool)
+    if kind == "calendar":
+        every = max(1, round(policy.get("months", 12) * periods_per_year / 12))
+        return np.full(holdings.shape[0], (period + 1) % every == 0)
+
+    drift = np.abs(drift_pct(holdings, holdings.sum(axis=1, keepdims=True), target_pct))
+    limit = np.full_like(target_pct, policy.get("band", DRIFT_THRESHOLD))
+    if kind == "absolute":
+        if banded is not None:
+            drift, limit = drift[:, banded], limit[banded]
+    elif kind == "relative":
+        limit = np.minimum(limit, target_pct * policy["relative"] / 100.0)
+    else:
+        raise ValueError(f"Unknown policy type: {kind}")
+    return (drift > limit).any(axis=1)
+
+
+def run_policy(
+    policy: dict,
+    windows: np.ndarray,
+    target_pct: np.ndarray,
+    periods_per_year: int = 12,
+    banded: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Replays one policy over every window at once.
+
+    Args:
+        policy: One of the DEFAULT_POLICIES rules
+        windows: (windows, periods, assets) periodic returns
+        target_pct: Target % per asset (sums to 100)
+        banded: Which assets the absolute band tests (default: all of them)
+
+    Returns:
+        Per-window arrays: terminal_wealth (of 1 invested), trades, turnover
+        (one-way, as a fraction of the portfolio, summed) and tracking_error
+        (annualized, against a portfolio held exactly at target)
+    """
+    count, periods, _ = windows.shape
+    target = target_pct / 100.0
+    holdings = np.tile(target, (count, 1))
+    trades = np.zeros(count, dtype=np.int64)
+    turnover = np.zeros(count)
+    active = np.empty((count, periods))
+
+    for period in range(periods):
+        returns = windows[:, period, :]
+        value_before = holdings.sum(axis=1)
+        holdings = holdings * (1.0 + returns)
+        value = holdings.sum(axis=1)
+        active[:, period] = value / value_before - 1.0 - returns @ target
+
+        breach = _breach(policy, holdings, target_pct, period, periods_per_year, banded)
+        weights = holdings / value[:, None]
+        turnover += np.where(breach, np.abs(weights - target).sum(axis=1) / 2, 0.0)
+        trades += breach
+        holdings = np.where(breach[:, None], target * value[:, None], holdings)
+
+    return {
+        "terminal_wealth": holdings.sum(axis=1),
+        "trades": trades,
+        "turnover": turnover,
+        "tracking_error": active.std(axis=1) * np.sqrt(periods_per_year),
+    }
+
+
+def _run_policy_task(task: tuple) -> tuple:
+    """Worker entry point."""
+    name, policy, windows, target_pct, periods_per_year, banded = task
+    return name, run_policy(policy, windows, target_pct, periods_per_year, banded)
+
+
+def backtest(
+    series: dict,
+    allocation: dict,
+    policies: Optional[dict] = None,
+    window_years: int = 10,
+    step: int = 1,
+    periods_per_year: int = 12,
+    workers: int = BACKTEST_WORKERS,
+) -> list:
+    """
+    Compares rebalancing policies over rolling windows of a return series.
+
+    Args:
+        series: Output of `load_returns`
+        allocation: Target allocation (equity_pct, bonds_pct, fun_bucket_pct, ...)
+        policies: Policy name -> rule (default: DEFAULT_POLICIES)
+        window_years: Length of every window
+        step: Periods between window start dates
+        periods_per_year: 12 for monthly returns, 1 for yearly, ...
+        workers: Processes to spread the policies over (1 = in process)
+
+    Returns:
+        One summary dict per policy, in order: trades and one-way turnover per
+        year, tracking error against the target mix (annualized, %) and
+        terminal wealth of 1 invested (mean, median, 10th percentile)
+    """
+    policies = policies or DEFAULT_POLICIES
+    returns = np.asarray(series["returns"], dtype=np.float64)
+    target_pct = target_weights(allocation, series["assets"])
+    banded = np.isin(series["assets"], BAND_ASSETS)
+    length = window_years * periods_per_year
+    if length < 1 or length > len(returns):
+        raise ValueError(f"Window of {length} periods does not fit a series of {len(returns)}")
+
+    # (windows, periods, assets), one window per start date
+    windows = np.lib.stride_tricks.sliding_window_view(returns, length, axis=0)[::max(1, step)]
+    windows = np.ascontiguousarray(windows.transpose(0, 2, 1))
+
+    tasks = [(name, rule, windows, target_pct, periods_per_year, banded) for name, rule in policies.items()]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = dict(pool.map(_run_policy_task, tasks))
+    else:
+        results = dict(_run_policy_task(task) for task in tasks)
+
+    summaries = []
+    for name in policies:
+        result = results[name]
+        wealth = result["terminal_wealth"]
+        summaries.append({
+            "policy": name,
+            "windows": len(windows),
+            "trades_per_year": round(float(result["trades"].mean()) / window_years, 4),
+            "turnover_per_year_pct": round(float(result["turnover"].mean()) * 100 / window_years, 4),
+            "tracking_error_pct": round(float(result["tracking_error"].mean()) * 100, 4),
+            "terminal_wealth_mean": round(float(wealth.mean()), 4),
+            "terminal_wealth_median": round(float(np.median(wealth)), 4),
+            "terminal_wealth_p10": round(float(np.percentile(wealth, 10)), 4),
+        })
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest rebalancing policies on a historical return series.")
+    parser.add_argument("--returns", required=True, help="CSV, .npy or .npz file of periodic returns")
+    parser.add_argument("--equity", type=float, default=80, help="Target equity %")
+    parser.add_argument("--bonds", type=float, default=20, help="Target bonds %")
+    parser.add_argument("--fun", type=float, default=0, help="Target fun bucket %")
+    parser.add_argument("--window_years", type=int, default=10, help="Length of each rolling window")
+    parser.add_argument("--step", type=int, default=1, help="Periods between window start dates")
+    parser.add_argument("--periods_per_year", type=int, default=12, help="12 for monthly returns, 1 for yearly")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="Worker processes")
+    args = parser.parse_args()
+
+    series = load_returns(args.returns)
+    allocation = {"equity_pct": args.equity, "bonds_pct": args.bonds, "fun_bucket_pct": args.fun}
+    results = backtest(
+        series,
+        allocation,
+        window_years=args.window_years,
+        step=args.step,
+        periods_per_year=args.periods_per_year,
+        workers=args.workers,
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
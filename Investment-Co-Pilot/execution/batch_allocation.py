@@ -0,0 +1,199 @@
+"""
+batch_allocation.py
+
+Vectorized version of `calculate_holistic_allocation` for whole client books.
+Takes columnar profile inputs (NumPy arrays, lists or a pandas DataFrame) and
+computes every allocation in one pass. Results match the scalar function exactly:
+the same float ratios are multiplied and truncated toward zero.
+
+Traces are only built when requested (`include_trace=True`), by replaying the
+scalar function row by row.
+
+`glide_path` uses the same pass to produce the full year-by-year allocation from
+an age up to GLIDE_PATH_MAX_AGE. Paths are cached per profile class (every input
+except age, reduced to what the rules actually distinguish).
+"""
+from functools import lru_cache
+from typing import Mapping, Union
+
+import numpy as np
+import pandas as pd
+
+from execution.financial_utils import calculate_holistic_allocation
+
+
+# Input columns and the scalar function's defaults for any column left out
+BATCH_DEFAULTS = {
+    "age": None,  # Required
+    "risk_profile": "moderate",
+    "goal": "longevity",
+    "fun_bucket_pct": 0,
+    "housing_status": "rent",
+    "has_high_interest_debt": False,
+    "months_savings": 6,
+}
+
+GLIDE_PATH_MAX_AGE = 100
+GLIDE_PATH_CACHE_SIZE = 256
+
+def _columns(profiles: Union[pd.DataFrame, Mapping, None], overrides: dict) -> pd.DataFrame:
+    """Normalizes inputs into a DataFrame with every batch column present."""
+    frame = pd.DataFrame(profiles if profiles is not None else {}).copy()
+    for name, values in overrides.items():
+        frame[name] = values
+    if "age" not in frame.columns:
+        raise ValueError("Batch allocation requires an 'age' column")
+    for name, default in BATCH_DEFAULTS.items():
+        if name not in frame.columns:
+            frame[name] = default
+        elif default is not None:
+            frame[name] = frame[name].fillna(default)
+    return frame
+
+
+def calculate_allocation_batch(
+    profiles: Union[pd.DataFrame, Mapping, None] = None,
+    include_trace: bool = False,
+    **columns,
+) -> pd.DataFrame:
+    """
+    Calculates allocations for many investor profiles at once.
+
+    Args:
+        profiles: DataFrame or mapping of column -> array with any of the columns
+            in BATCH_DEFAULTS (`age` is required)
+        include_trace: Also return the scalar function's `trace` for every row
+        **columns: Individual columns as arrays (override `profiles`)
+
+    Returns:
+        DataFrame (same index as the input) with equity_pct, bonds_pct,
+        fun_bucket_pct, strategy and housing_adjustment columns, plus `trace`
+        if requested
+    """
+    frame = _columns(profiles, columns)
+
+    age = frame["age"].to_numpy(dtype=np.int64)
+    fun = frame["fun_bucket_pct"].to_numpy(dtype=np.int64)
+    months = frame["months_savings"].to_numpy(dtype=np.float64)
+    debt = frame["has_high_interest_debt"].to_numpy(dtype=bool)
+    risk = frame["risk_profile"].astype(str).to_numpy()
+    goal = frame["goal"].astype(str).str.lower().to_numpy()
+    owns = frame["housing_status"].astype(str).str.lower().str.startswith("own").to_numpy()
+
+    # Gates, in the scalar function's priority order
+    is_debt = debt
+    is_cash = ~is_debt & (months < 3)
+    is_spec = ~is_debt & ~is_cash & (fun >= 100)
+    invests = ~(is_debt | is_cash | is_spec)
+    is_liquidity = invests & (goal == "liquidity")
+    is_legacy = invests & (goal == "legacy")
+    is_lifecycle = invests & ~is_liquidity & ~is_legacy
+
+    # Lifecycle base ratio by risk profile and age band
+    aggressive = np.select([age < 55, age < 65], [1.0, 0.9], 0.75)
+    conservative = np.select([age < 50, age < 65], [0.8, 0.65], 0.50)
+    moderate = np.select([age < 50, age < 65], [0.9, 0.75], 0.65)
+    ratio = np.select([risk == "aggressive", risk == "conservative"], [aggressive, conservative], moderate)
+    housing_adjustment = is_lifecycle & owns
+    ratio = np.where(housing_adjustment, np.maximum(0.40, ratio - 0.10), ratio)
+    ratio = np.select([is_liquidity, is_legacy], [0.20, 1.0], ratio)
+
+    remaining = 100 - fun
+    equity = np.trunc(remaining * ratio).astype(np.int64)
+    bonds = remaining - equity
+
+    equity = np.where(invests, equity, 0)
+    bonds = np.where(invests, bonds, 0)
+    fun_out = np.select([is_debt | is_cash, is_spec], [0, 100], fun)
+    strategy = np.select(
+        [is_debt, is_cash, is_spec, is_liquidity, is_legacy],
+        ["DEBT_PAYOFF", "CASH_BUILDER", "SPECULATION_ONLY", "LIQUIDITY_FOCUS", "LEGACY_GROWTH"],
+        "LIFECYCLE_V2",
+    )
+
+    result = pd.DataFrame(
+        {
+            "equity_pct": equity,
+            "bonds_pct": bonds,
+            "fun_bucket_pct": fun_out,
+            "strategy": strategy,
+            "housing_adjustment": housing_adjustment,
+        },
+        index=frame.index,
+    )
+    if include_trace:
+        result["trace"] = [allocation_trace(row) for row in frame.to_dict(orient="records")]
+    return result
+
+
+def allocation_trace(profile: dict) -> list:
+    """Explains a single row by running the scalar rules on it."""
+    kwargs = {name: profile.get(name, default) for name, default in BATCH_DEFAULTS.items()}
+    kwargs["age"] = int(kwargs["age"])
+    kwargs["fun_bucket_pct"] = int(kwargs["fun_bucket_pct"])
+    kwargs["has_high_interest_debt"] = bool(kwargs["has_high_interest_debt"])
+    return calculate_holistic_allocation(**kwargs)["trace"]
+
+
+def read_profiles(path: str) -> pd.DataFrame:
+    """Loads a profile book from CSV or JSON Lines (by file extension)."""
+    if str(path).endswith((".jsonl", ".ndjson")):
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+
+@lru_cache(maxsize=GLIDE_PATH_CACHE_SIZE)
+def _glide_path_for_class(risk_profile: str, goal: str, fun_bucket_pct: int, owns_home: bool,
+                          has_high_interest_debt: bool, low_savings: bool) -> tuple:
+    """Allocations for every age 0..GLIDE_PATH_MAX_AGE of one profile class (cached)."""
+    ages = np.arange(GLIDE_PATH_MAX_AGE + 1)
+    results = calculate_allocation_batch(
+        age=ages,
+        risk_profile=risk_profile,
+        goal=goal,
+        fun_bucket_pct=fun_bucket_pct,
+        housing_status="own" if owns_home else "rent",
+        has_high_interest_debt=has_high_interest_debt,
+        months_savings=0 if low_savings else 6,
+    )
+    return tuple(
+        {
+            "age": int(age),
+            "equity_pct": int(row["equity_pct"]),
+            "bonds_pct": int(row["bonds_pct"]),
+            "fun_bucket_pct": int(row["fun_bucket_pct"]),
+            "strategy": str(row["strategy"]),
+        }
+        for age, row in zip(ages, results.to_dict(orient="records"))
+    )
+
+
+def glide_path(
+    age: int,
+    risk_profile: str = "moderate",
+    goal: str = "longevity",
+    fun_bucket_pct: int = 0,
+    housing_status: str = "rent",
+    has_high_interest_debt: bool = False,
+    months_savings: int = 6,
+    **kwargs
+) -> list:
+    """
+    Year-by-year allocation from `age` to GLIDE_PATH_MAX_AGE, one row per age.
+    Takes the same arguments as `calculate_holistic_allocation` (others are ignored).
+    """
+    goal = str(goal).lower()
+    profile_class = (
+        risk_profile if risk_profile in ("aggressive", "conservative") else "moderate",
+        goal if goal in ("liquidity", "legacy") else "longevity",
+        int(fun_bucket_pct),
+        str(housing_status).lower().startswith("own"),
+        bool(has_high_interest_debt),
+        months_savings < 3,
+    )
+    path = _glide_path_for_class(*profile_class)
+    return [dict(row) for row in path[max(0, int(age)):]]
+
+
+def glide_path_cache_info():
+    return _glide_path_for_class.cache_info()
@@ -0,0 +1,298 @@
+"""
+batch_ips.py
+
+Bulk IPS generation for advisor onboarding.
+
+Profiles are read one line at a time from JSONL or CSV (the same fields the
+`calculate_holistic_allocation` tool takes, plus an optional `id` or `name`),
+run through the allocation -> IPS chain on a process pool, and written out as
+they complete, in input order, to a JSONL or zip stream. Only a bounded window of
+records is in flight at any time, so memory stays flat however large the export.
+A bad record produces an error entry instead of stopping the run.
+
+Workers are started with BATCH_IPS_START_METHOD (forkserver where available,
+else spawn), never by forking the caller: the API process runs threads, and a
+forked child can inherit one of their locks held and deadlock. The API shares
+one pool (`get_pool`) across requests, created by the first batch request.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from execution.data_mapper import build_ips_context
+from execution.financial_utils import calculate_holistic_allocation
+from execution.generate_ips import generate_ips_markdown
+
+
+BATCH_IPS_WORKERS = int(os.getenv("BATCH_IPS_WORKERS", str(os.cpu_count() or 1)))
+BATCH_IPS_CHUNK_SIZE = int(os.getenv("BATCH_IPS_CHUNK_SIZE", "16"))
+# Uploads to the batch endpoint are spooled in memory up to this size, then to disk
+BATCH_IPS_SPOOL_BYTES = int(os.getenv("BATCH_IPS_SPOOL_BYTES", str(8 * 1024 * 1024)))
+# Larger uploads are refused (413)
+BATCH_IPS_MAX_BYTES = int(os.getenv("BATCH_IPS_MAX_BYTES", str(64 * 1024 * 1024)))
+BATCH_IPS_START_METHOD = os.getenv(
+    "BATCH_IPS_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# CSV cells are text; these columns are coerced (everything else stays a string)
+_INT_FIELDS = ("age", "fun_bucket_pct", "months_savings")
+_BOOL_FIELDS = ("esg_preference", "has_high_interest_debt", "has_pension")
+_ID_FIELDS = ("id", "name")
+
+# (line number, profile dict or None, parse error or None)
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered in ("true", "yes", "y", "1"):
+        return True
+    if lowered in ("false", "no", "n", "0"):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _profile_from_csv_row(row: dict) -> dict:
+    profile = {}
+    for field, value in row.items():
+        if field is None or value is None or value.strip() == "":
+            continue  # Empty cells fall back to the tool defaults
+        if field in _INT_FIELDS:
+            profile[field] = int(value)
+        elif field in _BOOL_FIELDS:
+            profile[field] = _parse_bool(value)
+        else:
+            profile[field] = value.strip()
+    return profile
+
+
+def read_profiles(stream: Iterable[str], fmt: str = "jsonl") -> Iterator[Record]:
+    """
+    Yields (line_number, profile, error) one record at a time from a text stream
+    (or any iterable of lines). Lines that cannot be parsed come back with
+    `profile=None` and the reason.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            try:
+                yield reader.line_num, _profile_from_csv_row(row), None
+            except ValueError as e:
+                yield reader.line_num, None, f"ValueError: {e}"
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            profile = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(profile, dict):
+            yield line_number, None, "Each line must be a JSON object"
+            continue
+        yield line_number, profile, None
+
+
+def render_profile(profile: dict) -> dict:
+    """Runs one profile through the same allocation -> IPS chain as the chat tool."""
+    args = {k: v for k, v in profile.items() if k not in _ID_FIELDS}
+    allocation = calculate_holistic_allocation(**args)
+    markdown = generate_ips_markdown(**build_ips_context(allocation, args))
+    return {"allocation": allocation, "markdown": markdown}
+
+
+def _render_chunk(chunk: List[Record]) -> List[dict]:
+    """Worker entry point: renders a chunk of records, capturing per-record errors."""
+    results = []
+    for line_number, profile, error in chunk:
+        result = {"line": line_number}
+        if profile is not None:
+            result["id"] = str(profile.get("id") or profile.get("name") or f"record-{line_number}")
+        if error is None:
+            try:
+                rendered = render_profile(profile)
+                result.update(status="ok", strategy=rendered["allocation"]["strategy"], **rendered)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        if error is not None:
+            result.update(status="error", error=error)
+        results.append(result)
+    return results
+
+
+def _chunks(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def create_pool(workers: int = BATCH_IPS_WORKERS) -> ProcessPoolExecutor:
+    """A process pool whose workers start from a fresh interpreter (BATCH_IPS_START_METHOD)."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(BATCH_IPS_START_METHOD))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Returns the process-wide pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_pool()
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stops the process-wide pool (call on shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def generate_ips_batch(
+    records: Iterable[Record],
+    workers: int = BATCH_IPS_WORKERS,
+    chunk_size: int = BATCH_IPS_CHUNK_SIZE,
+    max_in_flight: Optional[int] = None,
+    pool: Optional[Executor] = None,
+) -> Iterator[dict]:
+    """
+    Renders records on a process pool and yields results in input order.
+
+    Args:
+        records: Output of `read_profiles`
+        workers: Worker processes (0 renders in the calling process)
+        chunk_size: Records sent to a worker per task
+        max_in_flight: Chunks submitted but not yet yielded (default 2 per worker)
+        pool: Shared pool to submit to (left running); by default a pool of
+            `workers` processes is started for this run
+    """
+    chunks = _chunks(records, max(1, chunk_size))
+    if workers <= 0:
+        for chunk in chunks:
+            yield from _render_chunk(chunk)
+        return
+
+    own_pool = create_pool(workers) if pool is None else None
+    window = max_in_flight or 2 * workers
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append((pool or own_pool).submit(_render_chunk, chunk))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # A client that disconnects mid-stream must not leave its chunks queued on a shared pool
+        for future in pending:
+            future.cancel()
+        if own_pool is not None:
+            own_pool.shutdown()
+
+
+def _summary(result: dict) -> dict:
+    """A result without its (large) markdown body."""
+    return {k: v for k, v in result.items() if k != "markdown"}
+
+
+def iter_jsonl(results: Iterable[dict]) -> Iterator[bytes]:
+    """One JSON line per record (errors included)."""
+    for result in results:
+        yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile streams into; drained after each entry."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", value).strip("._")[:80] or "record"
+
+
+def iter_zip(results: Iterable[dict]) -> Iterator[bytes]:
+    """
+    A zip archive streamed entry by entry: one `<line>-<id>.md` per IPS, one
+    `errors/<line>.json` per failed record, and a closing `manifest.jsonl`
+    summary written from a temporary spool.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive, \
+            tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as manifest:
+        for result in results:
+            prefix = f"{result['line']:06d}"
+            if result["status"] == "ok":
+                name = f"{prefix}-{_safe_name(result['id'])}.md"
+                archive.writestr(name, result["markdown"])
+            else:
+                name = f"errors/{prefix}.json"
+                archive.writestr(name, json.dumps(result, ensure_ascii=False, indent=2))
+            manifest.write((json.dumps({**_summary(result), "file": name}, ensure_ascii=False) + "\n").encode("utf-8"))
+            yield sink.drain()
+
+        manifest.seek(0)
+        info = zipfile.ZipInfo("manifest.jsonl", date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w") as entry:
+            for block in iter(lambda: manifest.read(64 * 1024), b""):
+                entry.write(block)
+                yield sink.drain()
+    yield sink.drain()
+
+
+def write_batch(input_path: str, output_path: str, workers: int = BATCH_IPS_WORKERS) -> dict:
+    """CLI helper: renders every profile in `input_path` into `output_path` (.zip or .jsonl)."""
+    fmt = "csv" if input_path.lower().endswith(".csv") else "jsonl"
+    counts = {"ok": 0, "error": 0}
+
+    def counted(results):
+        for result in results:
+            counts[result["status"]] += 1
+            yield result
+
+    with open(input_path, "r", encoding="utf-8", newline="") as source:
+        results = counted(generate_ips_batch(read_profiles(source, fmt), workers=workers))
+        stream = iter_zip(results) if output_path.lower().endswith(".zip") else iter_jsonl(results)
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output_path, "wb") as out:
+            for block in stream:
+                out.write(block)
+    return counts
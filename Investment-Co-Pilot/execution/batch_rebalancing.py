@@ -0,0 +1,149 @@
+"""
+batch_rebalancing.py
+
+Vectorized version of `check_rebalancing` for the nightly sweep over every account.
+Takes columnar holdings and targets (NumPy arrays, lists or a pandas DataFrame) and
+computes drift, band breaches and trade amounts for all portfolios in one pass,
+using the same drift helpers as the single-portfolio check.
+
+Files are processed in chunks (`iter_rebalancing_file`), so a full account export
+streams through in constant memory.
+"""
+import json
+import sys
+from typing import Iterator, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from execution.check_rebalancing import DRIFT_THRESHOLD, current_pct, drift_pct, trade_amount
+
+
+# Input columns and their defaults (holdings in currency, targets in %)
+BATCH_COLUMNS = {
+    "equity_value": 0.0,
+    "bonds_value": 0.0,
+    "fun_value": 0.0,
+    "cash_value": 0.0,
+    "equity_pct": 0.0,
+    "bonds_pct": 0.0,
+    "fun_bucket_pct": 0.0,
+}
+
+BATCH_CHUNK_SIZE = 100_000
+
+
+def _columns(portfolios: Union[pd.DataFrame, Mapping, None], overrides: dict) -> pd.DataFrame:
+    """Normalizes inputs into a DataFrame with every batch column present."""
+    frame = pd.DataFrame(portfolios if portfolios is not None else {}).copy()
+    for name, values in overrides.items():
+        frame[name] = values
+    for name, default in BATCH_COLUMNS.items():
+        if name not in frame.columns:
+            frame[name] = default
+        else:
+            frame[name] = frame[name].fillna(default)
+    return frame
+
+
+def check_rebalancing_batch(
+    portfolios: Union[pd.DataFrame, Mapping, None] = None,
+    threshold: float = DRIFT_THRESHOLD,
+    **columns,
+) -> pd.DataFrame:
+    """
+    Checks many portfolios against their targets at once.
+
+    Args:
+        portfolios: DataFrame or mapping of column -> array with any of the columns
+            in BATCH_COLUMNS (missing columns default to 0)
+        threshold: Absolute drift (percentage points) that triggers a rebalance
+        **columns: Individual columns as arrays or scalars (override `portfolios`),
+            e.g. `equity_pct=80` to check every portfolio against one target
+
+    Returns:
+        DataFrame (same index as the input). Any extra input columns (account ids)
+        come first, then invested_value, current/drift percentages, status
+        ("Balanced", "Drift Detected" or "Empty"), signed trade amounts
+        (positive = buy, only when drift is detected), net_trade and cash_shortfall.
+    """
+    frame = _columns(portfolios, columns)
+
+    equity = frame["equity_value"].to_numpy(dtype=np.float64)
+    bonds = frame["bonds_value"].to_numpy(dtype=np.float64)
+    fun = frame["fun_value"].to_numpy(dtype=np.float64)
+    cash = frame["cash_value"].to_numpy(dtype=np.float64)
+    target_equity = frame["equity_pct"].to_numpy(dtype=np.float64)
+    target_bonds = frame["bonds_pct"].to_numpy(dtype=np.float64)
+
+    invested = equity + bonds + fun
+    empty = invested == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        equity_pct = np.where(empty, 0.0, current_pct(equity, invested))
+        bonds_pct = np.where(empty, 0.0, current_pct(bonds, invested))
+        fun_pct = np.where(empty, 0.0, current_pct(fun, invested))
+        equity_drift = np.where(empty, 0.0, drift_pct(equity, invested, target_equity))
+        bonds_drift = np.where(empty, 0.0, drift_pct(bonds, invested, target_bonds))
+
+    breach = ~empty & ((np.abs(equity_drift) > threshold) | (np.abs(bonds_drift) > threshold))
+    equity_trade = np.where(breach, trade_amount(equity, invested, target_equity), 0.0)
+    bonds_trade = np.where(breach, trade_amount(bonds, invested, target_bonds), 0.0)
+    # The fun bucket is never traded, so net buys have to come out of cash
+    net_trade = equity_trade + bonds_trade
+
+    result = frame[[c for c in frame.columns if c not in BATCH_COLUMNS]].copy()
+    result["invested_value"] = invested
+    result["equity_current_pct"] = np.round(equity_pct, 2)
+    result["bonds_current_pct"] = np.round(bonds_pct, 2)
+    result["fun_current_pct"] = np.round(fun_pct, 2)
+    result["equity_drift"] = np.round(equity_drift, 2)
+    result["bonds_drift"] = np.round(bonds_drift, 2)
+    result["status"] = np.select([empty, breach], ["Empty", "Drift Detected"], "Balanced")
+    result["equity_trade"] = np.round(equity_trade, 2)
+    result["bonds_trade"] = np.round(bonds_trade, 2)
+    result["net_trade"] = np.round(net_trade, 2)
+    result["cash_shortfall"] = np.round(np.maximum(0.0, net_trade - cash), 2)
+    return result
+
+
+def iter_rebalancing_file(
+    path: str,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    threshold: float = DRIFT_THRESHOLD,
+) -> Iterator[pd.DataFrame]:
+    """Checks a CSV or JSON Lines account export (by file extension) chunk by chunk."""
+    if str(path).endswith((".jsonl", ".ndjson")):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield check_rebalancing_batch(chunk, threshold=threshold)
+
+
+def write_rebalancing_batch(
+    input_path: str,
+    output_path: Optional[str] = None,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    threshold: float = DRIFT_THRESHOLD,
+) -> dict:
+    """
+    CLI helper: streams results to `output_path` (CSV, or JSON Lines for .jsonl;
+    CSV on stdout if omitted). Returns the count per status.
+    """
+    as_jsonl = bool(output_path) and output_path.endswith((".jsonl", ".ndjson"))
+    out = open(output_path, "w", encoding="utf-8", newline="") if output_path else sys.stdout
+    counts = {}
+    try:
+        for i, results in enumerate(iter_rebalancing_file(input_path, chunk_size, threshold)):
+            for status, n in results["status"].value_counts().items():
+                counts[status] = counts.get(status, 0) + int(n)
+            if as_jsonl:
+                for record in results.to_dict(orient="records"):
+                    out.write(json.dumps(record, default=str) + "\n")
+            else:
+                results.to_csv(out, index=False, header=(i == 0))
+    finally:
+        if output_path:
+            out.close()
+    return counts
@@ -1,29 +1,49 @@
 import argparse
 import json
-from financial_utils import calculate_holistic_allocation
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution.financial_utils import calculate_holistic_allocation
 
 def main():
     parser = argparse.ArgumentParser(description="Calculate recommended asset allocation.")
-    parser.add_argument("--age", type=int, required=True, help="Investor's age")
+    parser.add_argument("--age", type=int, help="Investor's age")
     parser.add_argument("--risk", type=str, default="moderate", choices=["aggressive", "moderate", "conservative"], help="Risk profile")
     parser.add_argument("--debt", action="store_true", help="Has high interest debt")
     parser.add_argument("--savings", type=int, default=6, help="Months of savings")
     parser.add_argument("--goal", type=str, default="longevity", help="Primary goal (liquidity/longevity/legacy)")
     parser.add_argument("--fun_bucket", type=int, default=0, help="Fun bucket percentage (0-100)")
     parser.add_argument("--housing", type=str, default="rent", choices=["own", "rent"], help="Housing status (own/rent)")
+    parser.add_argument("--batch", type=str, help="CSV or JSONL file of profiles (columns: age, risk_profile, goal, fun_bucket_pct, housing_status, has_high_interest_debt, months_savings)")
+    parser.add_argument("--output", type=str, help="Write batch results to this CSV file instead of stdout")
+    parser.add_argument("--trace", action="store_true", help="Include the rule trace for every batch row")
     
     args = parser.parse_args()
     
-    wealth_context = {
-        "has_high_interest_debt": args.debt,
-        "months_savings": args.savings,
-        "housing_status": args.housing
-    }
+    if args.batch:
+        from execution.batch_allocation import calculate_allocation_batch, read_profiles
+        
+        profiles = read_profiles(args.batch)
+        results = calculate_allocation_batch(profiles, include_trace=args.trace)
+        results.to_csv(args.output or sys.stdout, index=False)
+        return
     
-    recommendation = calculate_holistic_allocation(args.age, args.risk, wealth_context, args.goal, args.fun_bucket)
+    if args.age is None:
+        parser.error("--age is required (or pass --batch)")
+    
+    recommendation = calculate_holistic_allocation(
+        age=args.age,
+        risk_profile=args.risk,
+        goal=args.goal,
+        fun_bucket_pct=args.fun_bucket,
+        housing_status=args.housing,
+        has_high_interest_debt=args.debt,
+        months_savings=args.savings
+    )
     
     print(json.dumps(recommendation, indent=2))
 
 if __name__ == "__main__":
     main()
-
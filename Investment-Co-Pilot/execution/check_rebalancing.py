@@ -1,5 +1,24 @@
 import argparse
 import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Absolute drift (percentage points) beyond which an asset class is rebalanced
+DRIFT_THRESHOLD = 5.0
+
+# Shared with batch_rebalancing.py: plain floats and NumPy arrays both work here,
+# so the single and batch checks do the exact same arithmetic.
+def current_pct(value, invested_value):
+    return (value / invested_value) * 100
+
+def drift_pct(value, invested_value, target_pct):
+    return current_pct(value, invested_value) - target_pct
+
+def trade_amount(value, invested_value, target_pct):
+    """Amount to buy (positive) or sell (negative) to bring `value` back to target."""
+    return invested_value * (target_pct / 100.0) - value
 
 def check_rebalancing(current_portfolio, target_allocation, total_value):
     """
@@ -23,18 +42,16 @@ def check_rebalancing(current_portfolio, target_allocation, total_value):
     if invested_value == 0:
         return "Portfolio is empty."
 
-    curr_equity_pct = (current_equity / invested_value) * 100
-    curr_bonds_pct = (current_bonds / invested_value) * 100
-    curr_fun_pct = (current_fun / invested_value) * 100
+    curr_equity_pct = current_pct(current_equity, invested_value)
+    curr_bonds_pct = current_pct(current_bonds, invested_value)
+    curr_fun_pct = current_pct(current_fun, invested_value)
     
     target_equity_pct = target_allocation.get("equity_pct", 0)
     target_bonds_pct = target_allocation.get("bonds_pct", 0)
     target_fun_pct = target_allocation.get("fun_bucket_pct", 0)
     
-    drift_equity = curr_equity_pct - target_equity_pct
-    drift_bonds = curr_bonds_pct - target_bonds_pct
-    
-    THRESHOLD = 5.0
+    drift_equity = drift_pct(current_equity, invested_value, target_equity_pct)
+    drift_bonds = drift_pct(current_bonds, invested_value, target_bonds_pct)
     
     report = {
         "status": "Balanced",
@@ -46,16 +63,12 @@ def check_rebalancing(current_portfolio, target_allocation, total_value):
     }
     
     # Logic: If drift > 5%, trigger rebalance
-    if abs(drift_equity) > THRESHOLD or abs(drift_bonds) > THRESHOLD:
+    if abs(drift_equity) > DRIFT_THRESHOLD or abs(drift_bonds) > DRIFT_THRESHOLD:
         report["status"] = "Drift Detected"
         
-        # Calculate Amount to Move
-        # Target Value for Equity
-        target_equity_val = invested_value * (target_equity_pct / 100.0)
-        diff_equity_val = target_equity_val - current_equity
-        
-        target_bonds_val = invested_value * (target_bonds_pct / 100.0)
-        diff_bonds_val = target_bonds_val - current_bonds
+        # Calculate Amount to Move (target value - current value)
+        diff_equity_val = trade_amount(current_equity, invested_value, target_equity_pct)
+        diff_bonds_val = trade_amount(current_bonds, invested_value, target_bonds_pct)
         
         if diff_equity_val > 0:
             report["actions"].append(f"BUY Equity: ${round(diff_equity_val, 2)}")
@@ -74,11 +87,26 @@ def check_rebalancing(current_portfolio, target_allocation, total_value):
 
 def main():
     parser = argparse.ArgumentParser(description="Check portfolio for rebalancing needs.")
-    parser.add_argument("--current", required=True, help="JSON file with current values")
-    parser.add_argument("--targets", required=True, help="JSON file with target %")
+    parser.add_argument("--current", help="JSON file with current values")
+    parser.add_argument("--targets", help="JSON file with target %")
+    parser.add_argument("--batch", type=str, help="CSV or JSONL file of portfolios (columns: equity_value, bonds_value, fun_value, cash_value, equity_pct, bonds_pct, fun_bucket_pct, plus any id columns)")
+    parser.add_argument("--output", type=str, help="Write batch results to this CSV/JSONL file instead of stdout")
+    parser.add_argument("--threshold", type=float, default=DRIFT_THRESHOLD, help="Drift threshold in percentage points (batch and --inflow_first modes)")
+    parser.add_argument("--inflow_first", action="store_true", help="Plan trades for every asset class in the files (gold_value/gold_pct, ...), investing cash_value before selling")
+    parser.add_argument("--chunk_size", type=int, default=100_000, help="Portfolios processed per batch chunk")
     
     args = parser.parse_args()
     
+    if args.batch:
+        from execution.batch_rebalancing import write_rebalancing_batch
+        
+        counts = write_rebalancing_batch(args.batch, args.output, chunk_size=args.chunk_size, threshold=args.threshold)
+        print(json.dumps(counts), file=sys.stderr)
+        return
+    
+    if not args.current or not args.targets:
+        parser.error("--current and --targets are required (or pass --batch)")
+    
     try:
         with open(args.current, 'r') as f:
             current = json.load(f)
@@ -89,7 +117,11 @@ def main():
         if "allocation" in targets:
             targets = targets["allocation"]
             
-        report = check_rebalancing(current, targets, 0)
+        if args.inflow_first:
+            from execution.rebalance_solver import plan_rebalance
+            report = plan_rebalance(current, targets, band=args.threshold)
+        else:
+            report = check_rebalancing(current, targets, 0)
         print(json.dumps(report, indent=2))
         
     except Exception as e:
@@ -0,0 +1,88 @@
+"""
+confirmation.py
+
+Parses the structured confirmation block the directive makes the model print
+before calling tools:
+
+    - **Age:** 35
+    - **Region:** EU
+    - **Housing:** Rent
+    - **Goal:** Longevity
+    - **Risk Profile:** Moderate
+    - **Fun Bucket:** 5%
+    - **ESG:** No
+
+and recognizes a plain affirmative reply to it ("yes", "looks good", ...).
+The orchestrator uses both to answer a confirmed block locally, without the
+tool-call round trip. The malformed-call fallback uses the parser too.
+"""
+import re
+from typing import Optional
+
+
+# Slot -> (pattern, converter); the first match in the block wins
+_SLOT_PATTERNS = {
+    "age": (re.compile(r'\*\*Age:\*\*\s*(\d+)'), int),
+    "region": (re.compile(r'\*\*Region:\*\*\s*(\w+)'), str),
+    "housing_status": (re.compile(r'\*\*Housing:\*\*\s*(\w+)'), str.lower),
+    "goal": (re.compile(r'\*\*Goal:\*\*\s*(\w+)'), str.lower),
+    "risk_profile": (re.compile(r'\*\*Risk Profile:\*\*\s*(\w+)'), str.lower),
+    "fun_bucket_pct": (re.compile(r'\*\*Fun Bucket:\*\*\s*(\d+)'), int),
+    "esg_preference": (re.compile(r'\*\*ESG:\*\*\s*(\w+)'), lambda value: value.lower() == "yes"),
+}
+
+# Slots a block needs before it is answered without the model
+REQUIRED_SLOTS = ("age", "region", "housing_status", "goal", "risk_profile")
+
+# Used for anything the block does not state (Group 1 already cleared debt and savings)
+SLOT_DEFAULTS = {
+    "age": 40,
+    "region": "EU",
+    "housing_status": "rent",
+    "goal": "longevity",
+    "risk_profile": "moderate",
+    "fun_bucket_pct": 0,
+    "esg_preference": False,
+    "has_high_interest_debt": False,
+    "months_savings": 6,
+}
+
+_AFFIRMATIVE = re.compile(
+    r"^(yes|yep|yeah|yup|y|ok|okay|sure|correct|confirmed?|right|exactly|perfect|great|"
+    r"looks (good|great|right|correct|fine)|that'?s (right|correct|it)|all (good|correct)|"
+    r"go ahead|sounds good|do it|please do|let'?s go|proceed)"
+    r"( (please|thanks|thank you|go ahead|let'?s go|proceed|looks good|that'?s (right|correct)))*$"
+)
+
+
+def is_confirmation(text: str) -> bool:
+    """True for text containing the confirmation block (same test as the malformed-call fallback)."""
+    return "Age:" in text and "Region:" in text
+
+
+def parse_confirmation(text: str) -> Optional[dict]:
+    """The slots stated in a confirmation block, or None if `text` has no block."""
+    if not text or not is_confirmation(text):
+        return None
+    slots = {}
+    for slot, (pattern, convert) in _SLOT_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            slots[slot] = convert(match.group(1))
+    return slots
+
+
+def confirmed_args(slots: dict) -> dict:
+    """`calculate_holistic_allocation` arguments for parsed slots (defaults for anything missing)."""
+    return {**SLOT_DEFAULTS, **slots}
+
+
+def is_complete(slots: Optional[dict]) -> bool:
+    return bool(slots) and all(slot in slots for slot in REQUIRED_SLOTS)
+
+
+def is_affirmative(message: str) -> bool:
+    """True if the whole message just confirms ("Yes!", "looks good, go ahead"); anything more goes to the model."""
+    normalized = re.sub(r"[^\w' ]+", " ", (message or "").lower().replace("’", "'"))
+    normalized = " ".join(normalized.split())
+    return bool(normalized) and bool(_AFFIRMATIVE.match(normalized))
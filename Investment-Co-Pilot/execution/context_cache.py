@@ -0,0 +1,193 @@
+"""
+context_cache.py
+
+Server-side Gemini context cache for the static part of every chat: the
+orchestrator directive (system instruction) and the tool declarations.
+
+Chats that reference the cache send only their own history each turn instead of
+re-sending the ~9 KB directive and tool schemas. The cache is created on first
+use. It is recreated shortly before its TTL runs out, or when the directive file
+changes on disk. If caching is unavailable (the client has no cache API, the
+prompt is below the model's minimum, or the request fails), chats fall back to
+the inline system instruction. Creation is then retried only after
+CONTEXT_CACHE_RETRY_SECONDS. A replaced or rejected cache is deleted right away
+instead of being left to accrue storage until its TTL.
+
+Token usage from every response is accumulated, so `stats()` reports how much of
+the prompt was served from the cache.
+"""
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+from google.genai import errors, types
+
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE", "1").lower() not in ("0", "false", "no")
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_RETRY_SECONDS = int(os.getenv("CONTEXT_CACHE_RETRY_SECONDS", "300"))
+# Recreate this long before expiry, so chats that just switched never hit an expired cache
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = int(os.getenv("CONTEXT_CACHE_REFRESH_MARGIN_SECONDS", "300"))
+# Status codes Gemini answers with when a request's cached content has expired or was deleted
+CACHE_REJECTED_CODES = (403, 404)
+
+
+def is_cache_rejection(error: Exception) -> bool:
+    """True if a request failed because the cached content it referenced is gone."""
+    return isinstance(error, errors.APIError) and error.code in CACHE_REJECTED_CODES
+
+
+def tool_declarations(tools: List[Union[Callable, types.Tool]]) -> List[types.Tool]:
+    """Python tool functions (and ready-made `types.Tool` declarations) -> the declarations Gemini stores in the cache."""
+    declarations = []
+    for tool in tools:
+        if isinstance(tool, types.Tool):
+            declarations.extend(tool.function_declarations or [])
+        else:
+            declarations.append(types.FunctionDeclaration.from_callable_with_api_option(callable=tool))
+    return [types.Tool(function_declarations=declarations)]
+
+
+class ContextCache:
+    """Creates, refreshes and reports on the cached directive + tools context."""
+
+    def __init__(
+        self,
+        directive_path: Path,
+        ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+        retry_seconds: int = CONTEXT_CACHE_RETRY_SECONDS,
+        refresh_margin_seconds: int = CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+        enabled: bool = CONTEXT_CACHE_ENABLED,
+    ):
+        self.directive_path = Path(directive_path)
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.refresh_margin_seconds = min(refresh_margin_seconds, ttl_seconds // 2)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # Serializes cache creation, which is a network call; `_lock` is never held across it
+        self._create_lock = threading.Lock()
+        self._directive_mtime = None
+        self._directive = ""
+        self._directive_hash = None
+        self._name = None
+        self._cached_hash = None
+        self._refresh_at = 0.0
+        self._retry_at = 0.0
+        self._stats = {"created": 0, "failures": 0, "cached_sessions": 0, "inline_sessions": 0,
+                       "prompt_tokens": 0, "cached_tokens": 0}
+
+    def directive(self) -> str:
+        """The directive text, re-read whenever the file's mtime changes."""
+        with self._lock:
+            self._reload_directive()
+            return self._directive
+
+    def _reload_directive(self) -> None:
+        mtime = self.directive_path.stat().st_mtime_ns
+        if mtime != self._directive_mtime:
+            self._directive = self.directive_path.read_text()
+            self._directive_hash = hashlib.sha256(self._directive.encode("utf-8")).hexdigest()
+            self._directive_mtime = mtime
+
+    def get(self, client, model: str, tools: List[Union[Callable, types.Tool]]) -> Optional[str]:
+        """
+        Returns the name of a live cache for the current directive, creating or
+        refreshing it if needed, or None when chats should use the inline instruction.
+        """
+        if not self.enabled:
+            return None
+        live = self._live_name()
+        if live is not False:
+            return live
+        with self._create_lock:
+            # Another thread may have created it while this one waited
+            live = self._live_name()
+            if live is not False:
+                return live
+            with self._lock:
+                directive, directive_hash = self._directive, self._directive_hash
+            now = time.monotonic()
+            try:
+                cache = client.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        display_name="orchestrator-directive",
+                        system_instruction=directive,
+                        tools=tool_declarations(tools),
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+            except Exception as e:
+                print(f"[WARN] Context cache unavailable, using inline instruction: {e}")
+                with self._lock:
+                    replaced, self._name = self._name, None
+                    self._retry_at = now + self.retry_seconds
+                    self._stats["failures"] += 1
+                if replaced:
+                    self._delete(client, replaced)
+                return None
+            print(f"[DEBUG] Context cache created: {cache.name}")
+            with self._lock:
+                replaced, self._name = self._name, cache.name
+                self._cached_hash = directive_hash
+                self._refresh_at = now + self.ttl_seconds - self.refresh_margin_seconds
+                self._stats["created"] += 1
+            if replaced:
+                self._delete(client, replaced)
+            return cache.name
+
+    def _live_name(self):
+        """The current cache name, None while creation is backing off, or False if it must be (re)created."""
+        with self._lock:
+            self._reload_directive()
+            now = time.monotonic()
+            if self._name and self._cached_hash == self._directive_hash and now < self._refresh_at:
+                return self._name
+            if now < self._retry_at:
+                return None
+            return False
+
+    def invalidate(self, client, name: Optional[str]) -> None:
+        """Forgets and deletes `name` (e.g. the server rejected it) so the next `get` recreates it."""
+        if not name:
+            return
+        with self._lock:
+            if name != self._name:
+                return  # Already replaced (and deleted) by another chat
+            self._name = None
+        self._delete(client, name)
+
+    def _delete(self, client, name: str) -> None:
+        """Deletes a cache that is no longer used; failures only cost storage until its TTL."""
+        try:
+            client.caches.delete(name=name)
+            print(f"[DEBUG] Context cache deleted: {name}")
+        except Exception as e:
+            print(f"[WARN] Could not delete context cache {name}: {e}")
+
+    def record_session(self, cached: bool) -> None:
+        with self._lock:
+            self._stats["cached_sessions" if cached else "inline_sessions"] += 1
+
+    def record_usage(self, response) -> None:
+        """Accumulates prompt and cache-hit token counts from a Gemini response."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        with self._lock:
+            self._stats["prompt_tokens"] += usage.prompt_token_count or 0
+            self._stats["cached_tokens"] += usage.cached_content_token_count or 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["enabled"] = self.enabled
+            stats["name"] = self._name
+            stats["cache_hit_rate"] = (
+                round(stats["cached_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0
+            )
+        return stats
@@ -4,6 +4,10 @@ data_mapper.py
 Pure function utility for transforming user/agent inputs into
 arguments for the IPS Generator.
 """
+from execution.batch_allocation import glide_path
+
+# Strategies that hold off investing until a priority is resolved (debt, emergency fund)
+GATED_STRATEGIES = ("DEBT_PAYOFF", "CASH_BUILDER")
 
 def build_ips_context(allocation_result: dict, original_args: dict) -> dict:
     """
@@ -30,10 +34,15 @@ def build_ips_context(allocation_result: dict, original_args: dict) -> dict:
 
     # 2. Build Context
     # We prefer the allocation_result value (trusted source) over original_args if available
+    age = allocation_result.get("age", original_args.get("age", 40))
+    # Gated strategies show the path they move to once the debt is paid and the buffer built
+    path_args = {**original_args, "age": age}
+    if allocation_result.get("strategy") in GATED_STRATEGIES:
+        path_args.update(has_high_interest_debt=False, months_savings=6)
     return {
         "allocation": allocation_result,
         "goals": goals_map,
-        "age": allocation_result.get("age", original_args.get("age", 40)),
+        "age": age,
         "region": allocation_result.get("region", original_args.get("region", "EU")),
         "esg_preference": allocation_result.get("esg_preference", original_args.get("esg_preference", False)),
         "wealth_context": {
@@ -42,4 +51,6 @@ def build_ips_context(allocation_result: dict, original_args: dict) -> dict:
             "income_stability": allocation_result.get("income_stability", "stable"),
             "has_high_interest_debt": original_args.get("has_high_interest_debt", False),
         },
+        # 3. Year-by-year allocation from today's age (same rules, cached per profile class)
+        "glide_path": glide_path(**path_args),
     }
@@ -1,9 +1,252 @@
 import json
 import argparse
 import os
+import re
+import operator
 from datetime import datetime
+from string import Formatter
 from execution.financial_utils import get_recommended_portfolio, INVESTMENT_UNIVERSE
 
+# --- IPS Template ---
+# The document is compiled once at import into static fragments and named slots,
+# so rendering is a single join. Slot values are computed in generate_ips_markdown.
+_IPS_TEMPLATE = """# Investment Policy Statement (IPS)
+**Date:** {date}
+
+> **⚠️ DISCLAIMER:** This Investment Policy Statement is an educational document generated by an AI simulation based on user inputs. It does **NOT** constitute financial, legal, or tax advice. It is a roadmap for your personal use to discuss with a qualified professional.
+
+---
+
+## 1. Executive Summary
+This document outlines a proposed investment strategy. It acts as a commitment device to encourage discipline, low costs, and safety during all market conditions.
+
+**Primary Mission:**
+To aim for {longevity_goal} while prioritizing sufficient {liquidity_goal}.
+
+## 2. Investment Philosophy
+This portfolio model is built on the principles of **Simple, Cheap, Safe, and Easy**:
+1.  **Simple:** Uses broad Index Funds to avoid complexity.
+2.  **Cheap:** Prioritizes minimizing fees.
+3.  **Safe:** Manages risk through diversification limits and liquidity buffers.
+4.  **Easy:** Designed for automated decision-making.
+
+## 3. Asset Allocation Strategy (SAA)
+**Target Allocation:**
+*   **Equities (Growth):** {equity_pct}%
+*   **Fixed Income (Safety):** {bonds_pct}%
+{fun_allocation_line}
+
+### 🧠 Why This Allocation?
+
+The model constructed your portfolio by weighing **4 key factors**. Here is how each input shaped the result:
+
+| Factor | Your Input | Impact on Allocation |
+| :--- | :--- | :--- |
+| **1. Goal** | **{goal_label}** | {impact_goal} |
+| **2. Risk Profile** | **{risk_display}** | {impact_risk} |
+| **3. Age** | **{age}** | {impact_age} |
+| **4. Housing** | **{housing_display}** | {impact_housing} |
+
+> **Summary:** This allocation is the mathematical result of balancing these conflicting forces.
+
+{trace_section}
+
+### The Core Portfolio
+Based on the region ({region}) and preferences (ESG: {esg}), the model suggests:
+
+| Asset Class | Ticker | Name | Allocation |
+| :--- | :--- | :--- | :--- |
+| **Global Equity** | **{equity_ticker}** | {equity_name} | **{equity_pct}%** |
+| **Fixed Income** | **{bond_ticker}** | Inv. Grade Corp Bonds | **{bonds_pct}%** |
+{fun_table_row}
+
+{fun_note}
+
+## 4. Risk Management Rules
+*   **Rebalancing:** Review annually. Rebalance if any asset class drifts >5% from its target.
+*   **Liquidity:** Maintain {liquidity_months}-6 months of living expenses in a High-Yield Savings Account.
+    *   **Panic Protocol:** In the event of a market crash (>20% drop), the policy is to **do nothing** or **buy more**. Selling violates this policy.
+
+## 5. Looking Ahead: The Glide Path
+{glide_path_msg}
+{glide_path_table}*   **Action:** Re-run this Co-Pilot simulation every year or when life circumstances change (e.g., new job, marriage, retirement).
+{simulation_section}
+## 6. Simulation Notes
+*   **Human Capital:** {human_capital_note}
+*   **Housing ({housing_title}):** {housing_note}
+*   **Insurance Audit:**
+    *   **Action:** Consider raising deductibles on Home/Auto insurance to the maximum affordable level (Self-Insure small risks).
+    *   **Coverage:** Check coverage for '{coverage}' and Catastrophic loss. Avoid insuring small appliances.
+{debt_line}
+
+---
+
+### Legal Disclaimer and User Acknowledgment
+**Important Disclaimer: For Educational and Informational Purposes Only.**
+
+The information and investment allocations provided by this tool, including any analysis, commentary, or potential scenarios, are generated by an AI model and are for educational and informational purposes only. They do not constitute, and should not be interpreted as, financial advice, investment recommendations, endorsements, or offers to buy or sell any securities or other financial instruments.
+
+LongtermTrends and its affiliates make no representations or warranties of any kind, express or implied, about the completeness, accuracy, reliability, suitability, or availability with respect to the information provided. Any reliance you place on such information is therefore strictly at your own risk.
+
+This is not an offer to buy or sell any security. Investment decisions should not be made based solely on the information provided here. Financial markets are subject to risks, and past performance is not indicative of future results. You should conduct your own thorough research and consult with a qualified independent financial advisor before making any investment decisions.
+
+By using this tool and reviewing these allocations, you acknowledge that you understand this disclaimer and agree that LongtermTrends and its affiliates are not liable for any losses or damages arising from your use of or reliance on this information.
+
+---
+*Generated by the Investment Co-Pilot based on principles from John Y. Campbell's "Fixed" (2024).*
+"""
+
+
+def _compile_template(template: str) -> tuple:
+    """
+    Splits a `{slot}` template into fragments with the slots at odd indices,
+    plus a getter that pulls every slot value out of a dict in one call.
+    """
+    fragments, names = [], []
+    for literal, field, _, _ in Formatter().parse(template):
+        fragments.append(literal)
+        if field is not None:
+            fragments.append(None)
+            names.append(field)
+    if fragments[1::2] != [None] * len(names):
+        raise ValueError("IPS template slots must be separated by literal text")
+    return fragments, operator.itemgetter(*names)
+
+
+_IPS_FRAGMENTS, _ips_slot_values = _compile_template(_IPS_TEMPLATE)
+
+
+def _render_ips(values: dict) -> str:
+    parts = _IPS_FRAGMENTS.copy()
+    parts[1::2] = _ips_slot_values(values)
+    return "".join(parts)
+
+
+# Input Impact rows: (goal, risk, age, housing)
+_GOAL_OVERRIDE_IMPACTS = {
+    'LIQUIDITY_FOCUS': (
+        "**High Bonds (Safety).** Short-term goals requires protecting capital from volatility.",
+        "**Ignored.** Safety is mandatory for short-term liquidity goals.",
+        "**Ignored.** Time horizon is fixed (< 5 years) regardless of age.",
+        "**Ignored.** Strategy overrides housing constraints.",
+    ),
+    'LEGACY_GROWTH': (
+        "**High Equity (Growth).** Long-term horizons allow you to ignore volatility and capture growth.",
+        "**Ignored.** Legacy goals require maximum growth regardless of volatility tolerance.",
+        "**Ignored.** Time horizon is infinite (beyond life) regardless of age.",
+        "**Ignored.** Strategy overrides housing constraints.",
+    ),
+}
+_LIFECYCLE_GOAL_IMPACT = "**Balanced Approach.** Defined the baseline strategy."
+_RISK_IMPACTS = {
+    'aggressive': "**Maximized Equity.** You accepted volatility to maximize long-term returns.",
+    'moderate': "**Balanced Mix.** You traded some upside to reduce the severity of crashes.",
+}
+_CONSERVATIVE_RISK_IMPACT = "**High Bonds.** You prioritized sleep-at-night stability over maximum returns."
+_AGE_IMPACTS = {
+    True: "**Equity Bias.** Your 'Human Capital' (future earnings) acts as a bond, allowing your portfolio to take more risk.",
+    False: "**Bond Bias.** As you approach retirement, we lock in gains and reduce sequence of returns risk.",
+}
+_HOUSING_IMPACTS = {
+    True: "**Reduced Equity.** Your home is a concentrated, illiquid asset. We hold more bonds to balance this risk.",
+    False: "**Neutral.** Renting gives you flexibility, allowing your portfolio to focus purely on financial goals.",
+}
+
+# Housing notes, keyed by whether the housing adjustment applies to the strategy
+_OWNER_HOUSING_NOTES = {
+    True: "Your home acts like a giant 'Bond' (it provides guaranteed shelter, like a bond provides guaranteed interest). However, homes also introduce **leverage risk** (mortgage = debt) and **liquidity constraints** (can't sell a bedroom for groceries). Research by John Y. Campbell suggests homeowners should hold a **more conservative** financial portfolio to balance this. **The model reduced your equity allocation by ~10%** to account for this.",
+    False: "Your home typically acts like a Bond, suggesting a lower equity allocation. **However, your chosen Strategy overrides this to focus on the specific Goal.**",
+}
+_RENTER_HOUSING_NOTE = "You are currently renting. This provides flexibility. Surplus cash flow should flood the Core Portfolio. **Guidance:** Buy only if planning to stay >5 years."
+
+_TRACE_HEADER = """
+### 🧮 How We Calculated This (Logic Trace)
+This portfolio was derived through the following decision chain:
+"""
+
+_GLIDE_PATH_MESSAGES = {
+    "accumulation": "You are in the **Wealth Accumulation Phase**. As you approach age 50, standard advice serves to reduce risk. Expect your equity target to gently step down.",
+    "transition": "You are in the **Pre-Retirement Transition**. As you approach age 65, your equity target will glide toward your final retirement allocation to secure your income.",
+    "withdrawal": "You are in the **Withdrawal Phase**. Maintain this allocation to balance growth with safe withdrawal rates. Review annually.",
+    "legacy": "Your **Legacy Goal** implies an infinite time horizon. Your high-equity allocation does not need to change with age unless your goal changes.",
+    "priorities": "Your strategy is focused on immediate priorities (Debt/Liquidity). Once resolved, you will transition to a Lifecycle strategy.",
+}
+
+_GLIDE_PATH_TABLE_HEADER = """
+| Age | Equities | Fixed Income | Fun Bucket |
+| :--- | :--- | :--- | :--- |
+"""
+
+_SIMULATION_HEADER = """
+### 📈 Range of Outcomes (Monte Carlo)
+{paths:,} simulated market paths over {years} years, starting from ${initial:,.0f}{contribution}, rebalanced yearly to the target allocation. Values are in today's money (after inflation).
+
+| Year | Pessimistic ({low}th pct.) | Median | Optimistic ({high}th pct.) |
+| :--- | :--- | :--- | :--- |
+"""
+_SIMULATION_FOOTER = """
+*   **Shortfall Risk:** {shortfall:.0%} chance of ending below ${target:,.0f}.
+
+> Simulations illustrate a range of possibilities under assumed returns. They are not forecasts or guarantees.
+"""
+_SIMULATION_MILESTONES = (5, 10, 15, 20, 25, 30, 40, 50)
+
+_DEBT_LINE = "*   **Debt Management:** WARNING. High interest debt is present. **Priority #1:** The 'Cheap' principle suggests paying this off immediately. A 6%+ guaranteed loss on debt outweighs potential market gains.*"
+
+
+def _core_holdings(region: str, esg_preference: bool) -> tuple:
+    """(equity fund dict, bond ticker) for the Core Portfolio table."""
+    # Normalize region (agent should pass "US" or "EU")
+    region_upper = (region or "US").upper().strip()
+    if region_upper not in ["US", "EU"]:
+        region_upper = "US"  # Fallback for unexpected values
+    
+    core_equity = get_recommended_portfolio(region_upper, esg_preference)
+    domicile = "us_domiciled" if region_upper == "US" else "eu_domiciled"
+    return core_equity, INVESTMENT_UNIVERSE["fixed_income"]["corporate"][domicile]
+
+
+def _glide_path_table(path: list) -> str:
+    """Year-by-year glide path (see batch_allocation.glide_path), one row per run of identical allocations."""
+    rows = []
+    start = path[0]
+    for previous, row in zip(path, path[1:] + [None]):
+        if row is None or any(row[k] != start[k] for k in ("equity_pct", "bonds_pct", "fun_bucket_pct")):
+            ages = f"{start['age']}" if previous["age"] == start["age"] else f"{start['age']}–{previous['age']}"
+            rows.append(f"| {ages} | {start['equity_pct']}% | {start['bonds_pct']}% | {start['fun_bucket_pct']}% |")
+            start = row
+    return _GLIDE_PATH_TABLE_HEADER + "\n".join(rows) + "\n\n"
+
+
+def _simulation_section(simulation: dict) -> str:
+    """Percentile table and shortfall line for a `monte_carlo.simulate_outcomes` result."""
+    percentiles = {int(k): v for k, v in simulation["percentiles"].items()}
+    ordered = sorted(percentiles)
+    low, mid, high = ordered[0], ordered[len(ordered) // 2], ordered[-1]
+    years = simulation["years"]
+    contribution = simulation.get("annual_contribution", 0)
+    rows = [
+        f"| {year} | ${percentiles[low][year]:,.0f} | ${percentiles[mid][year]:,.0f} | ${percentiles[high][year]:,.0f} |"
+        for year in [y for y in _SIMULATION_MILESTONES if y < years] + [years]
+    ]
+    return (
+        _SIMULATION_HEADER.format(
+            paths=simulation["paths"],
+            years=years,
+            initial=simulation["initial_value"],
+            contribution=f" plus ${contribution:,.0f}/year" if contribution else "",
+            low=low,
+            high=high,
+        )
+        + "\n".join(rows)
+        + "\n"
+        + _SIMULATION_FOOTER.format(
+            shortfall=simulation["shortfall_probability"],
+            target=simulation["target_value"],
+        )
+    )
+
+
 def generate_ips_markdown(
     age: int = 30,
     region: str = "US",
@@ -11,6 +254,8 @@ def generate_ips_markdown(
     goals: dict = None,
     wealth_context: dict = None,
     allocation: dict = None,
+    simulation: dict = None,
+    glide_path: list = None,
     **kwargs
 ):
     """
@@ -23,6 +268,8 @@ def generate_ips_markdown(
         goals: Dict containing 'liquidity' and 'longevity' goals.
         wealth_context: Dict containing 'housing_status', 'income_stability', 'has_high_interest_debt'.
         allocation: Dict containing 'equity_pct', 'bonds_pct', 'fun_bucket_pct'.
+        simulation: Optional `monte_carlo.simulate_outcomes` result, shown as a range-of-outcomes table.
+        glide_path: Optional `batch_allocation.glide_path` rows, shown as a table under Looking Ahead.
     """
     
     # Defaults
@@ -56,213 +303,211 @@ def generate_ips_markdown(
     bonds_pct = allocation.get("bonds_pct", 10)
     fun_bucket_pct = allocation.get("fun_bucket_pct", 0)
     
-    # Get Tickers - Normalize region (agent should pass "US" or "EU")
-    region_upper = (region or "US").upper().strip()
-    if region_upper not in ["US", "EU"]:
-        region_upper = "US"  # Fallback for unexpected values
-    
-    core_equity = get_recommended_portfolio(region_upper, esg_preference)
-    domicile = "us_domiciled" if region_upper == "US" else "eu_domiciled"
-    bond_ticker = INVESTMENT_UNIVERSE["fixed_income"]["corporate"][domicile]
+    core_equity, bond_ticker = _core_holdings(region, esg_preference)
     
-    # Date
-    date_str = datetime.now().strftime("%Y-%m-%d")
+    # Date (YYYY-MM-DD)
+    date_str = datetime.now().date().isoformat()
     
     # Display Helpers
     strategy_raw = allocation.get('strategy', 'Custom')
-    strategy_display = strategy_raw.replace('_', ' ').title().replace(' V2', '')
     
     housing_display = housing_status.replace('_', ' ').title()
     risk_display = wealth_context.get('risk_profile', 'moderate').title()
 
-    # Pre-calculate Table Logic to avoid f-string mess
-    if strategy_raw == 'LIQUIDITY_FOCUS':
-        impact_goal = "**High Bonds (Safety).** Short-term goals requires protecting capital from volatility."
-        impact_risk = "**Ignored.** Safety is mandatory for short-term liquidity goals."
-        impact_age = "**Ignored.** Time horizon is fixed (< 5 years) regardless of age."
-        impact_housing = "**Ignored.** Strategy overrides housing constraints."
-    elif strategy_raw == 'LEGACY_GROWTH':
-        impact_goal = "**High Equity (Growth).** Long-term horizons allow you to ignore volatility and capture growth."
-        impact_risk = "**Ignored.** Legacy goals require maximum growth regardless of volatility tolerance."
-        impact_age = "**Ignored.** Time horizon is infinite (beyond life) regardless of age."
-        impact_housing = "**Ignored.** Strategy overrides housing constraints."
-    else:
-        # Lifecycle / Custom
-        impact_goal = "**Balanced Approach.** Defined the baseline strategy."
-        
-        if risk_display.lower() == 'aggressive':
-            impact_risk = "**Maximized Equity.** You accepted volatility to maximize long-term returns."
-        elif risk_display.lower() == 'moderate':
-            impact_risk = "**Balanced Mix.** You traded some upside to reduce the severity of crashes."
-        else:
-            impact_risk = "**High Bonds.** You prioritized sleep-at-night stability over maximum returns."
-            
-        if age < 50:
-            impact_age = "**Equity Bias.** Your 'Human Capital' (future earnings) acts as a bond, allowing your portfolio to take more risk."
-        else:
-            impact_age = "**Bond Bias.** As you approach retirement, we lock in gains and reduce sequence of returns risk."
-            
-        if allocation.get('housing_adjustment') or housing_status.lower().startswith('own'):
-            impact_housing = "**Reduced Equity.** Your home is a concentrated, illiquid asset. We hold more bonds to balance this risk."
-        else:
-            impact_housing = "**Neutral.** Renting gives you flexibility, allowing your portfolio to focus purely on financial goals."
-
-    table_content = f"""| Factor | Your Input | Impact on Allocation |
-| :--- | :--- | :--- |
-| **1. Goal** | **{liquidity_goal if strategy_raw == 'LIQUIDITY_FOCUS' else longevity_goal}** | {impact_goal} |
-| **2. Risk Profile** | **{risk_display}** | {impact_risk} |
-| **3. Age** | **{age}** | {impact_age} |
-| **4. Housing** | **{housing_display}** | {impact_housing} |"""
-
-    # Pre-calculate Human Capital Note Logic
-    human_capital_note = ""
+    # Input Impact table: fixed rows for goal-override strategies, looked up for Lifecycle / Custom
+    impacts = _GOAL_OVERRIDE_IMPACTS.get(strategy_raw)
+    if impacts is None:
+        impacts = (
+            _LIFECYCLE_GOAL_IMPACT,
+            _RISK_IMPACTS.get(risk_display.lower(), _CONSERVATIVE_RISK_IMPACT),
+            _AGE_IMPACTS[age < 50],
+            _HOUSING_IMPACTS[bool(allocation.get('housing_adjustment') or housing_status.lower().startswith('own'))],
+        )
+    impact_goal, impact_risk, impact_age, impact_housing = impacts
+
+    # Human Capital Note
     if age < 50:
-         human_capital_note = f"At age {age}, future earnings are likely your largest asset. This typically supports a higher equity allocation."
+        human_capital_note = f"At age {age}, future earnings are likely your largest asset. This typically supports a higher equity allocation."
     else:
         human_capital_note = f"At age {age}, future earnings are likely diminishing. Standard theory suggests a higher fixed income buffer."
         if bonds_pct < 10:
             override_reason = "Aggressive Risk Profile" if risk_display == 'Aggressive' else "Legacy Goal"
             human_capital_note += f" **However, your '{override_reason}' overrides this to maximize growth.**"
 
-    # Pre-calculate Housing Note
-    housing_note = ""
-    # Check if housing logic was actually applied (Lifecycle strategies only)
-    housing_is_relevant = strategy_raw not in ['LIQUIDITY_FOCUS', 'LEGACY_GROWTH']
-    
+    # Housing Note (the adjustment only applies to Lifecycle strategies)
     if housing_status.startswith("own"):
-        if housing_is_relevant:
-            housing_note = "Your home acts like a giant 'Bond' (it provides guaranteed shelter, like a bond provides guaranteed interest). However, homes also introduce **leverage risk** (mortgage = debt) and **liquidity constraints** (can't sell a bedroom for groceries). Research by John Y. Campbell suggests homeowners should hold a **more conservative** financial portfolio to balance this. **The model reduced your equity allocation by ~10%** to account for this."
-        else:
-            housing_note = "Your home typically acts like a Bond, suggesting a lower equity allocation. **However, your chosen Strategy overrides this to focus on the specific Goal.**"
+        housing_is_relevant = strategy_raw not in ['LIQUIDITY_FOCUS', 'LEGACY_GROWTH']
+        housing_note = _OWNER_HOUSING_NOTES[housing_is_relevant]
     else:
-        housing_note = "You are currently renting. This provides flexibility. Surplus cash flow should flood the Core Portfolio. **Guidance:** Buy only if planning to stay >5 years."
+        housing_note = _RENTER_HOUSING_NOTE
 
-    
-    # Build Logic Trace Section
-    trace_content = ""
+    # Logic Trace Section
     trace_list = allocation.get("trace", [])
     if trace_list:
         formatted_trace = "\n".join([f"*   {item}" for item in trace_list])
-        trace_content = f"""
-### 🧮 How We Calculated This (Logic Trace)
-This portfolio was derived through the following decision chain:
-{formatted_trace}
-"""
+        trace_section = _TRACE_HEADER + formatted_trace + "\n"
+    else:
+        trace_section = ""
 
-    
-    # Build Glide Path Section
-    glide_path_msg = ""
-    # Only relevant for Lifecycle strategy (not Debt, Liquidity, etc.)
-    if strategy_raw == 'LIFECYCLE_V2' and longevity_goal != 'Legacy': 
+    # Glide Path (only Lifecycle has one; Legacy and immediate priorities get fixed messages)
+    if strategy_raw == 'LIFECYCLE_V2' and longevity_goal != 'Legacy':
         if age < 50:
-             glide_path_msg = "You are in the **Wealth Accumulation Phase**. As you approach age 50, standard advice serves to reduce risk. Expect your equity target to gently step down."
+            glide_path_msg = _GLIDE_PATH_MESSAGES["accumulation"]
         elif 50 <= age < 65:
-             glide_path_msg = "You are in the **Pre-Retirement Transition**. As you approach age 65, your equity target will glide toward your final retirement allocation to secure your income."
+            glide_path_msg = _GLIDE_PATH_MESSAGES["transition"]
         else:
-             glide_path_msg = "You are in the **Withdrawal Phase**. Maintain this allocation to balance growth with safe withdrawal rates. Review annually."
+            glide_path_msg = _GLIDE_PATH_MESSAGES["withdrawal"]
     elif 'Legacy' in longevity_goal or strategy_raw == 'LEGACY_GROWTH':
-        glide_path_msg = "Your **Legacy Goal** implies an infinite time horizon. Your high-equity allocation does not need to change with age unless your goal changes."
+        glide_path_msg = _GLIDE_PATH_MESSAGES["legacy"]
     else:
-        glide_path_msg = "Your strategy is focused on immediate priorities (Debt/Liquidity). Once resolved, you will transition to a Lifecycle strategy."
-
-    glide_path_section = f"""## 5. Looking Ahead: The Glide Path
-{glide_path_msg}
-*   **Action:** Re-run this Co-Pilot simulation every year or when life circumstances change (e.g., new job, marriage, retirement)."""
-
-    # Build Simulation Notes Section
-    simulation_section = f"""## 6. Simulation Notes
-*   **Human Capital:** {human_capital_note}
-*   **Housing ({housing_status.title()}):** {housing_note}
-*   **Insurance Audit:**
-    *   **Action:** Consider raising deductibles on Home/Auto insurance to the maximum affordable level (Self-Insure small risks).
-    *   **Coverage:** Check coverage for '{ "Disability (Income Protection)" if age < 60 else "Longevity (Annuities)" }' and Catastrophic loss. Avoid insuring small appliances.
-{f"*   **Debt Management:** WARNING. High interest debt is present. **Priority #1:** The 'Cheap' principle suggests paying this off immediately. A 6%+ guaranteed loss on debt outweighs potential market gains.*" if has_debt else ""}"""
-
-    ips_content = f"""# Investment Policy Statement (IPS)
-**Date:** {date_str}
-
-> **⚠️ DISCLAIMER:** This Investment Policy Statement is an educational document generated by an AI simulation based on user inputs. It does **NOT** constitute financial, legal, or tax advice. It is a roadmap for your personal use to discuss with a qualified professional.
-
----
-
-## 1. Executive Summary
-This document outlines a proposed investment strategy. It acts as a commitment device to encourage discipline, low costs, and safety during all market conditions.
-
-**Primary Mission:**
-To aim for {longevity_goal} while prioritizing sufficient {liquidity_goal}.
-
-## 2. Investment Philosophy
-This portfolio model is built on the principles of **Simple, Cheap, Safe, and Easy**:
-1.  **Simple:** Uses broad Index Funds to avoid complexity.
-2.  **Cheap:** Prioritizes minimizing fees.
-3.  **Safe:** Manages risk through diversification limits and liquidity buffers.
-4.  **Easy:** Designed for automated decision-making.
-
-## 3. Asset Allocation Strategy (SAA)
-**Target Allocation:**
-*   **Equities (Growth):** {equity_pct}%
-*   **Fixed Income (Safety):** {bonds_pct}%
-{f"*   **Fun Bucket (Speculation):** {fun_bucket_pct}%" if fun_bucket_pct > 0 else ""}
-
-### 🧠 Why This Allocation?
-
-The model constructed your portfolio by weighing **4 key factors**. Here is how each input shaped the result:
-
-{table_content}
-
-> **Summary:** This allocation is the mathematical result of balancing these conflicting forces.
-
-{trace_content}
-
-### The Core Portfolio
-Based on the region ({region}) and preferences (ESG: {"Yes" if esg_preference else "No"}), the model suggests:
-
-| Asset Class | Ticker | Name | Allocation |
-| :--- | :--- | :--- | :--- |
-| **Global Equity** | **{core_equity['equity_ticker']}** | {core_equity['equity_name']} | **{equity_pct}%** |
-| **Fixed Income** | **{bond_ticker}** | Inv. Grade Corp Bonds | **{bonds_pct}%** |
-{f"| **Speculation (Fun)** | **VARIOUS** | Crypto / Picks | **{fun_bucket_pct}%** |" if fun_bucket_pct > 0 else ""}
-
-{f"***Note:** {fun_bucket_pct}% is allocated to a 'Fun Bucket' for speculative assets. This separates gambling from savings.*" if fun_bucket_pct > 0 else ""}
-
-## 4. Risk Management Rules
-*   **Rebalancing:** Review annually. Rebalance if any asset class drifts >5% from its target.
-*   **Liquidity:** Maintain { "6" if income_stability == "volatile" else "3" }-6 months of living expenses in a High-Yield Savings Account.
-    *   **Panic Protocol:** In the event of a market crash (>20% drop), the policy is to **do nothing** or **buy more**. Selling violates this policy.
-
-{glide_path_section}
-
-{simulation_section}
-
----
-
-### Legal Disclaimer and User Acknowledgment
-**Important Disclaimer: For Educational and Informational Purposes Only.**
-
-The information and investment allocations provided by this tool, including any analysis, commentary, or potential scenarios, are generated by an AI model and are for educational and informational purposes only. They do not constitute, and should not be interpreted as, financial advice, investment recommendations, endorsements, or offers to buy or sell any securities or other financial instruments.
+        glide_path_msg = _GLIDE_PATH_MESSAGES["priorities"]
+
+    has_fun = fun_bucket_pct > 0
+    return _render_ips({
+        "date": date_str,
+        "longevity_goal": f"{longevity_goal}",
+        "liquidity_goal": f"{liquidity_goal}",
+        "equity_pct": f"{equity_pct}",
+        "bonds_pct": f"{bonds_pct}",
+        "fun_allocation_line": f"*   **Fun Bucket (Speculation):** {fun_bucket_pct}%" if has_fun else "",
+        "goal_label": f"{liquidity_goal if strategy_raw == 'LIQUIDITY_FOCUS' else longevity_goal}",
+        "impact_goal": impact_goal,
+        "risk_display": risk_display,
+        "impact_risk": impact_risk,
+        "age": f"{age}",
+        "impact_age": impact_age,
+        "housing_display": housing_display,
+        "impact_housing": impact_housing,
+        "trace_section": trace_section,
+        "region": f"{region}",
+        "esg": "Yes" if esg_preference else "No",
+        "equity_ticker": f"{core_equity['equity_ticker']}",
+        "equity_name": f"{core_equity['equity_name']}",
+        "bond_ticker": f"{bond_ticker}",
+        "fun_table_row": f"| **Speculation (Fun)** | **VARIOUS** | Crypto / Picks | **{fun_bucket_pct}%** |" if has_fun else "",
+        "fun_note": f"***Note:** {fun_bucket_pct}% is allocated to a 'Fun Bucket' for speculative assets. This separates gambling from savings.*" if has_fun else "",
+        "liquidity_months": "6" if income_stability == "volatile" else "3",
+        "glide_path_msg": glide_path_msg,
+        "glide_path_table": _glide_path_table(glide_path) if glide_path else "",
+        "simulation_section": _simulation_section(simulation) if simulation else "",
+        "human_capital_note": human_capital_note,
+        "housing_title": housing_status.title(),
+        "housing_note": housing_note,
+        "coverage": "Disability (Income Protection)" if age < 60 else "Longevity (Annuities)",
+        "debt_line": _DEBT_LINE if has_debt else "",
+    })
+
+def split_ips_sections(markdown: str) -> list:
+    """
+    Splits a rendered IPS into section-sized chunks for streaming.
+    
+    A new chunk starts at every top-level `## ` heading; joining the chunks
+    reproduces the input exactly.
+    """
+    chunks = []
+    start = 0
+    for match in re.finditer(r"^## ", markdown, flags=re.MULTILINE):
+        if match.start() > start:
+            chunks.append(markdown[start:match.start()])
+            start = match.start()
+    chunks.append(markdown[start:])
+    return chunks
 
-LongtermTrends and its affiliates make no representations or warranties of any kind, express or implied, about the completeness, accuracy, reliability, suitability, or availability with respect to the information provided. Any reliance you place on such information is therefore strictly at your own risk.
+# Headings of the rendered IPS, in document order (level 2 sections and their level 3 parts)
+_HEADING_PATTERN = re.compile(r"^(#{2,3}) (.+)$", flags=re.MULTILINE)
+IPS_SECTIONS = [m.group(2) for m in _HEADING_PATTERN.finditer(_IPS_TEMPLATE)]
 
-This is not an offer to buy or sell any security. Investment decisions should not be made based solely on the information provided here. Financial markets are subject to risks, and past performance is not indicative of future results. You should conduct your own thorough research and consult with a qualified independent financial advisor before making any investment decisions.
 
-By using this tool and reviewing these allocations, you acknowledge that you understand this disclaimer and agree that LongtermTrends and its affiliates are not liable for any losses or damages arising from your use of or reliance on this information.
+def find_ips_section(markdown: str, section: str):
+    """
+    Returns one section of a rendered IPS verbatim, or None if nothing matches.
+    
+    `section` is a section number ("4") or part of a heading, case-insensitive
+    ("risk management", "Disclaimer"). The section runs to the next heading of
+    the same or a higher level.
+    """
+    query = str(section).strip().lower().rstrip(".")
+    if not query:
+        return None
+    headings = list(_HEADING_PATTERN.finditer(markdown))
+    for i, match in enumerate(headings):
+        title = match.group(2).lower()
+        if title.split(".")[0] == query if query.isdigit() else query in title:
+            level = len(match.group(1))
+            end = next((h.start() for h in headings[i + 1:] if len(h.group(1)) <= level), len(markdown))
+            return markdown[match.start():end].rstrip() + "\n"
+    return None
+
+
+def summarize_ips(
+    age: int = 30,
+    region: str = "US",
+    esg_preference: bool = False,
+    wealth_context: dict = None,
+    allocation: dict = None,
+    glide_path: list = None,
+    **kwargs
+) -> dict:
+    """
+    Compact, structured digest of the IPS rendered from the same arguments:
+    the figures and rules a follow-up question usually needs, at a fraction of
+    the document's size. Exact wording is available through `find_ips_section`.
+    """
+    if wealth_context is None: wealth_context = {}
+    if allocation is None: allocation = {"equity_pct": 90, "bonds_pct": 10, "fun_bucket_pct": 0}
+    core_equity, bond_ticker = _core_holdings(region, esg_preference)
+    
+    notes = [allocation["note"]] if allocation.get("note") else []
+    liquidity_months = "6" if wealth_context.get("income_stability", "stable").lower() == "volatile" else "3"
+    notes.append("Rebalance if any asset class drifts >5% from target; review annually.")
+    notes.append(f"Keep {liquidity_months}-6 months of expenses in a high-yield savings account.")
+    if wealth_context.get("has_high_interest_debt"):
+        notes.append("High interest debt present: pay it off first.")
+    
+    summary = {
+        "allocation": {key: allocation.get(key, 0) for key in ("equity_pct", "bonds_pct", "fun_bucket_pct")},
+        "strategy": allocation.get("strategy", "Custom"),
+        "tickers": {
+            "equity": f"{core_equity['equity_ticker']} ({core_equity['equity_name']})",
+            "bonds": bond_ticker,
+        },
+        "inputs": {
+            "age": age,
+            "region": region,
+            "esg_preference": bool(esg_preference),
+            "risk_profile": wealth_context.get("risk_profile", "moderate"),
+            "housing_status": wealth_context.get("housing_status", "rent"),
+        },
+        "trace": allocation.get("trace", []),
+        "notes": notes,
+        "sections": IPS_SECTIONS,
+    }
+    if glide_path:
+        summary["glide_path"] = _glide_path_table(glide_path).strip().splitlines()[2:]
+    return summary
 
----
-*Generated by the Investment Co-Pilot based on principles from John Y. Campbell's "Fixed" (2024).*
-"""
-    return ips_content
 
 def main():
     parser = argparse.ArgumentParser(description="Generate an IPS Markdown file.")
-    parser.add_argument("--input", required=True, help="Path to JSON input file")
-    parser.add_argument("--output", required=True, help="Path to output Markdown file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Path to JSON input file")
+    source.add_argument("--batch", help="Path to a JSONL or CSV file of profiles (one IPS per line)")
+    parser.add_argument("--output", required=True, help="Path to output Markdown file (.zip or .jsonl with --batch)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
     
     args = parser.parse_args()
-    print(f"DEBUG: Input arg: '{args.input}'")
+    print(f"DEBUG: Input arg: '{args.input or args.batch}'")
     print(f"DEBUG: Output arg: '{args.output}'")
-    import os
     print(f"DEBUG: CWD: {os.getcwd()}")
     
+    if args.batch:
+        from execution.batch_ips import BATCH_IPS_WORKERS, write_batch
+        
+        workers = BATCH_IPS_WORKERS if args.workers is None else args.workers
+        counts = write_batch(args.batch, args.output, workers=workers)
+        print(f"Success: {counts['ok']} IPS generated at {args.output} ({counts['error']} errors)")
+        return
+    
     with open(args.input, 'r') as f:
         data = json.load(f)
     
@@ -0,0 +1,186 @@
+"""
+history_manager.py
+
+Keeps chat histories within a token budget.
+
+Once a history grows past HISTORY_TOKEN_BUDGET, the most recent
+HISTORY_KEEP_TURNS turns stay verbatim and everything older is folded into a
+rolling summary: a user message of one line per earlier message, followed by a
+model message that pins what must survive compaction. That is the latest
+confirmed input block (the `**Age:** ... **Region:** ...` summary that the
+malformed-call fallback parses) and the latest IPS summary. Repeated
+compactions fold further turns into the existing summary. Its oldest lines are
+dropped once it exceeds HISTORY_SUMMARY_MAX_TOKENS.
+
+The summary is built locally (no extra model call), so compaction is
+deterministic and free. Token counts are estimated at ~4 characters per token.
+"""
+import json
+import os
+import threading
+from typing import List, Tuple
+
+from google.genai import types
+
+
+# Per-deployment budget (0 disables compaction)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "1000"))
+
+SUMMARY_MARKER = "[Summary of the earlier conversation]"
+_PINNED_HEADER = "Noted. Details to keep from earlier in the conversation:"
+_LINE_CHARS = 240
+_OMITTED = "(older messages omitted)"
+_PIN_SEPARATOR = "\n\n[pinned]\n"
+
+
+def content_tokens(content: types.Content) -> int:
+    """Approximate prompt tokens of one history message."""
+    chars = 0
+    for part in content.parts or []:
+        if part.text:
+            chars += len(part.text)
+        elif part.function_call is not None:
+            chars += len(part.function_call.name or "") + len(str(part.function_call.args))
+        elif part.function_response is not None:
+            chars += len(str(part.function_response.response))
+    return chars // 4 + 1
+
+
+def history_tokens(history: List[types.Content]) -> int:
+    return sum(content_tokens(content) for content in history)
+
+
+def _text(content: types.Content) -> str:
+    return "".join(part.text for part in content.parts or [] if part.text and not part.thought)
+
+
+def _clip(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= _LINE_CHARS else text[:_LINE_CHARS - 3] + "..."
+
+
+def is_confirmation(text: str) -> bool:
+    """True for the model's structured confirmation block (same test as the malformed-call fallback)."""
+    return "Age:" in text and "Region:" in text
+
+
+def _starts_turn(content: types.Content) -> bool:
+    """A turn starts at a user message with text (tool results belong to the turn that requested them)."""
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+class HistoryManager:
+    """Compacts histories that exceed the token budget and counts what that saved."""
+
+    def __init__(
+        self,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        keep_turns: int = HISTORY_KEEP_TURNS,
+        summary_max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+    ):
+        self.token_budget = token_budget
+        self.keep_turns = max(1, keep_turns)
+        self.summary_max_tokens = summary_max_tokens
+        self._lock = threading.Lock()
+        self._stats = {"compactions": 0, "turns_folded": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def compact(self, history: list) -> Tuple[list, bool]:
+        """
+        Returns (history, changed). The history is returned as-is while it fits
+        the budget; otherwise as [summary, pinned, last turns...].
+        """
+        if self.token_budget <= 0 or not history:
+            return history, False
+        history = [types.Content.model_validate(c) if isinstance(c, dict) else c for c in history]
+        before = history_tokens(history)
+        if before <= self.token_budget:
+            return history, False
+
+        lines, pinned, rest = self._split_summary(history)
+        turns = self._turns(rest)
+        keep = min(self.keep_turns, len(turns))
+        # Keep fewer turns verbatim if even the last few blow the budget (always at least one)
+        while keep > 1 and history_tokens([c for turn in turns[-keep:] for c in turn]) > self.token_budget // 2:
+            keep -= 1
+        folded, kept = turns[:-keep], turns[-keep:]
+        if not folded and not lines:
+            return history, False
+
+        for turn in folded:
+            for content in turn:
+                self._fold(content, lines, pinned)
+        compacted = self._summary_messages(lines, pinned) + [c for turn in kept for c in turn]
+
+        with self._lock:
+            self._stats["compactions"] += 1
+            self._stats["turns_folded"] += len(folded)
+            self._stats["tokens_before"] += before
+            self._stats["tokens_after"] += history_tokens(compacted)
+        return compacted, True
+
+    @staticmethod
+    def _split_summary(history: list) -> tuple:
+        """Separates an existing summary (lines, pinned details) from the verbatim messages."""
+        lines, pinned = [], {}
+        if len(history) >= 2 and history[0].role == "user" and _text(history[0]).startswith(SUMMARY_MARKER):
+            lines = _text(history[0]).split("\n")[1:]
+            for block in _text(history[1]).split(_PIN_SEPARATOR)[1:]:
+                if is_confirmation(block):
+                    pinned["confirmation"] = block
+                elif block.startswith("IPS summary: "):
+                    pinned["ips_summary"] = block
+            history = history[2:]
+        return lines, pinned, history
+
+    @staticmethod
+    def _turns(history: list) -> list:
+        turns = []
+        for content in history:
+            if not turns or _starts_turn(content):
+                turns.append([])
+            turns[-1].append(content)
+        return turns
+
+    @staticmethod
+    def _fold(content: types.Content, lines: list, pinned: dict) -> None:
+        """Adds one message to the summary lines (and pins it if it must survive)."""
+        speaker = "User" if content.role == "user" else "Assistant"
+        for part in content.parts or []:
+            if part.text and not part.thought:
+                if content.role == "model" and is_confirmation(part.text):
+                    pinned["confirmation"] = part.text.strip()
+                lines.append(f"{speaker}: {_clip(part.text)}")
+            elif part.function_call is not None:
+                args = json.dumps(dict(part.function_call.args or {}), default=str)
+                lines.append(f"Assistant called {part.function_call.name}: {_clip(args)}")
+            elif part.function_response is not None:
+                response = part.function_response.response or {}
+                if "ips_summary" in response:
+                    pinned["ips_summary"] = "IPS summary: " + json.dumps(response["ips_summary"], default=str)
+                    lines.append("IPS shown to the user (summary pinned below).")
+                else:
+                    lines.append(f"Tool {part.function_response.name} returned: {_clip(json.dumps(response, default=str))}")
+
+    def _summary_messages(self, lines: list, pinned: dict) -> list:
+        """The summary as a user message plus the pinned details as the model's reply."""
+        dropped = bool(lines) and lines[0] == _OMITTED
+        lines = [line for line in lines if line != _OMITTED]
+        while len(lines) > 1 and sum(len(line) for line in lines) // 4 > self.summary_max_tokens:
+            lines.pop(0)
+            dropped = True
+        if dropped:
+            lines.insert(0, _OMITTED)
+        blocks = [_PINNED_HEADER] + [pinned[key] for key in ("confirmation", "ips_summary") if key in pinned]
+        return [
+            types.Content(role="user", parts=[types.Part(text="\n".join([SUMMARY_MARKER] + lines))]),
+            types.Content(role="model", parts=[types.Part(text=_PIN_SEPARATOR.join(blocks))]),
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+        stats.update(token_budget=self.token_budget, keep_turns=self.keep_turns)
+        return stats
@@ -0,0 +1,105 @@
+"""
+ips_cache.py
+
+Content-keyed LRU cache for `generate_ips_markdown`.
+
+Many users arrive at identical inputs (same age, region, ESG flag, allocation and
+strategy), so rendered IPS documents are memoized under a hash of the canonical
+inputs plus the current date (the date is printed in the document, so entries
+roll over at midnight).
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from execution.generate_ips import generate_ips_markdown
+
+
+IPS_CACHE_MAX_ENTRIES = int(os.getenv("IPS_CACHE_MAX_ENTRIES", "512"))  # 0 disables the cache
+
+# Arguments generate_ips_markdown actually reads (anything else is ignored by it, so not keyed)
+_KEY_FIELDS = ("age", "region", "esg_preference", "goals", "wealth_context", "allocation", "simulation", "glide_path")
+
+
+def ips_cache_key(kwargs: dict, date_str: Optional[str] = None) -> str:
+    """sha256 over the canonical JSON of the rendering inputs and the date."""
+    inputs = {field: kwargs[field] for field in _KEY_FIELDS if field in kwargs}
+    inputs["date"] = date_str or datetime.now().strftime("%Y-%m-%d")
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IPSCache:
+    """
+    Bounded LRU of rendered IPS markdown.
+
+    Args:
+        max_entries: Documents kept (each is roughly 8 KB); 0 disables caching
+    """
+
+    def __init__(self, max_entries: int = IPS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, **kwargs) -> str:
+        """Returns the cached document for these inputs, rendering it on a miss."""
+        if self.max_entries <= 0:
+            return generate_ips_markdown(**kwargs)
+
+        key = ips_cache_key(kwargs)
+        with self._lock:
+            markdown = self._entries.get(key)
+            if markdown is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return markdown
+            self.misses += 1
+
+        # Render outside the lock; a concurrent miss on the same key just renders twice
+        markdown = generate_ips_markdown(**kwargs)
+        with self._lock:
+            self._entries[key] = markdown
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return markdown
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_cache = IPSCache()
+
+
+def cached_generate_ips_markdown(**kwargs) -> str:
+    """`generate_ips_markdown` through the process-wide cache."""
+    return _cache.render(**kwargs)
+
+
+def get_ips_cache_stats() -> dict:
+    return _cache.stats()
@@ -1,12 +1,31 @@
 """
 Shared logging utilities for the Investment Co-Pilot.
 Used by both api.py and interactive_chat.py to ensure consistent logging format.
+
+Entries are handed to a background writer thread that appends them to disk in
+group commits, so logging adds no file I/O to the request path.
+
+The active `transcripts.jsonl` is rotated by size and age into gzip-compressed
+segments (`transcripts-<UTC timestamp>.jsonl.gz`), and a sidecar index maps each
+session to its lines so a conversation can be read back without a full scan.
 """
 import os
 import json
+import atexit
+import queue
+from collections import deque
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
+
+from execution.transcript_index import TranscriptIndex, compress_segment
+
+try:
+    import fcntl  # POSIX only; serializes appends between worker processes
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
 
 
 # Logging Configuration
@@ -14,6 +33,299 @@ LOGS_DIR = Path(__file__).parent.parent / "logs"
 LOGS_DIR.mkdir(exist_ok=True)
 TRANSCRIPT_FILE = LOGS_DIR / "transcripts.jsonl"
 
+# Group commit: write once N entries are queued or M milliseconds have passed
+TRANSCRIPT_FLUSH_ENTRIES = int(os.getenv("TRANSCRIPT_FLUSH_ENTRIES", "64"))
+TRANSCRIPT_FLUSH_MS = int(os.getenv("TRANSCRIPT_FLUSH_MS", "200"))
+# fsync policy: "never" (leave it to the OS), "batch" (after every group commit),
+# or "interval" (at most once every TRANSCRIPT_FSYNC_INTERVAL_SECONDS)
+TRANSCRIPT_FSYNC = os.getenv("TRANSCRIPT_FSYNC", "batch").lower()
+TRANSCRIPT_FSYNC_INTERVAL_SECONDS = float(os.getenv("TRANSCRIPT_FSYNC_INTERVAL_SECONDS", "1.0"))
+# Rotation thresholds for the active segment (0 disables either one)
+TRANSCRIPT_ROTATE_BYTES = int(os.getenv("TRANSCRIPT_ROTATE_BYTES", str(64 * 1024 * 1024)))
+TRANSCRIPT_ROTATE_SECONDS = float(os.getenv("TRANSCRIPT_ROTATE_SECONDS", str(7 * 24 * 3600)))
+# Sidecar index: sessionId -> segment + byte offsets ("0" disables it)
+TRANSCRIPT_INDEX_ENABLED = os.getenv("TRANSCRIPT_INDEX", "1") != "0"
+TRANSCRIPT_INDEX_FILE = LOGS_DIR / "transcripts.index.sqlite3"
+
+_STOP = object()
+
+
+def _timestamp_of(line) -> Optional[float]:
+    """Epoch seconds of a transcript line's `timestamp` field, if it has one."""
+    try:
+        return datetime.fromisoformat(json.loads(line)["timestamp"]).timestamp()
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class TranscriptWriter:
+    """
+    Background appender for a JSONL file.
+
+    Lines are queued by `write()` and committed by a dedicated thread. Each group
+    commit is a single `O_APPEND` write taken under an exclusive `flock`, so lines
+    from several worker processes never interleave.
+
+    Rotation also happens under the lock: the active file is hard-linked to its
+    archive name, the index is re-pointed, and only then is the active name
+    unlinked, so readers always find every indexed line. Other processes notice
+    the new inode on their next commit and reopen.
+
+    Args:
+        path: File to append to
+        flush_entries: Commit as soon as this many lines are queued
+        flush_ms: Otherwise commit this long after the first queued line
+        fsync: "never", "batch" or "interval"
+        fsync_interval: Minimum seconds between fsyncs for the "interval" policy
+        rotate_bytes: Rotate once the active file reaches this size (0 = never)
+        rotate_seconds: Rotate once the active file's first line is this old (0 = never)
+        index: Optional TranscriptIndex updated with every committed line
+    """
+
+    def __init__(
+        self,
+        path: Path = TRANSCRIPT_FILE,
+        flush_entries: int = TRANSCRIPT_FLUSH_ENTRIES,
+        flush_ms: int = TRANSCRIPT_FLUSH_MS,
+        fsync: str = TRANSCRIPT_FSYNC,
+        fsync_interval: float = TRANSCRIPT_FSYNC_INTERVAL_SECONDS,
+        rotate_bytes: int = 0,
+        rotate_seconds: float = 0,
+        index: Optional[TranscriptIndex] = None,
+    ):
+        if fsync not in ("never", "batch", "interval"):
+            raise ValueError(f"Unknown fsync policy: {fsync!r} (expected 'never', 'batch' or 'interval')")
+        self.path = Path(path)
+        self.flush_entries = max(1, flush_entries)
+        self.flush_seconds = flush_ms / 1000.0
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.index = index
+        self.rotations = 0
+        self.commits = 0
+        self.lines_written = 0
+        self._queue = queue.Queue()
+        # Lines queued but not committed yet, oldest first (readable through `pending`)
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
+        self._last_fsync = 0.0
+        self._fd = None
+        self._lock_fd = None
+        self._segment_started = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, line: str, key: Optional[str] = None) -> None:
+        """
+        Queues one line (must end with a newline). Never blocks on disk.
+        `key` (the session id) is recorded in the index alongside the line's location.
+        """
+        if self._closed:
+            raise RuntimeError("TranscriptWriter is closed")
+        with self._pending_lock:
+            self._pending.append((line, key))
+            self._queue.put((line, key))
+
+    def pending(self, key: str) -> List[str]:
+        """Lines queued for `key` that have not been committed yet, oldest first. Never waits for a commit."""
+        with self._pending_lock:
+            return [line for line, line_key in self._pending if line_key == key]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every line queued so far has been committed. Returns False on timeout."""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Commits everything still queued and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            # Keep collecting until the batch is full, the deadline passes, or a flush/stop arrives
+            while len(batch) < self.flush_entries and isinstance(batch[-1], tuple):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            lines = [item for item in batch if isinstance(item, tuple)]
+            if lines:
+                try:
+                    self._commit(lines)
+                    self.lines_written += len(lines)
+                except Exception as e:
+                    print(f"[ERROR] Could not write transcript batch ({len(lines)} lines): {e}")
+                with self._pending_lock:
+                    for _ in lines:
+                        self._pending.popleft()
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if batch[-1] is _STOP:
+                self._close_fd()
+                if self._lock_fd is not None:
+                    os.close(self._lock_fd)
+                    self._lock_fd = None
+                return
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._segment_started = self._read_segment_start()
+        return self._fd
+
+    def _close_fd(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _read_segment_start(self) -> Optional[float]:
+        """Age of the active segment, taken from its first line's timestamp."""
+        try:
+            with open(self.path, "rb") as f:
+                return _timestamp_of(f.readline())
+        except OSError:
+            return None
+
+    def _reopen_if_rotated(self) -> int:
+        """Another process may have rotated the file since we opened it."""
+        fd = self._open()
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(fd).st_ino:
+            self._close_fd()
+            fd = self._open()
+        return fd
+
+    def _should_rotate(self, fd: int) -> bool:
+        if self.rotate_bytes and os.fstat(fd).st_size >= self.rotate_bytes:
+            return True
+        if self.rotate_seconds and self._segment_started is not None:
+            return time.time() - self._segment_started >= self.rotate_seconds
+        return False
+
+    def _rotate(self) -> Path:
+        """Archives the active file (caller holds the lock). Returns the archived path."""
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        archived = self.path.with_name(f"{self.path.stem}-{stamp}{self.path.suffix}")
+        os.link(self.path, archived)
+        if self.index is not None:
+            self.index.rename_segment(self.path.name, archived.name)
+        os.unlink(self.path)
+        self._close_fd()
+        self.rotations += 1
+        return archived
+
+    def _lock_file(self) -> int:
+        # A separate lock file, because the active file's descriptor is closed on rotation
+        if self._lock_fd is None:
+            lock_path = self.path.with_name(self.path.name + ".lock")
+            self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._lock_fd
+
+    def _commit(self, lines: List[tuple]) -> None:
+        payload = "".join(line for line, _ in lines).encode("utf-8")
+        archived = None
+        lock_fd = self._lock_file()
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            fd = self._reopen_if_rotated()
+            if self._should_rotate(fd):
+                archived = self._rotate()
+                fd = self._open()
+            if self._segment_started is None:
+                self._segment_started = _timestamp_of(lines[0][0]) or time.time()
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            view = memoryview(payload)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            if self.index is not None:
+                rows = []
+                for line, key in lines:
+                    length = len(line.encode("utf-8"))
+                    if key is not None:
+                        rows.append((key, self.path.name, None, offset, length))
+                    offset += length
+                self.index.add(rows)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        self.commits += 1
+        self._maybe_fsync(fd)
+        if archived is not None:
+            # Compress outside the lock; nobody appends to the archived inode any more
+            try:
+                compress_segment(archived, self.index)
+            except Exception as e:
+                print(f"[WARN] Could not compress transcript segment {archived.name}: {e}")
+
+    def _maybe_fsync(self, fd: int) -> None:
+        if self.fsync == "batch":
+            os.fsync(fd)
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(fd)
+                self._last_fsync = now
+
+
+_writer = None
+_writer_lock = threading.Lock()
+_index = None
+
+
+def get_transcript_index() -> Optional[TranscriptIndex]:
+    """Returns the sidecar index (None when TRANSCRIPT_INDEX=0)."""
+    global _index
+    if _index is None and TRANSCRIPT_INDEX_ENABLED:
+        _index = TranscriptIndex(TRANSCRIPT_INDEX_FILE, LOGS_DIR, TRANSCRIPT_FILE.name)
+    return _index
+
+
+def get_transcript_writer() -> TranscriptWriter:
+    """Returns the process-wide transcript writer, starting it on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                index = get_transcript_index()
+                _writer = TranscriptWriter(
+                    TRANSCRIPT_FILE,
+                    rotate_bytes=TRANSCRIPT_ROTATE_BYTES,
+                    rotate_seconds=TRANSCRIPT_ROTATE_SECONDS,
+                    index=index,
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+
+def flush_transcripts(timeout: Optional[float] = 5.0) -> None:
+    """Commits all queued transcript lines (call on shutdown)."""
+    if _writer is not None:
+        _writer.flush(timeout)
+
 
 def log_message(
     session_id: str,
@@ -23,13 +335,16 @@ def log_message(
 ) -> None:
     """
     Log a single message to the JSONL transcript file.
-    
+
+    The line is queued for the background writer; it reaches disk within
+    TRANSCRIPT_FLUSH_MS (or immediately on `flush_transcripts()`).
+
     Args:
         session_id: Unique identifier for the chat session
         role: The sender of the message ('user' or 'model')
         message: The message content
         metadata: Optional dict with user info (user_name, user_email, user_id)
-    
+
     Log Format:
         {
             "metadata": {...},           # First (if provided)
@@ -40,16 +355,50 @@ def log_message(
         }
     """
     entry = {}
-    
+
     # Metadata first (user preference)
     if metadata:
         entry["metadata"] = metadata
-    
+
     entry["timestamp"] = datetime.now(timezone.utc).isoformat()
     entry["sessionId"] = session_id
     entry["role"] = role
     entry["message"] = message
-    
-    with open(TRANSCRIPT_FILE, "a") as f:
-        f.write(json.dumps(entry) + "\n")
 
+    get_transcript_writer().write(json.dumps(entry) + "\n", key=session_id)
+
+
+def read_session_messages(session_id: str) -> List[dict]:
+    """
+    Returns every transcript entry logged for a session, oldest first.
+
+    Uses the sidecar index when available; otherwise falls back to scanning the
+    active transcript file. Lines still queued in this process's writer are
+    included without forcing a commit, so reading never costs a flush.
+    """
+    # Snapshot the queue before reading the committed lines: a line committed in
+    # between then shows up in both and is skipped below, instead of in neither
+    pending = [json.loads(line) for line in _writer.pending(session_id)] if _writer is not None else []
+    entries = _read_committed(session_id)
+    if pending:
+        committed_tail = entries[-len(pending):]
+        entries += [entry for entry in pending if entry not in committed_tail]
+    return entries
+
+
+def _read_committed(session_id: str) -> List[dict]:
+    index = get_transcript_index()
+    if index is not None:
+        return index.read_session(session_id)
+
+    entries = []
+    if TRANSCRIPT_FILE.exists():
+        with open(TRANSCRIPT_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("sessionId") == session_id:
+                    entries.append(entry)
+    return entries
@@ -0,0 +1,177 @@
+"""
+metrics.py
+
+In-process metrics and tracing for the request path, exposed in Prometheus text
+format at GET /metrics.
+
+Histograms and counters are plain Python, with no client library, and they are
+thread-safe. `timed(...)` measures one stage into a histogram. When the
+OpenTelemetry API is installed it also opens a span named after the stage that
+carries the session ID. Without a configured OpenTelemetry SDK those spans are
+no-ops, so traces go wherever the deployment points its SDK.
+
+Metrics are per process. With several uvicorn workers, scrape each one or sum
+the series in Prometheus.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("investment-copilot")
+except ImportError:  # pragma: no cover - tracing is optional
+    _tracer = None
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Seconds; spans sub-millisecond local stages up to slow Gemini turns
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(labelnames: Sequence[str], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter, one series per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket = _label_text(self.labelnames, key, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                labels = _label_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total:.6f}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# --- Request path metrics ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "copilot_http_request_seconds", "HTTP request latency by route and status.", ["method", "route", "status"])
+STAGE_SECONDS = Histogram(
+    "copilot_stage_seconds", "Latency of request stages (rate_limit, transcript_log, post_report_injection, malformed_fallback).", ["stage"])
+CREATE_CHAT_SECONDS = Histogram(
+    "copilot_create_chat_seconds", "create_chat latency by outcome (hit = live session reused).", ["result"])
+GEMINI_SECONDS = Histogram(
+    "copilot_gemini_call_seconds", "Gemini round-trip latency by call kind.", ["call"])
+TOOL_SECONDS = Histogram(
+    "copilot_tool_seconds", "Tool execution time per tool.", ["tool"])
+TOOL_ERRORS = Counter(
+    "copilot_tool_errors_total", "Tool calls that failed or timed out.", ["tool", "reason"])
+CHAT_TURNS = Counter(
+    "copilot_chat_turns_total", "User turns by how they were answered (model or fast_path).", ["path"])
+MALFORMED_FALLBACKS = Counter(
+    "copilot_malformed_fallback_total", "MALFORMED_FUNCTION_CALL fallbacks by outcome.", ["outcome"])
+RATE_LIMITED = Counter(
+    "copilot_rate_limited_total", "Requests rejected by the rate limiter.")
+
+METRICS = [
+    HTTP_REQUEST_SECONDS, STAGE_SECONDS, CREATE_CHAT_SECONDS, GEMINI_SECONDS, TOOL_SECONDS,
+    TOOL_ERRORS, CHAT_TURNS, MALFORMED_FALLBACKS, RATE_LIMITED,
+]
+
+
+@contextmanager
+def timed(histogram: Histogram, session_id: Optional[str] = None, **labels):
+    """
+    Times the enclosed block into `histogram` (with `labels`) and traces it as a
+    span with the session ID. Yields a dict whose labels may be updated inside the
+    block (e.g. the create_chat outcome, known only at the end).
+    """
+    labels = dict(labels)
+    if not METRICS_ENABLED:
+        yield labels
+        return
+    span_name = histogram.name.replace("copilot_", "").rsplit("_seconds", 1)[0]
+    start = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield labels
+        finally:
+            histogram.observe(time.perf_counter() - start, **labels)
+        return
+    with _tracer.start_as_current_span(f"copilot.{span_name}") as span:
+        try:
+            yield labels
+        finally:
+            histogram.observe(time.perf_counter() - start, **labels)
+            if span.is_recording():
+                span.set_attribute("session.id", session_id or "")
+                for name, value in labels.items():
+                    span.set_attribute(f"copilot.{name}", str(value))
+
+
+def render(gauges: Optional[dict] = None) -> str:
+    """
+    All metrics in Prometheus text format (version 0.0.4).
+    `gauges` adds point-in-time values: {name: (help, value)}.
+    """
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    for name, (documentation, value) in (gauges or {}).items():
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+    return "\n".join(lines) + "\n"
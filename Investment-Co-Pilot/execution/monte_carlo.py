@@ -0,0 +1,214 @@
+"""
+monte_carlo.py
+
+Monte Carlo outcome simulator for a recommended allocation.
+
+Takes the output of `calculate_holistic_allocation` and simulates many yearly
+return paths for equity, bonds and the fun bucket. Returns are correlated and
+lognormal, in real terms (after inflation). The portfolio is rebalanced back to
+the allocation every year, and any unallocated share is held as cash at a 0%
+real return. The result gives percentile wealth paths and the probability of a
+shortfall, and `generate_ips_markdown(simulation=...)` can embed it.
+
+Paths are simulated in chunks. Each chunk gets its own child of one SeedSequence,
+so results depend only on the seed, not on the chunk-to-worker assignment.
+Chunks run on a process pool when there is more than one. A chunk reduces its
+paths to per-year histograms of log wealth before returning, so memory is set by
+the chunk size, not by the number of paths. Percentiles are read from the merged
+histograms, which are accurate to within one bin (under 0.5% of the value).
+
+Usage:
+    python -m execution.monte_carlo --age 35 --paths 100000 --seed 7
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+MC_PATHS = int(os.getenv("MC_PATHS", "20000"))
+MC_CHUNK_SIZE = int(os.getenv("MC_CHUNK_SIZE", "20000"))
+MC_WORKERS = int(os.getenv("MC_WORKERS", str(os.cpu_count() or 1)))
+
+# Long-run real (after inflation) annual return assumptions per sleeve
+RETURN_ASSUMPTIONS = {
+    "equity": {"mean": 0.05, "volatility": 0.17},
+    "bonds": {"mean": 0.02, "volatility": 0.06},
+    "fun": {"mean": 0.00, "volatility": 0.60},
+}
+CORRELATIONS = np.array([
+    [1.0, 0.1, 0.3],
+    [0.1, 1.0, 0.0],
+    [0.3, 0.0, 1.0],
+])
+# Sleeve -> allocation key, in CORRELATIONS order
+ALLOCATION_KEYS = (("equity", "equity_pct"), ("bonds", "bonds_pct"), ("fun", "fun_bucket_pct"))
+
+# Log-wealth histogram: wealth as a multiple of the amount contributed, 1e-4x .. 1e4x
+_HIST_BINS = 4096
+_HIST_LOG_RANGE = (np.log(1e-4), np.log(1e4))
+
+
+def _log_return_params():
+    """Lognormal (mu, sigma) per sleeve matching each arithmetic mean and volatility."""
+    mean = np.array([RETURN_ASSUMPTIONS[name]["mean"] for name, _ in ALLOCATION_KEYS])
+    vol = np.array([RETURN_ASSUMPTIONS[name]["volatility"] for name, _ in ALLOCATION_KEYS])
+    sigma = np.sqrt(np.log1p((vol / (1 + mean)) ** 2))
+    mu = np.log1p(mean) - sigma ** 2 / 2
+    return mu, sigma
+
+
+def _simulate_chunk(task: tuple) -> tuple:
+    """
+    Worker entry point: simulates one chunk of paths.
+    Returns (per-year log-wealth histogram counts, shortfall count, sum of final values).
+    """
+    seed, paths, weights, years, initial_value, contribution, scale, target_value = task
+    rng = np.random.default_rng(seed)
+    mu, sigma = _log_return_params()
+    chol = np.linalg.cholesky(CORRELATIONS)
+
+    shocks = rng.standard_normal((paths, years, len(mu))) @ chol.T
+    gross = np.exp(mu + sigma * shocks)
+    # Rebalanced yearly: the portfolio return is the weighted sleeve return (cash earns 0)
+    portfolio = gross @ weights + (1.0 - weights.sum())
+    del shocks, gross
+
+    counts = np.zeros((years, _HIST_BINS), dtype=np.int64)
+    low, high = _HIST_LOG_RANGE
+    wealth = np.full(paths, float(initial_value))
+    for year in range(years):
+        wealth = wealth * portfolio[:, year] + contribution
+        with np.errstate(divide="ignore"):
+            position = (np.log(wealth / scale) - low) / (high - low) * _HIST_BINS
+        bins = np.clip(position, 0, _HIST_BINS - 1).astype(np.int64)
+        counts[year] = np.bincount(bins, minlength=_HIST_BINS)
+    return counts, int((wealth < target_value).sum()), float(wealth.sum())
+
+
+def _percentile_from_counts(counts: np.ndarray, total: int, pct: float) -> float:
+    """Reads one percentile from a log-wealth histogram (log-linear within the bin)."""
+    cumulative = np.cumsum(counts)
+    rank = pct / 100.0 * total
+    index = int(np.searchsorted(cumulative, rank, side="left"))
+    index = min(index, _HIST_BINS - 1)
+    before = cumulative[index - 1] if index > 0 else 0
+    fraction = (rank - before) / counts[index] if counts[index] else 0.5
+    low, high = _HIST_LOG_RANGE
+    width = (high - low) / _HIST_BINS
+    return float(np.exp(low + (index + min(max(fraction, 0.0), 1.0)) * width))
+
+
+def simulate_outcomes(
+    allocation: dict,
+    initial_value: float = 100_000,
+    annual_contribution: float = 0,
+    years: int = 30,
+    paths: int = MC_PATHS,
+    seed: Optional[int] = None,
+    workers: int = MC_WORKERS,
+    chunk_size: int = MC_CHUNK_SIZE,
+    target_value: Optional[float] = None,
+    percentiles: Sequence[int] = (10, 50, 90),
+) -> dict:
+    """
+    Simulates the range of outcomes for an allocation.
+
+    Args:
+        allocation: Output of `calculate_holistic_allocation` (equity_pct,
+            bonds_pct, fun_bucket_pct; anything unallocated is held as cash)
+        initial_value: Starting portfolio value
+        annual_contribution: Added at the end of every year
+        years: Horizon
+        paths: Number of simulated return paths
+        seed: Makes the result reproducible (a fresh seed is drawn and reported if None)
+        workers: Processes for multi-chunk runs (1 = in process)
+        chunk_size: Paths simulated per chunk (bounds memory)
+        target_value: Shortfall threshold for the final value (default: the total
+            amount contributed, i.e. losing money in real terms)
+        percentiles: Percentile wealth paths to report
+
+    Returns:
+        Dict with the inputs, `percentiles` ({pct: [value at year 0..years]}),
+        `shortfall_probability` and `mean_final_value`
+    """
+    if years < 1 or paths < 1:
+        raise ValueError("years and paths must be positive")
+    contributed = initial_value + annual_contribution * years
+    if contributed <= 0:
+        raise ValueError("initial_value or annual_contribution must be positive")
+    if target_value is None:
+        target_value = contributed
+
+    weights = np.array([allocation.get(key, 0) for _, key in ALLOCATION_KEYS], dtype=np.float64) / 100.0
+    seed_sequence = np.random.SeedSequence(seed)
+    sizes = [min(chunk_size, paths - start) for start in range(0, paths, max(1, chunk_size))]
+    tasks = [
+        (child, size, weights, years, initial_value, annual_contribution, contributed, target_value)
+        for child, size in zip(seed_sequence.spawn(len(sizes)), sizes)
+    ]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_simulate_chunk, tasks))
+    else:
+        results = [_simulate_chunk(task) for task in tasks]
+
+    counts = sum(r[0] for r in results)
+    shortfalls = sum(r[1] for r in results)
+    final_sum = sum(r[2] for r in results)
+
+    paths_by_pct = {}
+    for pct in percentiles:
+        path = [float(initial_value)]
+        path += [contributed * _percentile_from_counts(counts[year], paths, pct) for year in range(years)]
+        paths_by_pct[pct] = [round(value, 2) for value in path]
+
+    return {
+        "paths": paths,
+        "years": years,
+        "seed": seed if seed is not None else seed_sequence.entropy,
+        "allocation": {key: allocation.get(key, 0) for _, key in ALLOCATION_KEYS},
+        "initial_value": initial_value,
+        "annual_contribution": annual_contribution,
+        "target_value": target_value,
+        "percentiles": paths_by_pct,
+        "shortfall_probability": round(shortfalls / paths, 4),
+        "mean_final_value": round(final_sum / paths, 2),
+    }
+
+
+def main():
+    from execution.financial_utils import calculate_holistic_allocation
+
+    parser = argparse.ArgumentParser(description="Simulate the range of outcomes for a recommended allocation.")
+    parser.add_argument("--age", type=int, required=True, help="Investor's age")
+    parser.add_argument("--risk", type=str, default="moderate", choices=["aggressive", "moderate", "conservative"], help="Risk profile")
+    parser.add_argument("--goal", type=str, default="longevity", help="Primary goal (liquidity/longevity/legacy)")
+    parser.add_argument("--fun_bucket", type=int, default=0, help="Fun bucket percentage (0-100)")
+    parser.add_argument("--initial", type=float, default=100_000, help="Starting portfolio value")
+    parser.add_argument("--contribution", type=float, default=0, help="Yearly contribution")
+    parser.add_argument("--years", type=int, default=30, help="Horizon in years")
+    parser.add_argument("--paths", type=int, default=MC_PATHS, help="Simulated paths")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument("--workers", type=int, default=MC_WORKERS, help="Worker processes")
+    args = parser.parse_args()
+
+    allocation = calculate_holistic_allocation(age=args.age, risk_profile=args.risk, goal=args.goal, fun_bucket_pct=args.fun_bucket)
+    result = simulate_outcomes(
+        allocation,
+        initial_value=args.initial,
+        annual_contribution=args.contribution,
+        years=args.years,
+        paths=args.paths,
+        seed=args.seed,
+        workers=args.workers,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,29 +5,99 @@ This allows us to trace tool execution and handle errors properly.
 """
 from google import genai
 from google.genai import types
+import asyncio
 import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from execution.financial_utils import calculate_holistic_allocation
-from execution.generate_ips import generate_ips_markdown
+from execution.generate_ips import IPS_SECTIONS, find_ips_section, generate_ips_markdown, split_ips_sections, summarize_ips
+from execution.ips_cache import cached_generate_ips_markdown
 from execution.data_mapper import build_ips_context
+from execution.session_store import SessionStore
+from execution.session_backend import StaleSessionError, create_session_backend
+from execution.logging_utils import read_session_messages
+from execution.context_cache import ContextCache, is_cache_rejection
+from execution.history_manager import HistoryManager
+from execution.confirmation import confirmed_args, is_affirmative, is_complete, parse_confirmation
+from execution import profiling
+from execution.metrics import (CHAT_TURNS, CREATE_CHAT_SECONDS, GEMINI_SECONDS, MALFORMED_FALLBACKS,
+                               STAGE_SECONDS, TOOL_ERRORS, TOOL_SECONDS, timed)
 
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
 
-# Load system instruction from file
+# System instruction, read through _context_cache so edits are picked up without a restart
 DIRECTIVE_PATH = Path(__file__).parent.parent / "directives" / "orchestrator_directive.md"
-with open(DIRECTIVE_PATH, "r") as f:
-    SYSTEM_INSTRUCTION = f.read()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-3-pro-preview")
+
+# Directive + tool declarations, cached server-side once and shared by every session
+_context_cache = ContextCache(DIRECTIVE_PATH)
+
+# Token budget for chat histories: older turns are folded into a rolling summary
+_history = HistoryManager()
 
 _client = None
-_sessions = {}  # Simple in-memory session store
+
+# Bounded worker pool for the blocking Gemini round trips.
+# Async callers (the API) hop onto it so the event loop never waits on the network.
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "256"))
+_executor = None
+
+# What the model keeps after an IPS is shown: "summary" (structured digest, sections
+# on demand through get_ips_section) or "full" (the whole document, as before)
+POST_REPORT_CONTEXT = os.getenv("POST_REPORT_CONTEXT", "summary").lower()
+
+# Answer "yes" to a complete confirmation block locally instead of waiting for the model's tool call
+CONFIRMATION_FAST_PATH = os.getenv("CONFIRMATION_FAST_PATH", "1").lower() not in ("0", "false", "no")
+# Model turn recorded in the history after a locally answered confirmation
+_FAST_PATH_ACK = "The Investment Policy Statement above was generated from the confirmed inputs and shown to the user."
+
+# Tool calls from one model turn run concurrently on their own pool, each with a timeout
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "32"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "30"))
+TOOL_TIMEOUTS = {
+    "calculate_holistic_allocation": float(os.getenv("TOOL_TIMEOUT_ALLOCATION_SECONDS", "10")),
+    "get_ips_section": float(os.getenv("TOOL_TIMEOUT_IPS_SECTION_SECONDS", "10")),
+}
+# Model turns that may request tools for one user message before we give up
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "4"))
+_tool_executor = None
+
+class SessionBusyError(RuntimeError):
+    """A turn was started while another turn on the same session was still running."""
+
 
 # Tool registry for manual function calling
 TOOLS = {
     "calculate_holistic_allocation": calculate_holistic_allocation,
-    "generate_ips_markdown": generate_ips_markdown,
+    "generate_ips_markdown": cached_generate_ips_markdown,
 }
 
 
+# Declaration only: the orchestrator answers get_ips_section from the session's own report
+GET_IPS_SECTION = types.FunctionDeclaration(
+    name="get_ips_section",
+    description=(
+        "Returns one section of the Investment Policy Statement already shown to the user, verbatim. "
+        "Use it when a follow-up question needs the exact wording of the report."
+    ),
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "section": types.Schema(
+                type=types.Type.STRING,
+                description='Section number ("1" to "6") or part of a heading, e.g. "Risk Management Rules", '
+                            '"Why This Allocation", "Core Portfolio", "Glide Path", "Disclaimer".',
+            ),
+        },
+        required=["section"],
+    ),
+)
+
+
 def get_client():
     """Configures and returns the GenAI Client."""
     global _client
@@ -42,6 +112,43 @@ def get_client():
     return _client
 
 
+def estimate_session_bytes(orchestrator) -> int:
+    """Approximate memory held by a session: the text and tool payloads in its chat history."""
+    total = 0
+    for content in orchestrator.get_history():
+        for part in content.parts or []:
+            if part.text:
+                total += len(part.text)
+            elif part.function_response is not None:
+                total += len(str(part.function_response.response))
+            elif part.function_call is not None:
+                total += len(str(part.function_call.args))
+    return total
+
+
+# Bounded in-memory session store (LRU + idle TTL, limits configurable via env)
+_sessions = SessionStore(sizer=estimate_session_bytes)
+
+# Optional persistent backend (SESSION_BACKEND=sqlite) shared by all workers on the node
+_backend = create_session_backend()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the shared executor used by `send_message_async`."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHATS, thread_name_prefix="gemini")
+    return _executor
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Returns the shared executor tool calls run on."""
+    global _tool_executor
+    if _tool_executor is None:
+        _tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+    return _tool_executor
+
+
 class InvestmentCoPilotOrchestrator:
     """Orchestrates the Investment Co-Pilot conversation using MANUAL function calling."""
     
@@ -51,6 +158,24 @@ class InvestmentCoPilotOrchestrator:
         self.client = get_client()
         self.chat = None
         self.session_id = None
+        # One turn at a time per session: the chat history is not safe to mutate concurrently.
+        # Async callers queue on _turn_lock (no executor thread is held while they wait);
+        # _lock guards the turn itself and is never waited on, since a stream holds it
+        # across its yields.
+        self._turn_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+        # Persistent backend bookkeeping: stored revision and how many messages it holds
+        self._revision = 0
+        self._persisted = 0
+        # Name of the cached context the chat was built on (None = inline instruction)
+        self._cache_name = None
+        # Set once the first turn has resolved the context (cached or inline)
+        self._context_resolved = False
+        self._user_name = None
+        # Markdown of the last IPS shown in this session (for get_ips_section)
+        self._ips = None
+        # Slots of the confirmation block in the model's last reply (None if it had none)
+        self._confirmed = None
     
     def start_session(self, session_id: Optional[str] = None, user_name: Optional[str] = None, history: Optional[list] = None) -> str:
         """
@@ -59,127 +184,156 @@ class InvestmentCoPilotOrchestrator:
         Args:
             session_id: Optional session identifier for tracking
             user_name: Optional user name for personalization
-            history: Optional conversation history to resume
+            history: Optional conversation history to resume. If omitted and a
+                persistent backend is configured, the stored history is loaded.
             
         Returns:
             Initial greeting from the agent
         """
         self.session_id = session_id
         
-        # Customize system instruction with user context
-        instruction = SYSTEM_INSTRUCTION
-        if user_name:
-            instruction = f"User Name: {user_name}\n\n" + instruction
+        if history is None and session_id and _backend is not None:
+            history, self._revision = _backend.load(session_id)
+            self._persisted = len(history)
         
-        # Define tools - pass Python functions directly
-        tools_list = [calculate_holistic_allocation, generate_ips_markdown]
+        # Replayed histories (client-supplied or stored) are held to the same budget
+        history, compacted = _history.compact(history or [])
+        if compacted:
+            print(f"[DEBUG] Session {session_id} history compacted to {len(history)} messages")
+            self._persisted = 0  # The stored copy must be rewritten
         
-        # Create chat with MANUAL function calling (disable=True)
-        self.chat = self.client.chats.create(
-            model="gemini-3-pro-preview",
-            config=types.GenerateContentConfig(
-                system_instruction=instruction,
-                tools=tools_list,
-                automatic_function_calling=types.AutomaticFunctionCallingConfig(
-                    disable=True,  # DISABLE automatic - we handle it manually
-                ),
-            ),
-            history=history if history else []
-        )
+        # Personalized chats need their own instruction. The rest start inline and move onto
+        # the shared cached context in `_ensure_context`, which runs on the executor with the
+        # first turn, so creating the cache never blocks the caller here
+        self._user_name = user_name
+        self._cache_name = None
+        if user_name:
+            self._context_resolved = True
+            _context_cache.record_session(False)
+        self.chat = self._create_chat(history)
+        self._confirmed = self._last_confirmation()
         
         # Store session
-        if session_id:
-            _sessions[session_id] = self
+        self._remember()
         
         # Return empty - welcome message is in the directive's initial context
         return ""
     
-    def _process_response(self, response) -> str:
+    @staticmethod
+    def _tools() -> list:
+        """Define tools - Python functions directly, plus the declaration-only get_ips_section."""
+        return [calculate_holistic_allocation, generate_ips_markdown, types.Tool(function_declarations=[GET_IPS_SECTION])]
+    
+    def _create_chat(self, history: Optional[list]):
+        """Creates the Gemini chat with MANUAL function calling, on the cached context if there is one."""
+        manual = types.AutomaticFunctionCallingConfig(
+            disable=True,  # DISABLE automatic - we handle it manually
+        )
+        if self._cache_name:
+            # The cache already holds the system instruction and tools
+            config = types.GenerateContentConfig(
+                cached_content=self._cache_name,
+                automatic_function_calling=manual,
+            )
+        else:
+            # Customize system instruction with user context
+            instruction = _context_cache.directive()
+            if self._user_name:
+                instruction = f"User Name: {self._user_name}\n\n" + instruction
+            config = types.GenerateContentConfig(
+                system_instruction=instruction,
+                tools=self._tools(),
+                automatic_function_calling=manual,
+            )
+        return self.client.chats.create(model=GEMINI_MODEL, config=config, history=history if history else [])
+    
+    def _ensure_context(self) -> None:
+        """
+        Moves the chat onto the current cached context (or off it, if caching failed).
+        Called before every turn, so refreshed caches and directive edits reach
+        long-running sessions. The history carries over unchanged.
+        """
+        if self._user_name:
+            return
+        name = _context_cache.get(self.client, GEMINI_MODEL, self._tools())
+        if not self._context_resolved:
+            self._context_resolved = True
+            _context_cache.record_session(name is not None)
+        elif name != self._cache_name:
+            print(f"[DEBUG] Session {self.session_id} switching context: {self._cache_name} -> {name}")
+        if name != self._cache_name:
+            self._cache_name = name
+            self.chat = self._create_chat(self.get_history())
+    
+    def _compact_history(self) -> None:
+        """Folds older turns into the rolling summary once the history exceeds its token budget."""
+        history, compacted = _history.compact(self.get_history())
+        if compacted:
+            print(f"[DEBUG] Session {self.session_id} history compacted to {len(history)} messages")
+            self.chat = self._create_chat(history)
+            self._persisted = 0  # The stored copy must be rewritten
+    
+    def _is_cache_error(self, error: Exception) -> bool:
+        """True if a failed turn was rejected because its cached context is gone (expired/deleted)."""
+        return self._cache_name is not None and is_cache_rejection(error)
+    
+    def _drop_cache(self, error: Exception) -> None:
+        """Drops a rejected cache and rebuilds the chat on a fresh one (or the inline instruction)."""
+        print(f"[WARN] Cached context {self._cache_name} rejected, rebuilding chat: {error}")
+        _context_cache.invalidate(self.client, self._cache_name)
+        self._ensure_context()
+    
+    @contextmanager
+    def _turn(self):
+        """Holds the session for one turn, refusing (SessionBusyError) if another turn has it."""
+        if not self._lock.acquire(blocking=False):
+            raise SessionBusyError(f"Session {self.session_id} is busy with another turn")
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def _remember(self) -> None:
+        """
+        (Re-)registers this session in the store, refreshing its recency and size.
+        With a persistent backend, the messages added since the last save are written too.
+        If another worker saved the session since this copy was loaded, the save is refused
+        and this copy is dropped, so the next request reloads the stored history.
+        """
+        if not self.session_id:
+            return
+        if _backend is not None:
+            history = self.get_history()
+            if len(history) != self._persisted:
+                try:
+                    self._revision = _backend.save(self.session_id, history, self._persisted, self._revision)
+                    self._persisted = len(history)
+                except StaleSessionError as e:
+                    print(f"[WARN] Session {self.session_id} changed elsewhere, turn not persisted: {e}")
+                    if _sessions.get(self.session_id) is self:
+                        _sessions.pop(self.session_id)
+                    return
+                except Exception as e:
+                    print(f"[WARN] Could not persist session {self.session_id}: {e}")
+        _sessions.put(self.session_id, self)
+    
+    def _process_response(self, response, depth: int = 0) -> str:
         """
         Process the LLM response, handling any function calls manually.
         
-        If the LLM requests a function call, execute it and:
+        If the LLM requests function calls, execute them and:
         - For `generate_ips_markdown`: Return the result DIRECTLY (verbatim)
-        - For other tools: Send result back to LLM for interpretation or chain to next tool
+        - For other tools: Send results back to LLM for interpretation or chain to next tool
+        
+        `depth` counts the tool rounds already spent on this user message.
         """
-        # Check if response contains function calls
-        if response.candidates and response.candidates[0].content.parts:
-            for part in response.candidates[0].content.parts:
-                # Check if this part is a function call
-                if hasattr(part, 'function_call') and part.function_call:
-                    func_call = part.function_call
-                    func_name = func_call.name
-                    func_args = dict(func_call.args) if func_call.args else {}
-                    
-                    print(f"[DEBUG] Tool called: {func_name}")
-                    print(f"[DEBUG] Args: {func_args}")
-                    
-                    # Execute the function
-                    if func_name in TOOLS:
-                        try:
-                            result = TOOLS[func_name](**func_args)
-                            print(f"[DEBUG] Tool result: {type(result).__name__}")
-                            
-                            # CRITICAL: For generate_ips_markdown, return DIRECTLY
-                            if func_name == "generate_ips_markdown":
-                                print("[DEBUG] Returning IPS VERBATIM")
-                                return result  # Bypass LLM interpretation!
-                            
-                            # AUTO-CHAIN: If calculate_holistic_allocation, immediately generate IPS
-                            if func_name == "calculate_holistic_allocation":
-                                print("[DEBUG] Auto-chaining generate_ips_markdown...")
-                                print(f"[DEBUG] Allocation result: {result}")
-                                
-                                # The result now contains all needed data (region, esg, age, etc.)
-                                # Pass it directly as the allocation, and extract other fields
-                                ips_args = build_ips_context(result, func_args)
-                                print(f"[DEBUG] IPS args: {ips_args}")
-                                ips_result = TOOLS["generate_ips_markdown"](**ips_args)
-                                print("[DEBUG] Returning IPS VERBATIM (auto-chained)")
-                                
-                                # POST-REPORT CONTEXT INJECTION
-                                # Send the full IPS to the model so it can reference the report
-                                # in follow-up conversations.
-                                print("[DEBUG] Injecting post-report context (full IPS)...")
-                                
-                                function_response = types.Part.from_function_response(
-                                    name="calculate_holistic_allocation",
-                                    response={
-                                        "status": "success", 
-                                        "message": "IPS generated and shown to user. Use this content to answer follow-up questions.",
-                                        "ips_shown_to_user": ips_result
-                                    }
-                                )
-                                
-                                try:
-                                    self.chat.send_message(function_response)
-                                    print("[DEBUG] Post-report context sent successfully")
-                                except Exception as ctx_error:
-                                    print(f"[WARN] Could not inject context: {ctx_error}")
-                                
-                                return ips_result
-                            
-                            # For other tools, send result back to LLM
-                            function_response = types.Part.from_function_response(
-                                name=func_name,
-                                response=result  # Pass raw result
-                            )
-                            
-                            print(f"[DEBUG] Sending tool result back to LLM...")
-                            
-                            # Send function response back to model
-                            followup = self.chat.send_message(function_response)
-                            return self._process_response(followup)
-                            
-                        except Exception as e:
-                            error_msg = f"Error executing {func_name}: {str(e)}"
-                            print(f"[ERROR] {error_msg}")
-                            import traceback
-                            traceback.print_exc()
-                            return f"I encountered an error while calculating: {str(e)}"
-                    else:
-                        print(f"[ERROR] Unknown function: {func_name}")
-                        return f"Unknown function requested: {func_name}"
+        _context_cache.record_usage(response)
+        
+        # Check if response contains function calls (all of them are executed together)
+        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+            func_calls = [part.function_call for part in response.candidates[0].content.parts if part.function_call]
+            if func_calls:
+                return self._execute_function_calls(func_calls, depth)
         
         # No function call - return text response
         text = response.text if response.text else ""
@@ -194,7 +348,7 @@ class InvestmentCoPilotOrchestrator:
                     print("[DEBUG] Detected MALFORMED_FUNCTION_CALL - attempting fallback...")
                     return self._handle_malformed_function_call()
             
-            if response.candidates and response.candidates[0].content.parts:
+            if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
                 print(f"[DEBUG] Number of parts: {len(response.candidates[0].content.parts)}")
                 for i, part in enumerate(response.candidates[0].content.parts):
                     print(f"[DEBUG] Part {i}: {type(part).__name__}")
@@ -207,76 +361,245 @@ class InvestmentCoPilotOrchestrator:
             else:
                 print("[DEBUG] No parts found in response!")
                 print(f"[DEBUG] Raw response: {response}")
+        self._confirmed = parse_confirmation(text)
         return text
     
+    def _execute_function_calls(self, func_calls: list, depth: int = 0) -> str:
+        """
+        Execute every tool call the LLM requested in one turn and return the text for the user.
+        
+        The calls run concurrently on the tool pool, each with its own timeout, and
+        all results go back to the model in a single function-response message.
+        - For `generate_ips_markdown`: Return the result DIRECTLY (verbatim)
+        - For `calculate_holistic_allocation`: Auto-chain the IPS and inject a summary as context
+        - For other tools: Send results back to LLM for interpretation or chain to next tools
+        """
+        self._confirmed = None
+        calls = [(call.name, dict(call.args) if call.args else {}) for call in func_calls]
+        print(f"[DEBUG] Tools called: {', '.join(name for name, _ in calls)}")
+        for name, args in calls:
+            print(f"[DEBUG] Args ({name}): {args}")
+        
+        outcomes = self._run_tools(calls)
+        failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if len(failures) == len(outcomes):
+            # Nothing to hand back to the model: report the (first) error directly
+            error = failures[0]
+            if isinstance(error, LookupError):
+                return str(error)
+            return f"I encountered an error while calculating: {str(error)}"
+        
+        function_responses = [
+            types.Part.from_function_response(
+                name=name,
+                response={"status": "error", "message": str(outcome)} if isinstance(outcome, Exception) else outcome[0],
+            )
+            for (name, _), outcome in zip(calls, outcomes)
+        ]
+        
+        # CRITICAL: An IPS is returned DIRECTLY (Bypass LLM interpretation!)
+        ips_result = next((outcome[1] for outcome in outcomes if not isinstance(outcome, Exception) and outcome[1]), None)
+        if ips_result is not None:
+            self._ips = ips_result
+            print("[DEBUG] Returning IPS VERBATIM")
+            
+            # POST-REPORT CONTEXT INJECTION
+            # Give the model what it needs to reference the report in follow-up
+            # conversations. Every later turn re-sends this, so by default it is a
+            # compact digest; exact sections are fetched with get_ips_section.
+            print(f"[DEBUG] Injecting post-report context ({POST_REPORT_CONTEXT})...")
+            try:
+                with timed(STAGE_SECONDS, self.session_id, stage="post_report_injection"):
+                    _context_cache.record_usage(self.chat.send_message(function_responses))
+                print("[DEBUG] Post-report context sent successfully")
+            except Exception as ctx_error:
+                print(f"[WARN] Could not inject context: {ctx_error}")
+            return ips_result
+        
+        if depth + 1 >= MAX_TOOL_ROUNDS:
+            print(f"[WARN] Tool loop stopped after {MAX_TOOL_ROUNDS} rounds")
+            return "I'm sorry, I couldn't complete that request. Could you rephrase it?"
+        
+        # For other tools, send all results back to LLM in one message
+        print(f"[DEBUG] Sending {len(function_responses)} tool result(s) back to LLM...")
+        with timed(GEMINI_SECONDS, self.session_id, call="tool_followup"):
+            followup = self.chat.send_message(function_responses)
+        return self._process_response(followup, depth + 1)
+    
+    def _run_tools(self, calls: list) -> list:
+        """
+        Runs (name, args) tool calls concurrently on the tool pool.
+        Returns, per call, `_run_tool`'s (response, IPS) or the exception it raised (TimeoutError past its limit).
+        """
+        executor = get_tool_executor()
+        start = time.monotonic()
+        run_tool = profiling.bind(self._run_tool)
+        futures = [executor.submit(run_tool, name, args) for name, args in calls]
+        outcomes = []
+        for (name, _), future in zip(calls, futures):
+            timeout = TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT_SECONDS)
+            try:
+                outcomes.append(future.result(timeout=max(0.0, start + timeout - time.monotonic())))
+            except FuturesTimeoutError:
+                print(f"[ERROR] Tool {name} timed out after {timeout}s")
+                TOOL_ERRORS.inc(tool=name, reason="timeout")
+                outcomes.append(TimeoutError(f"{name} timed out after {timeout}s"))
+            except Exception as e:
+                print(f"[ERROR] Error executing {name}: {str(e)}")
+                TOOL_ERRORS.inc(tool=name, reason="error")
+                import traceback
+                traceback.print_exc()
+                outcomes.append(e)
+        return outcomes
+    
+    def _run_tool(self, func_name: str, func_args: dict) -> tuple:
+        """Executes one tool call. Returns (function response for the model, IPS to show verbatim or None)."""
+        with timed(TOOL_SECONDS, self.session_id, tool=func_name):
+            return self._call_tool(func_name, func_args)
+    
+    def _call_tool(self, func_name: str, func_args: dict) -> tuple:
+        # Session-scoped tool: answered from this session's report
+        if func_name == "get_ips_section":
+            return self._ips_section(func_args.get("section", "")), None
+        if func_name not in TOOLS:
+            print(f"[ERROR] Unknown function: {func_name}")
+            raise LookupError(f"Unknown function requested: {func_name}")
+        
+        result = TOOLS[func_name](**func_args)
+        print(f"[DEBUG] Tool result ({func_name}): {type(result).__name__}")
+        
+        if func_name == "generate_ips_markdown":
+            return {"status": "success", "message": "IPS shown to user verbatim."}, result
+        
+        # AUTO-CHAIN: If calculate_holistic_allocation, immediately generate IPS
+        if func_name == "calculate_holistic_allocation":
+            print("[DEBUG] Auto-chaining generate_ips_markdown...")
+            print(f"[DEBUG] Allocation result: {result}")
+            
+            # The result now contains all needed data (region, esg, age, etc.)
+            # Pass it directly as the allocation, and extract other fields
+            ips_args = build_ips_context(result, func_args)
+            print(f"[DEBUG] IPS args: {ips_args}")
+            ips_result = TOOLS["generate_ips_markdown"](**ips_args)
+            
+            if POST_REPORT_CONTEXT == "full":
+                context = {
+                    "status": "success", 
+                    "message": "IPS generated and shown to user. Use this content to answer follow-up questions.",
+                    "ips_shown_to_user": ips_result
+                }
+            else:
+                context = {
+                    "status": "success",
+                    "message": "IPS generated and shown to user. Use this summary to answer follow-up questions; "
+                               "call get_ips_section for the exact wording of a section.",
+                    "ips_summary": summarize_ips(**ips_args),
+                }
+            return context, ips_result
+        
+        return result, None  # Pass raw result
+    
+    def _last_confirmation(self):
+        """Slots of the confirmation block if the history ends with one (restored sessions)."""
+        history = self.get_history()
+        if not history or history[-1].role != 'model':
+            return None
+        return parse_confirmation("".join(part.text or "" for part in history[-1].parts or []))
+    
+    def _answer_confirmation(self, user_message: str):
+        """
+        FAST PATH: the user just confirmed a complete block. Runs the allocation and
+        IPS locally and returns the IPS (None if this turn must go to the model).
+        
+        The history is extended as if the model had made the call, so follow-up
+        turns see the same tool exchange and post-report context as usual.
+        """
+        if not CONFIRMATION_FAST_PATH or not is_complete(self._confirmed) or not is_affirmative(user_message):
+            return None
+        func_args = confirmed_args(self._confirmed)
+        print(f"[DEBUG] Confirmation fast path: {func_args}")
+        try:
+            context, ips_result = self._run_tool("calculate_holistic_allocation", func_args)
+        except Exception as e:
+            print(f"[WARN] Confirmation fast path failed, asking the model instead: {e}")
+            return None
+        
+        call = types.Part(
+            function_call=types.FunctionCall(name="calculate_holistic_allocation", args=func_args),
+            # Locally made call: no model thought signature to replay
+            thought_signature=b"skip_thought_signature_validator",
+        )
+        self.chat = self._create_chat(self.get_history() + [
+            types.Content(role="user", parts=[types.Part(text=user_message)]),
+            types.Content(role="model", parts=[call]),
+            types.Content(role="user", parts=[
+                types.Part.from_function_response(name="calculate_holistic_allocation", response=context)
+            ]),
+            types.Content(role="model", parts=[types.Part(text=_FAST_PATH_ACK)]),
+        ])
+        self._confirmed = None
+        self._ips = ips_result
+        CHAT_TURNS.inc(path="fast_path")
+        return ips_result
+    
+    def _ips_section(self, section: str) -> dict:
+        """Response for get_ips_section: the requested section, or the headings to choose from."""
+        ips = self._ips or self._regenerate_ips()
+        if ips is None:
+            return {"status": "error", "message": "No IPS has been generated in this session yet."}
+        text = find_ips_section(ips, section)
+        if text is None:
+            return {"status": "error", "message": f"No section matches '{section}'.", "sections": IPS_SECTIONS}
+        print(f"[DEBUG] get_ips_section({section!r}): {len(text)} chars")
+        return {"status": "success", "section": text}
+    
+    def _regenerate_ips(self):
+        """
+        Rebuilds the session's last IPS from its allocation call in the history
+        (sessions restored from a backend or transcript do not keep the markdown).
+        """
+        for content in reversed(self.get_history()):
+            for part in content.parts or []:
+                call = part.function_call
+                if call is not None and call.name == "calculate_holistic_allocation":
+                    args = dict(call.args) if call.args else {}
+                    result = TOOLS["calculate_holistic_allocation"](**args)
+                    self._ips = TOOLS["generate_ips_markdown"](**build_ips_context(result, args))
+                    return self._ips
+        return None
+    
     def _handle_malformed_function_call(self) -> str:
         """
         Fallback handler when LLM generates a malformed function call.
         Extracts user inputs from conversation history and calls tools directly.
         """
-        import re
+        with timed(STAGE_SECONDS, self.session_id, stage="malformed_fallback"):
+            reply, outcome = self._malformed_fallback()
+        MALFORMED_FALLBACKS.inc(outcome=outcome)
+        return reply
+    
+    def _malformed_fallback(self) -> tuple:
+        """Runs the fallback. Returns (reply, outcome label: "ips", "no_confirmation" or "error")."""
         print("[DEBUG] Running fallback: extracting inputs from conversation history...")
         
-        # Get conversation history - the SDK returns Content objects
-        history = []
-        if self.chat and hasattr(self.chat, '_curated_history'):
-            history = self.chat._curated_history
-        elif self.chat and hasattr(self.chat, 'history'):
-            history = self.chat.history
-        
-        print(f"[DEBUG] History length: {len(history)}")
-        
-        # Find the confirmation message (contains structured inputs)
-        confirmation_text = ""
-        for i, msg in enumerate(reversed(history)):
-            print(f"[DEBUG] Checking msg {i}: type={type(msg).__name__}")
-            
-            # Handle Content objects from google-genai SDK
-            if hasattr(msg, 'role') and hasattr(msg, 'parts'):
+        # The block captured from the model's last reply, else search the history for it
+        slots = self._confirmed
+        if slots is None:
+            history = self.get_history()
+            print(f"[DEBUG] History length: {len(history)}")
+            for i, msg in enumerate(reversed(history)):
                 if msg.role == 'model':
-                    for part in msg.parts:
-                        text = ""
-                        if hasattr(part, 'text'):
-                            text = part.text or ""
-                        elif isinstance(part, str):
-                            text = part
-                        
-                        if "Age:" in text and "Region:" in text:
-                            confirmation_text = text
-                            print(f"[DEBUG] Found confirmation in msg {i}")
-                            break
-            
-            if confirmation_text:
-                break
-
+                    slots = next(filter(None, (parse_confirmation(part.text or "") for part in msg.parts or [])), None)
+                    if slots is not None:
+                        print(f"[DEBUG] Found confirmation in msg {i}")
+                        break
         
-        if not confirmation_text:
+        if slots is None:
             print("[ERROR] Could not find confirmation message in history")
-            return "I apologize, but I had trouble processing. Could you please confirm your inputs again?"
-        
-        print(f"[DEBUG] Found confirmation text, parsing...")
-        
-        # Parse values using regex
-        age_match = re.search(r'\*\*Age:\*\*\s*(\d+)', confirmation_text)
-        region_match = re.search(r'\*\*Region:\*\*\s*(\w+)', confirmation_text)
-        housing_match = re.search(r'\*\*Housing:\*\*\s*(\w+)', confirmation_text)
-        goal_match = re.search(r'\*\*Goal:\*\*\s*(\w+)', confirmation_text)
-        risk_match = re.search(r'\*\*Risk Profile:\*\*\s*(\w+)', confirmation_text)
-        fun_match = re.search(r'\*\*Fun Bucket:\*\*\s*(\d+)', confirmation_text)
-        esg_match = re.search(r'\*\*ESG:\*\*\s*(\w+)', confirmation_text)
-        
-        func_args = {
-            "age": int(age_match.group(1)) if age_match else 40,
-            "region": region_match.group(1) if region_match else "EU",
-            "housing_status": housing_match.group(1).lower() if housing_match else "rent",
-            "goal": goal_match.group(1).lower() if goal_match else "longevity",
-            "risk_profile": risk_match.group(1).lower() if risk_match else "moderate",
-            "fun_bucket_pct": int(fun_match.group(1)) if fun_match else 0,
-            "esg_preference": esg_match and esg_match.group(1).lower() == "yes",
-            "has_high_interest_debt": False,
-            "months_savings": 6,
-        }
+            return "I apologize, but I had trouble processing. Could you please confirm your inputs again?", "no_confirmation"
         
+        func_args = confirmed_args(slots)
+        self._confirmed = None
         print(f"[DEBUG] Parsed args: {func_args}")
         
         try:
@@ -285,14 +608,15 @@ class InvestmentCoPilotOrchestrator:
             
             ips_args = build_ips_context(result, func_args)
             ips_result = TOOLS["generate_ips_markdown"](**ips_args)
+            self._ips = ips_result
             print("[DEBUG] Fallback IPS generated successfully")
-            return ips_result
+            return ips_result, "ips"
             
         except Exception as e:
             print(f"[ERROR] Fallback failed: {e}")
             import traceback
             traceback.print_exc()
-            return f"I apologize, but I encountered an error: {str(e)}. Please try again."
+            return f"I apologize, but I encountered an error: {str(e)}. Please try again.", "error"
     
     
     def send_message(self, user_message: str) -> str:
@@ -309,8 +633,25 @@ class InvestmentCoPilotOrchestrator:
             raise RuntimeError("Session not started. Call start_session() first.")
         
         try:
-            response = self.chat.send_message(user_message)
-            return self._process_response(response)
+            with self._turn():
+                self._ensure_context()
+                self._compact_history()
+                reply = self._answer_confirmation(user_message)
+                if reply is None:
+                    CHAT_TURNS.inc(path="model")
+                    with timed(GEMINI_SECONDS, self.session_id, call="message"):
+                        try:
+                            response = self.chat.send_message(user_message)
+                        except Exception as e:
+                            if not self._is_cache_error(e):
+                                raise
+                            # A failed turn leaves the history untouched, so it can simply be retried
+                            self._drop_cache(e)
+                            response = self.chat.send_message(user_message)
+                    reply = self._process_response(response)
+                # Saved under the lock so concurrent turns never race on _persisted/_revision
+                self._remember()
+            return reply
         except Exception as e:
             error_msg = f"Error processing message: {str(e)}"
             print(f"[ERROR] {error_msg}")
@@ -318,10 +659,122 @@ class InvestmentCoPilotOrchestrator:
             traceback.print_exc()
             raise
     
+    async def send_message_async(self, user_message: str) -> str:
+        """
+        Async variant of `send_message` for use inside the event loop.
+        
+        The Gemini round trips (including the post-report context injection)
+        run on the bounded executor, so other conversations keep flowing while
+        this one waits on the network. Turns on the same session wait for each
+        other on the event loop, not on an executor thread.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._turn_lock:
+            return await loop.run_in_executor(get_executor(), profiling.bind(self.send_message), user_message)
+    
+    def stream_message(self, user_message: str) -> Iterator[str]:
+        """
+        Send a message and yield the reply incrementally.
+        
+        Plain text is yielded token-by-token as Gemini generates it. Tool-call
+        turns are executed exactly like `send_message`, and the resulting IPS
+        is yielded in section-sized chunks. Joining all chunks gives the same
+        reply `send_message` would have returned.
+        """
+        if not self.chat:
+            raise RuntimeError("Session not started. Call start_session() first.")
+        
+        with self._turn():
+            self._ensure_context()
+            self._compact_history()
+            ips_result = self._answer_confirmation(user_message)
+            if ips_result is not None:
+                yield from split_ips_sections(ips_result)
+                self._remember()
+                return
+            
+            CHAT_TURNS.inc(path="model")
+            func_calls = []
+            finish_reason = ""
+            streamed_text = []
+            usage = None
+            
+            for chunk in self._open_stream(user_message):
+                if chunk.usage_metadata:
+                    usage = chunk  # Counts are cumulative; the last chunk has the totals
+                if not chunk.candidates:
+                    continue
+                candidate = chunk.candidates[0]
+                if candidate.finish_reason:
+                    finish_reason = str(candidate.finish_reason)
+                if not candidate.content or not candidate.content.parts:
+                    continue
+                for part in candidate.content.parts:
+                    if part.function_call:
+                        func_calls.append(part.function_call)
+                    elif part.text and not part.thought:
+                        streamed_text.append(part.text)
+                        yield part.text
+            
+            if usage is not None:
+                _context_cache.record_usage(usage)
+            if func_calls:
+                yield from split_ips_sections(self._execute_function_calls(func_calls))
+            elif not streamed_text and "MALFORMED_FUNCTION_CALL" in finish_reason:
+                print("[DEBUG] Detected MALFORMED_FUNCTION_CALL in stream - attempting fallback...")
+                yield from split_ips_sections(self._handle_malformed_function_call())
+            else:
+                self._confirmed = parse_confirmation("".join(streamed_text))
+            self._remember()
+    
+    def _open_stream(self, user_message: str) -> Iterator:
+        """Starts a streamed turn, retrying once on a fresh context if the cached one was rejected."""
+        with timed(GEMINI_SECONDS, self.session_id, call="stream_first_chunk"):
+            stream = self.chat.send_message_stream(user_message)
+            try:
+                first = next(stream)
+            except StopIteration:
+                first = None
+            except Exception as e:
+                if not self._is_cache_error(e):
+                    raise
+                self._drop_cache(e)
+                stream = self.chat.send_message_stream(user_message)
+                first = next(stream, None)
+        if first is None:
+            return
+        yield first
+        yield from stream
+    
+    async def stream_message_async(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Async variant of `stream_message`; each chunk is pulled on the bounded executor.
+        
+        The session stays taken until the stream ends or the client goes away, so a
+        slow reader only delays later turns on its own session, which wait on the
+        event loop rather than on executor threads.
+        """
+        loop = asyncio.get_running_loop()
+        executor = get_executor()
+        async with self._turn_lock:
+            chunks = self.stream_message(user_message)
+            done = object()
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(executor, next, chunks, done)
+                    if chunk is done:
+                        break
+                    yield chunk
+            finally:
+                # Releases the session lock if the client disconnects mid-stream
+                await loop.run_in_executor(executor, chunks.close)
+    
     def get_history(self) -> list:
         """Get conversation history."""
         if not self.chat:
             return []
+        if hasattr(self.chat, 'get_history'):
+            return self.chat.get_history(curated=True)
         return self.chat.history if hasattr(self.chat, 'history') else []
 
 
@@ -329,18 +782,99 @@ def create_chat(session_id=None, history=None, user_name=None):
     """
     Creates or retrieves a chat session wrapped in an Orchestrator.
     This ensures all calls go through the manual function calling logic.
-    """
-    global _sessions
     
-    # If we have an active orchestrator in memory, return it
-    if session_id and session_id in _sessions:
-        return _sessions[session_id]
+    If the session was evicted from memory (or never seen by this process),
+    it is rebuilt transparently: from the persistent backend when one is
+    configured and knows the session, otherwise from the client-supplied `history`,
+    and as a last resort from the session's indexed transcript.
+    """
+    # result: hit (live session reused), backend, history, transcript or new
+    with timed(CREATE_CHAT_SECONDS, session_id, result="new") as labels:
+        if session_id:
+            # A stored revision newer than ours means another worker advanced the chat
+            revision = _backend.revision(session_id) if _backend is not None else 0
+            
+            # If we have an up-to-date orchestrator in memory, return it
+            orchestrator = _sessions.get(session_id)
+            if orchestrator is not None and orchestrator._revision == revision:
+                labels["result"] = "hit"
+                return orchestrator
+            
+            if revision:
+                print(f"[DEBUG] Session {session_id} loading from persistent store (revision {revision})")
+                history = None  # The stored copy is authoritative; start_session loads it
+                labels["result"] = "backend"
+            elif history:
+                print(f"[DEBUG] Session {session_id} not in memory - rebuilding from {len(history)} history entries")
+                labels["result"] = "history"
+            elif orchestrator is None:
+                history = history_from_transcript(read_session_messages(session_id)) or None
+                if history:
+                    print(f"[DEBUG] Session {session_id} not in memory - rebuilding from {len(history)} transcript entries")
+                    labels["result"] = "transcript"
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    orchestrator = InvestmentCoPilotOrchestrator(api_key)
-    orchestrator.start_session(session_id=session_id, user_name=user_name, history=history)
-    
-    if session_id:
-        _sessions[session_id] = orchestrator
-        
-    return orchestrator
+        api_key = os.getenv("GEMINI_API_KEY")
+        orchestrator = InvestmentCoPilotOrchestrator(api_key)
+        orchestrator.start_session(session_id=session_id, user_name=user_name, history=history)
+            
+        return orchestrator
+
+
+async def create_chat_async(session_id=None, history=None, user_name=None):
+    """
+    Async variant of `create_chat` for use inside the event loop.
+
+    Rebuilding a session can read the backend or the transcript index and
+    create the Gemini chat, so it runs on the bounded executor like the
+    Gemini round trips themselves.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), profiling.bind(lambda: create_chat(session_id=session_id, history=history, user_name=user_name))
+    )
+
+
+def history_from_transcript(entries: list) -> list:
+    """
+    Converts logged transcript entries back into a Gemini chat history.
+
+    Failed turns (a model "[ERROR]" entry and the user message it answered) are
+    dropped, as are trailing user messages: the API logs the incoming message
+    before the chat is created, so it must not be replayed as history.
+    """
+    history = []
+    for entry in entries:
+        role, message = entry.get("role"), entry.get("message")
+        if role not in ("user", "model") or not isinstance(message, str):
+            continue
+        if role == "model" and message.startswith("[ERROR]"):
+            if history and history[-1].role == "user":
+                history.pop()
+            continue
+        history.append(types.Content(role=role, parts=[types.Part(text=message)]))
+    while history and history[-1].role == "user":
+        history.pop()
+    return history
+
+
+def get_session_stats() -> dict:
+    """Hit/miss/eviction counters for the in-memory session store."""
+    return _sessions.stats()
+
+
+def get_context_cache_stats() -> dict:
+    """Cached-context state plus prompt vs. cache-hit token counts across all sessions."""
+    return _context_cache.stats()
+
+
+def get_history_stats() -> dict:
+    """History compactions and the estimated prompt tokens they saved."""
+    return _history.stats()
+
+
+def clear_session(session_id: str) -> bool:
+    """Drops a session from memory and the persistent backend. Returns True if it existed."""
+    existed = _sessions.pop(session_id) is not None
+    if _backend is not None:
+        existed = _backend.delete(session_id) or existed
+    return existed
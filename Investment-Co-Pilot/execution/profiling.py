@@ -0,0 +1,234 @@
+"""
+profiling.py
+
+Opt-in cProfile capture for single API requests (/chat, /generate-ips,
+/calculate-allocation). Use it to see where a slow request spends its time: in
+Python (`_process_response`, the tools), in SDK serialization or waiting on the
+network.
+
+A request is profiled when:
+- it carries `X-Profile: 1` and `X-Admin-Key: <PROFILE_ADMIN_KEY>`, or
+- it is sampled at PROFILE_SAMPLE_RATE (0.0-1.0).
+
+Each profile is saved as `logs/profiles/<request id>.prof` (pstats format, e.g.
+for snakeviz) together with a `.json` metadata file. The admin endpoints list and
+download them.
+
+cProfile only sees the thread it runs in. The request's profile therefore follows
+the work: the event-loop thread, the threadpool running sync endpoints (through
+`threaded`), and the chat worker and tool pool threads (through `bind`).
+Coroutines of other requests running on the event loop at the same time show up
+in the loop-thread part. Only one request is profiled at a time.
+
+With neither switch set, PROFILING_ENABLED is False. The middleware then skips
+this module, and the only per-request cost left is a context-variable lookup in
+`bind`/`threaded`.
+"""
+import cProfile
+import functools
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+
+
+PROFILE_ADMIN_KEY = os.getenv("PROFILE_ADMIN_KEY", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILING_ENABLED = bool(PROFILE_ADMIN_KEY) or PROFILE_SAMPLE_RATE > 0
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(__file__).parent.parent / "logs" / "profiles")))
+# Oldest profiles are deleted beyond this many
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILED_PATHS = ("/chat", "/generate-ips", "/calculate-allocation")
+
+# Client-supplied X-Request-ID values are used as file names only if they look like this
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("copilot_request_profile", default=None)
+# One profiled request at a time (also keeps profiler threads from overlapping)
+_active = threading.Lock()
+
+
+class RequestProfile:
+    """Merged cProfile stats of every thread that worked on one request."""
+
+    def __init__(self, request_id: str, method: str, path: str, reason: str):
+        self.request_id, self.method, self.path, self.reason = request_id, method, path, reason
+        self.started = time.perf_counter()
+        self._stats: Optional[pstats.Stats] = None
+        self._threads = 0
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+            self._threads += 1
+
+    def save(self, status: int, directory: Path = None) -> Optional[Path]:
+        """Writes `<request id>.prof` and its `.json` metadata. Returns the .prof path (None if nothing was captured)."""
+        directory = directory or PROFILE_DIR
+        with self._lock:
+            if self._stats is None:
+                return None
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{self.request_id}.prof"
+            self._stats.dump_stats(path)
+            meta = {
+                "request_id": self.request_id,
+                "method": self.method,
+                "path": self.path,
+                "status": status,
+                "reason": self.reason,
+                "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "threads": self._threads,
+                "created": datetime.now(timezone.utc).isoformat(),
+            }
+        (directory / f"{self.request_id}.json").write_text(json.dumps(meta))
+        print(f"[DEBUG] Profile saved: {path} ({meta['elapsed_ms']}ms, {self.reason})")
+        _prune(directory)
+        return path
+
+
+def request_id_for(headers, reason: str) -> str:
+    """
+    The client's X-Request-ID for admin-requested profiles (if it is safe as a file
+    name), else a fresh one. Sampled requests are unauthenticated, so their ID is
+    never taken from the client: reusing an ID would overwrite a stored profile.
+    """
+    supplied = headers.get("x-request-id", "")
+    if reason == "requested" and _REQUEST_ID_PATTERN.match(supplied):
+        return supplied
+    return uuid.uuid4().hex
+
+
+def is_admin(headers) -> bool:
+    """True if the request carries the configured admin key."""
+    supplied = headers.get("x-admin-key", "")
+    return bool(PROFILE_ADMIN_KEY) and hmac.compare_digest(supplied.encode(), PROFILE_ADMIN_KEY.encode())
+
+
+def profile_reason(path: str, headers) -> Optional[str]:
+    """Why this request should be profiled ("requested" or "sampled"), or None."""
+    if path not in PROFILED_PATHS:
+        return None
+    if headers.get("x-profile") == "1" and is_admin(headers):
+        return "requested"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def start(request_id: str, method: str, path: str, reason: str) -> Optional[RequestProfile]:
+    """Claims the profiler for one request. Returns None if another request holds it."""
+    if not _active.acquire(blocking=False):
+        print(f"[WARN] Profiling skipped for {request_id}: another request is being profiled")
+        return None
+    return RequestProfile(request_id, method, path, reason)
+
+
+def finish(profile: RequestProfile, status: int) -> Optional[Path]:
+    try:
+        return profile.save(status)
+    except OSError as e:
+        print(f"[WARN] Could not save profile {profile.request_id}: {e}")
+        return None
+    finally:
+        _active.release()
+
+
+def current() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+@contextmanager
+def capture(profile: RequestProfile):
+    """Profiles the calling thread into `profile` for the duration of the block."""
+    token = _current.set(profile)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: one process-wide profiler, already covering this thread
+        profiler = None
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            profile.add(profiler)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    `fn` itself unless a request is being profiled. Otherwise a wrapper that also
+    profiles `fn` in whichever thread (executor, tool pool) ends up running it.
+    """
+    profile = _current.get()
+    if profile is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with capture(profile):
+            return fn(*args, **kwargs)
+    return run
+
+
+def threaded(fn: Callable) -> Callable:
+    """Decorator for sync endpoints (run on the threadpool): profiles their thread while a request is profiled."""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        with capture(profile):
+            return fn(*args, **kwargs)
+    return run
+
+
+def list_profiles(directory: Path = None) -> List[dict]:
+    """Metadata of the stored profiles, newest first."""
+    directory = directory or PROFILE_DIR
+    profiles = []
+    for meta_path in directory.glob("*.json"):
+        try:
+            profiles.append(json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta.get("created", ""), reverse=True)
+
+
+def profile_path(request_id: str, directory: Path = None) -> Optional[Path]:
+    """Path of a stored .prof file, or None (also for IDs that are not valid file names)."""
+    if not _REQUEST_ID_PATTERN.match(request_id):
+        return None
+    path = (directory or PROFILE_DIR) / f"{request_id}.prof"
+    return path if path.exists() else None
+
+
+def render_profile(path: Path, limit: int = 60, sort: str = "cumulative") -> str:
+    """pstats text report of a stored profile."""
+    stream = io.StringIO()
+    pstats.Stats(str(path), stream=stream).sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def _prune(directory: Path) -> None:
+    profiles = sorted(directory.glob("*.prof"), key=lambda path: path.stat().st_mtime)
+    for path in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)
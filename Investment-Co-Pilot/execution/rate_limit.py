@@ -0,0 +1,229 @@
+"""
+rate_limit.py
+
+Sliding-window-counter rate limiting for the API.
+Each key keeps only two counters (previous and current fixed window), so every check
+is O(1) regardless of traffic, and idle keys are swept in the background.
+
+Limits are applied per session, per client IP and globally. The state can live in
+process memory or in a SQLite file shared by all uvicorn workers on the node
+(`RATE_LIMIT_BACKEND=sqlite`).
+"""
+import ipaddress
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from execution.logging_utils import LOGS_DIR
+
+
+# Per-session rule: 20 messages per 30 minutes
+RATE_LIMIT_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "20"))
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "1800"))
+# Per-IP rule stops attackers from bypassing the session rule by rotating session IDs
+RATE_LIMIT_IP_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_IP_MAX_REQUESTS", "200"))
+RATE_LIMIT_IP_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_IP_WINDOW_SECONDS", "1800"))
+# Proxies allowed to name the client in X-Forwarded-For (comma-separated IPs or CIDRs,
+# e.g. the Traefik network). Requests from anywhere else are keyed by their socket peer.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()
+]
+# Global rule protects the Gemini quota (0 disables it)
+RATE_LIMIT_GLOBAL_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_GLOBAL_MAX_REQUESTS", "0"))
+RATE_LIMIT_GLOBAL_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_GLOBAL_WINDOW_SECONDS", "60"))
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_DB_PATH = Path(os.getenv("RATE_LIMIT_DB_PATH", str(LOGS_DIR / "ratelimit.sqlite3")))
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+
+# (key, max_requests, window_seconds)
+Rule = Tuple[str, int, int]
+
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    """True if `host` (a socket peer address) is one of TRUSTED_PROXIES."""
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def _advance(state: Optional[list], window: int, now: float) -> list:
+    """Rolls a [window_start, prev_count, curr_count] state forward to the window containing `now`."""
+    window_start = now - (now % window)
+    if state is None:
+        return [window_start, 0, 0]
+    start, prev, curr = state
+    if window_start == start:
+        return [start, prev, curr]
+    # The old current window becomes 'previous' only if it is the adjacent one
+    return [window_start, curr if window_start - start == window else 0, 0]
+
+
+def _estimate(state: list, window: int, now: float) -> float:
+    """Sliding-window estimate: the previous window weighted by how much of it still overlaps."""
+    start, prev, curr = state
+    overlap = (window - (now - start)) / window
+    return prev * overlap + curr
+
+
+class MemoryRateLimitBackend:
+    """Counters in a dict guarded by a lock (single process)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [window_start, prev_count, curr_count, window, last_seen]
+        self._state = {}
+
+    def acquire(self, rules: List[Rule], now: float) -> bool:
+        with self._lock:
+            advanced = []
+            for key, limit, window in rules:
+                entry = self._state.get(key)
+                state = _advance(entry[:3] if entry else None, window, now)
+                if _estimate(state, window, now) + 1 > limit:
+                    return False
+                advanced.append((key, window, state))
+            # All rules passed: count the request against each of them
+            for key, window, state in advanced:
+                self._state[key] = [state[0], state[1], state[2] + 1, window, now]
+            return True
+
+    def sweep(self, now: float) -> int:
+        """Drops keys idle for two windows (their counters can no longer matter)."""
+        with self._lock:
+            idle = [k for k, v in self._state.items() if now - v[4] >= 2 * v[3]]
+            for key in idle:
+                del self._state[key]
+            return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+
+class SQLiteRateLimitBackend:
+    """Counters in a SQLite file so every worker process on the node shares one budget."""
+
+    def __init__(self, path: Path = RATE_LIMIT_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS rate_limits (
+                   key TEXT PRIMARY KEY,
+                   window_start REAL NOT NULL,
+                   prev_count INTEGER NOT NULL,
+                   curr_count INTEGER NOT NULL,
+                   window INTEGER NOT NULL,
+                   last_seen REAL NOT NULL
+               ) WITHOUT ROWID"""
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, rules: List[Rule], now: float) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            advanced = []
+            for key, limit, window in rules:
+                row = conn.execute(
+                    "SELECT window_start, prev_count, curr_count FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                state = _advance(list(row) if row else None, window, now)
+                if _estimate(state, window, now) + 1 > limit:
+                    conn.execute("COMMIT")
+                    return False
+                advanced.append((key, state[0], state[1], state[2] + 1, window, now))
+            conn.executemany(
+                "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?, ?)", advanced
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def sweep(self, now: float) -> int:
+        conn = self._conn()
+        return conn.execute("DELETE FROM rate_limits WHERE ? - last_seen >= 2 * window", (now,)).rowcount
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Applies the session, IP and global rules atomically: a request is counted
+    against every rule only if all of them allow it.
+
+    Args:
+        backend: Memory or SQLite counter store
+        clock: Wall-clock time source (windows must agree across processes)
+        sweep_interval: Seconds between background sweeps of idle keys (0 disables the thread)
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        clock: Callable[[], float] = time.time,
+        sweep_interval: float = RATE_LIMIT_SWEEP_SECONDS,
+    ):
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+        self._clock = clock
+        self.allowed = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+        if sweep_interval > 0:
+            thread = threading.Thread(
+                target=self._sweep_loop, args=(sweep_interval,), name="rate-limit-sweeper", daemon=True
+            )
+            thread.start()
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.backend.sweep(self._clock())
+            except Exception as e:
+                print(f"[WARN] Rate limit sweep failed: {e}")
+
+    def rules_for(self, session_id: str, client_ip: Optional[str] = None) -> List[Rule]:
+        rules = [(f"session:{session_id}", RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW_SECONDS)]
+        if client_ip and RATE_LIMIT_IP_MAX_REQUESTS > 0:
+            rules.append((f"ip:{client_ip}", RATE_LIMIT_IP_MAX_REQUESTS, RATE_LIMIT_IP_WINDOW_SECONDS))
+        if RATE_LIMIT_GLOBAL_MAX_REQUESTS > 0:
+            rules.append(("global", RATE_LIMIT_GLOBAL_MAX_REQUESTS, RATE_LIMIT_GLOBAL_WINDOW_SECONDS))
+        return rules
+
+    def check(self, session_id: str, client_ip: Optional[str] = None) -> bool:
+        """Returns True if the request is allowed (and counts it), False if rate limited."""
+        allowed = self.backend.acquire(self.rules_for(session_id, client_ip), self._clock())
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return allowed
+
+    def stats(self) -> dict:
+        return {"allowed": self.allowed, "rejected": self.rejected, "tracked_keys": len(self.backend)}
+
+
+def create_rate_limit_backend(kind: str = RATE_LIMIT_BACKEND):
+    """Builds the configured counter store."""
+    if kind == "sqlite":
+        return SQLiteRateLimitBackend(RATE_LIMIT_DB_PATH)
+    if kind != "memory":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind!r} (expected 'memory' or 'sqlite')")
+    return MemoryRateLimitBackend()
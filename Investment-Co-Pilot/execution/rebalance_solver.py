@@ -0,0 +1,158 @@
+"""
+rebalance_solver.py
+
+Minimal-trade rebalancing for any number of asset classes (equity, bonds, the
+fun bucket, or speculation holdings such as gold and bitcoin).
+
+Follows the operating rules in directives/check_rebalancing.md:
+1. Inflow first: new cash is used to buy underweight classes before anything is
+   sold. It goes to the most underweight classes first ("water-filling"), so the
+   largest drifts are evened out.
+2. Minimal sells: if a class is still outside its band (default ±5 percentage
+   points), the smallest total sell/buy volume that brings every class back
+   inside its band is traded. Trades only go as far as the band edge, not to the
+   target, and are taken from the most overweight classes first.
+
+Both steps are closed-form. Each one sorts the gaps and takes a cumulative sum,
+with no iteration, so a whole book of portfolios is solved in one NumPy pass.
+"""
+from typing import Dict, Union
+
+import numpy as np
+
+from execution.check_rebalancing import DRIFT_THRESHOLD
+
+
+def _water_fill(gaps: np.ndarray, amount: np.ndarray) -> np.ndarray:
+    """
+    Spreads `amount` over the positive `gaps` of each row, largest gaps first.
+
+    Finds the level L with sum(max(0, gap - L)) == amount and returns
+    max(0, gap - L). Rows are solved independently. `amount` is capped by the
+    row's total positive gap.
+    """
+    gaps = np.maximum(gaps, 0.0)
+    ordered = -np.sort(-gaps, axis=1)
+    filled = np.cumsum(ordered, axis=1)
+    counts = np.arange(1, gaps.shape[1] + 1)
+    # Volume traded if the level were set at each sorted gap; non-decreasing along the row
+    volume_at = filled - counts * ordered
+    amount = np.minimum(amount, filled[:, -1])[:, None]
+    active = np.maximum((volume_at <= amount).sum(axis=1, keepdims=True), 1)
+    level = (np.take_along_axis(filled, active - 1, axis=1) - amount) / active
+    return np.maximum(gaps - np.maximum(level, 0.0), 0.0)
+
+
+def solve_rebalance(
+    values,
+    targets,
+    cash=0.0,
+    band: float = DRIFT_THRESHOLD,
+) -> Dict[str, np.ndarray]:
+    """
+    Computes inflow-first, minimal-sell trades for many portfolios at once.
+
+    Args:
+        values: (portfolios, classes) current holdings, or one row of them
+        targets: target weights in % with the same shape (or one row for all);
+            each row is normalized to sum to 100
+        cash: new money to invest per portfolio (scalar or per-row array)
+        band: allowed absolute drift in percentage points
+
+    Returns:
+        Dict of arrays: `buys` and `sells` (currency, same shape as values),
+        `drift_before` (percentage points of the current holdings, as in
+        `check_rebalancing`), `drift_after` (of the portfolio after trading) and
+        `rebalanced` (True where sells were needed)
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    targets = np.broadcast_to(np.atleast_2d(np.asarray(targets, dtype=np.float64)), values.shape)
+    cash = np.broadcast_to(np.asarray(cash, dtype=np.float64), values.shape[:1])
+
+    weight_sum = targets.sum(axis=1, keepdims=True)
+    weights = np.divide(targets, weight_sum, out=np.zeros_like(targets), where=weight_sum > 0)
+    held = values.sum(axis=1)
+    total = held + cash
+    target_values = weights * total[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(total > 0, 100.0 / total, 0.0)[:, None]
+        drift_before = np.where(held[:, None] > 0, values * 100.0 / held[:, None] - weights * 100.0, 0.0)
+
+    # 1. Inflow first: new cash fills the largest shortfalls
+    inflow = _water_fill(target_values - values, cash)
+    invested = values + inflow
+    gap = invested - target_values
+
+    # 2. Minimal sells: each side must move at least its out-of-band amount,
+    # and sells fund buys one for one, so the larger side sets the volume
+    band_value = (band / 100.0) * total[:, None]
+    excess = np.maximum(gap - band_value, 0.0).sum(axis=1)
+    shortfall = np.maximum(-gap - band_value, 0.0).sum(axis=1)
+    volume = np.maximum(excess, shortfall)
+    sells = _water_fill(gap, volume)
+    buys = inflow + _water_fill(-gap, volume)
+
+    return {
+        "buys": buys,
+        "sells": sells,
+        "drift_before": drift_before,
+        "drift_after": (values + buys - sells - target_values) * scale,
+        "rebalanced": volume > 1e-9 * total,
+    }
+
+
+def _asset_classes(current_portfolio: dict, target_allocation: dict) -> list:
+    """Classes named by `<class>_value` holdings or `<class>_pct` targets (cash excluded)."""
+    classes = []
+    for key in list(current_portfolio) + list(target_allocation):
+        for suffix in ("_value", "_pct"):
+            if key.endswith(suffix):
+                name = key[: -len(suffix)]
+                name = "fun" if name == "fun_bucket" else name
+                if name != "cash" and name not in classes:
+                    classes.append(name)
+    return classes
+
+
+def plan_rebalance(
+    current_portfolio: dict,
+    target_allocation: dict,
+    band: float = DRIFT_THRESHOLD,
+) -> Union[dict, str]:
+    """
+    Single-portfolio report, in the same style as `check_rebalancing`
+    (including the "Portfolio is empty." string when there is nothing to rebalance).
+
+    Holdings use `<class>_value` keys (plus an optional `cash_value` to invest).
+    Targets use `<class>_pct` keys; the fun bucket's target is `fun_bucket_pct`,
+    matching the allocation output. Example: gold_value/gold_pct.
+    """
+    classes = _asset_classes(current_portfolio, target_allocation)
+    if not classes:
+        return "Portfolio is empty."
+    target_key = lambda name: "fun_bucket_pct" if name == "fun" else f"{name}_pct"
+    values = [current_portfolio.get(f"{name}_value", 0) for name in classes]
+    targets = [target_allocation.get(target_key(name), 0) for name in classes]
+    cash = current_portfolio.get("cash_value", 0)
+    if sum(values) + cash == 0:
+        return "Portfolio is empty."
+
+    plan = solve_rebalance(values, targets, cash, band)
+    report = {
+        "status": "Drift Detected" if plan["rebalanced"][0] else "Balanced",
+        "actions": [],
+        "analysis": {},
+    }
+    for i, name in enumerate(classes):
+        report["analysis"][name] = {
+            "target_pct": targets[i],
+            "drift": round(float(plan["drift_before"][0, i]), 2),
+            "drift_after": round(float(plan["drift_after"][0, i]), 2),
+        }
+        if plan["buys"][0, i] >= 0.005:
+            report["actions"].append(f"BUY {name.title()}: ${round(float(plan['buys'][0, i]), 2)}")
+        if plan["sells"][0, i] >= 0.005:
+            report["actions"].append(f"SELL {name.title()}: ${round(float(plan['sells'][0, i]), 2)}")
+    if not report["actions"]:
+        report["actions"].append(f"No Action Needed. Drift is within {band:g}% tolerance.")
+    return report
@@ -0,0 +1,170 @@
+"""
+session_backend.py
+
+Persistent chat-history backend shared by every uvicorn worker on a node.
+Stores each session's Gemini `Content` history in a local SQLite database (WAL mode),
+so conversations survive redeploys and can continue on any worker.
+
+Enable with `SESSION_BACKEND=sqlite` (optionally `SESSION_DB_PATH=...`).
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from google.genai import types
+
+from execution.logging_utils import LOGS_DIR
+
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", str(LOGS_DIR / "sessions.sqlite3")))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    revision   INTEGER NOT NULL,
+    length     INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_messages (
+    session_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    content    TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class StaleSessionError(RuntimeError):
+    """Raised by `save` when another worker advanced (or deleted) the session since it was loaded."""
+
+
+class SQLiteSessionBackend:
+    """
+    Chat histories in SQLite, one row per `Content` message.
+
+    Every save bumps the session's `revision`, which lets a worker detect that
+    its in-memory copy is stale because another worker advanced the chat.
+    A save names the revision it was based on and is refused if the stored one
+    moved on, so two workers can never interleave their turns in one history.
+    Turns are appended in a single transaction; a full rewrite only happens
+    when the history was replaced (e.g. rebuilt or compacted).
+    """
+
+    def __init__(self, path: Path = SESSION_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while another worker writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def revision(self, session_id: str) -> int:
+        """Current revision of a session (0 if it has never been stored)."""
+        row = self._conn().execute(
+            "SELECT revision FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def load(self, session_id: str) -> tuple:
+        """Returns (history, revision) for a session; ([], 0) if unknown."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT revision FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            rows = conn.execute(
+                "SELECT content FROM session_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        history = [types.Content.model_validate_json(content) for (content,) in rows]
+        return history, (row[0] if row else 0)
+
+    def save(self, session_id: str, history: List[types.Content], persisted: int = 0, revision: int = 0) -> int:
+        """
+        Persists a session's history and returns its new revision.
+
+        Args:
+            session_id: Session identifier
+            history: Full curated chat history
+            persisted: Leading messages of `history` already stored by this process.
+                Only the tail is written; 0 (or a count larger than the history) rewrites it.
+            revision: Stored revision this history was based on (0 for a session not stored yet)
+
+        Raises:
+            StaleSessionError: The stored revision is no longer `revision`; nothing is written.
+        """
+        rewrite = persisted <= 0 or persisted > len(history)
+        start = 0 if rewrite else persisted
+        rows = [
+            (session_id, seq, history[seq].model_dump_json(exclude_none=True))
+            for seq in range(start, len(history))
+        ]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Compare-and-swap on the revision before any message is touched
+            if revision:
+                updated = conn.execute(
+                    "UPDATE sessions SET revision = revision + 1, length = ?, updated_at = ? "
+                    "WHERE session_id = ? AND revision = ?",
+                    (len(history), time.time(), session_id, revision),
+                ).rowcount
+            else:
+                updated = conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, revision, length, updated_at) VALUES (?, 1, ?, ?)",
+                    (session_id, len(history), time.time()),
+                ).rowcount
+            if not updated:
+                stored = conn.execute(
+                    "SELECT revision FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                raise StaleSessionError(
+                    f"Session {session_id} is at revision {stored[0] if stored else 0}, not {revision}"
+                )
+            if rewrite:
+                conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_messages (session_id, seq, content) VALUES (?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return revision + 1
+
+    def delete(self, session_id: str) -> bool:
+        """Removes a session. Returns True if it existed."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            deleted = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted > 0
+
+
+def create_session_backend(kind: str = SESSION_BACKEND) -> Optional[SQLiteSessionBackend]:
+    """Builds the configured backend; None means sessions live in process memory only."""
+    if kind == "sqlite":
+        return SQLiteSessionBackend(SESSION_DB_PATH)
+    if kind != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {kind!r} (expected 'memory' or 'sqlite')")
+    return None
@@ -0,0 +1,135 @@
+"""
+session_store.py
+
+Bounded in-memory store for live chat sessions.
+Evicts the least-recently-used session once the entry count or byte budget is exceeded,
+and expires sessions that have been idle longer than the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+# Defaults (override per deployment via environment)
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(200 * 1024 * 1024)))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "7200"))
+
+
+class SessionStore:
+    """
+    LRU + idle-TTL cache keyed by session id.
+
+    Args:
+        max_entries: Maximum number of sessions kept in memory
+        max_bytes: Approximate memory budget across all sessions (see `sizer`)
+        idle_ttl_seconds: Sessions untouched for longer than this are expired
+        sizer: Callable returning the approximate size in bytes of a stored value
+        clock: Monotonic time source (injectable for tests)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        max_bytes: int = SESSION_MAX_BYTES,
+        idle_ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+        sizer: Optional[Callable[[Any], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._sizer = sizer or (lambda value: 0)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # session_id -> [value, size_bytes, last_access]; ordered oldest access first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """Returns the stored session (refreshing its recency) or None."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            now = self._clock()
+            if entry is not None and now - entry[2] > self.idle_ttl_seconds:
+                self._remove(session_id)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry[2] = now
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, session_id: str, value: Any) -> None:
+        """Inserts or refreshes a session, re-measuring its size, then enforces the limits."""
+        size = self._sizer(value)
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+            self._entries[session_id] = [value, size, self._clock()]
+            self._bytes += size
+            self._enforce_limits()
+
+    def pop(self, session_id: str) -> Optional[Any]:
+        """Removes a session explicitly. Returns it, or None if absent."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._remove(session_id)
+            return entry[0]
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, session_id: str) -> None:
+        _, size, _ = self._entries.pop(session_id)
+        self._bytes -= size
+
+    def _enforce_limits(self) -> None:
+        # Idle sessions sit at the front (oldest access first), so expiry is a prefix scan
+        now = self._clock()
+        while self._entries:
+            oldest_id, (_, _, last_access) = next(iter(self._entries.items()))
+            if now - last_access <= self.idle_ttl_seconds:
+                break
+            self._remove(oldest_id)
+            self.expirations += 1
+
+        # LRU eviction. The newest entry is always kept, even if it alone exceeds the byte budget.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
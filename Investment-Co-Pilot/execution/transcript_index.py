@@ -0,0 +1,252 @@
+"""
+transcript_index.py
+
+Sidecar index for the rotated transcript log.
+
+Maps each `sessionId` to the segment and byte offsets of its lines, so one
+session's messages can be read back with a few seeks instead of scanning every
+segment. Archived segments are gzip files made of independent ~256 KB members;
+the index stores each line's member offset plus its offset inside the member.
+
+Usage:
+    python -m execution.transcript_index --rebuild     # index existing segments
+    python -m execution.transcript_index --session ID  # print a session's messages
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+# Lines are grouped into gzip members of about this many uncompressed bytes
+GZIP_MEMBER_BYTES = 256 * 1024
+
+# (session_id, segment, member_offset or None, offset, length)
+IndexRow = Tuple[str, str, Optional[int], int, int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    session_id    TEXT NOT NULL,
+    segment       TEXT NOT NULL,
+    member_offset INTEGER,
+    offset        INTEGER NOT NULL,
+    length        INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_session ON entries (session_id);
+CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment);
+"""
+
+
+class TranscriptIndex:
+    """SQLite index (WAL) from session id to line locations, shared by all workers."""
+
+    def __init__(self, path: Path, logs_dir: Path, active_name: str = "transcripts.jsonl"):
+        self.path = Path(path)
+        self.logs_dir = Path(logs_dir)
+        self.active_name = active_name
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, rows: Iterable[IndexRow]) -> None:
+        """Records line locations (one transaction per group commit)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def rename_segment(self, old: str, new: str) -> None:
+        self._conn().execute("UPDATE entries SET segment = ? WHERE segment = ?", (new, old))
+
+    def replace_segment(self, old: str, new: str, rows: List[IndexRow]) -> None:
+        """Atomically swaps a segment's rows (used after compressing it)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE segment IN (?, ?)", (old, new))
+            conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def locations(self, session_id: str) -> List[Tuple[str, Optional[int], int, int]]:
+        """(segment, member_offset, offset, length) for a session, in log order."""
+        rows = self._conn().execute(
+            "SELECT segment, member_offset, offset, length FROM entries WHERE session_id = ?",
+            (session_id,),
+        ).fetchall()
+        # Archived segment names carry a UTC timestamp, so they sort chronologically; the active one is newest
+        return sorted(rows, key=lambda r: (r[0] == self.active_name, r[0], r[1] or 0, r[2]))
+
+    def read_session(self, session_id: str, _retry: bool = True) -> List[dict]:
+        """Returns a session's transcript entries by seeking to the indexed lines."""
+        locations = self.locations(session_id)
+        entries = []
+        handles = {}
+        try:
+            for segment, member_offset, offset, length in locations:
+                path = self.logs_dir / segment
+                if segment not in handles:
+                    try:
+                        handles[segment] = open(path, "rb")
+                    except FileNotFoundError:
+                        # Segment was compressed after we read the index: retry once with fresh locations
+                        if not _retry:
+                            raise
+                        return self.read_session(session_id, _retry=False)
+                f = handles[segment]
+                if member_offset is None:
+                    f.seek(offset)
+                    raw = f.read(length)
+                else:
+                    raw = _read_from_member(f, member_offset, offset, length)
+                entries.append(json.loads(raw))
+        finally:
+            for f in handles.values():
+                f.close()
+        return entries
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM entries")
+
+
+def _read_from_member(f, member_offset: int, offset: int, length: int) -> bytes:
+    """Decompresses one gzip member just far enough to return bytes [offset, offset + length)."""
+    f.seek(member_offset)
+    decompressor = zlib.decompressobj(wbits=31)
+    out = b""
+    while len(out) < offset + length:
+        chunk = f.read(64 * 1024)
+        if not chunk:
+            break
+        out += decompressor.decompress(chunk)
+        if decompressor.eof:
+            break
+    return out[offset:offset + length]
+
+
+def _session_of(line: bytes) -> Optional[str]:
+    try:
+        return json.loads(line).get("sessionId")
+    except (ValueError, AttributeError):
+        return None
+
+
+def compress_segment(src: Path, index: Optional[TranscriptIndex] = None) -> Path:
+    """
+    Gzips an archived segment as a series of independent members and re-points
+    its index rows at the compressed copy. The plain file is removed afterwards.
+    """
+    src = Path(src)
+    dst = src.with_name(src.name + ".gz")
+    tmp = dst.with_name(dst.name + ".tmp")
+    rows = []
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        pending, pending_rows = [], []
+        pending_size = 0
+
+        def flush_member():
+            nonlocal pending, pending_rows, pending_size
+            if not pending:
+                return
+            member_offset = fout.tell()
+            fout.write(gzip.compress(b"".join(pending), mtime=0))
+            rows.extend((sid, dst.name, member_offset, off, ln) for sid, off, ln in pending_rows)
+            pending, pending_rows, pending_size = [], [], 0
+
+        for line in fin:
+            session_id = _session_of(line)
+            if session_id is not None:
+                pending_rows.append((session_id, pending_size, len(line)))
+            pending.append(line)
+            pending_size += len(line)
+            if pending_size >= GZIP_MEMBER_BYTES:
+                flush_member()
+        flush_member()
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp, dst)
+    if index is not None:
+        index.replace_segment(src.name, dst.name, rows)
+    os.remove(src)
+    return dst
+
+
+def index_plain_segment(path: Path) -> List[IndexRow]:
+    """Index rows for an uncompressed segment (used when rebuilding)."""
+    rows = []
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            session_id = _session_of(line)
+            if session_id is not None:
+                rows.append((session_id, path.name, None, offset, len(line)))
+            offset += len(line)
+    return rows
+
+
+def rebuild_index(index: TranscriptIndex) -> int:
+    """
+    Re-indexes every segment in the logs directory from scratch.
+    Plain archived segments are compressed along the way. Returns the number of lines indexed.
+    """
+    index.clear()
+    active_name = index.active_name
+    stem = Path(active_name).stem
+    segments = sorted(index.logs_dir.glob(f"{stem}-*.jsonl")) + sorted(index.logs_dir.glob(f"{stem}-*.jsonl.gz"))
+    total = 0
+    for path in segments:
+        if path.suffix == ".gz":
+            # Re-derive member offsets by recompressing into the member layout
+            plain = path.with_suffix("")
+            with gzip.open(path, "rb") as fin, open(plain, "wb") as fout:
+                fout.write(fin.read())
+            os.remove(path)
+            path = plain
+        rows = index_plain_segment(path)
+        index.add(rows)
+        compress_segment(path, index)
+        total += len(rows)
+    active = index.logs_dir / active_name
+    if active.exists():
+        rows = index_plain_segment(active)
+        index.add(rows)
+        total += len(rows)
+    return total
+
+
+def main():
+    from execution.logging_utils import LOGS_DIR, TRANSCRIPT_FILE, TRANSCRIPT_INDEX_FILE
+
+    parser = argparse.ArgumentParser(description="Maintain or query the transcript index.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index all transcript segments")
+    parser.add_argument("--session", help="Print the transcript entries of one session")
+    args = parser.parse_args()
+
+    index = TranscriptIndex(TRANSCRIPT_INDEX_FILE, LOGS_DIR, TRANSCRIPT_FILE.name)
+    if args.rebuild:
+        print(f"Indexed {rebuild_index(index)} lines")
+    if args.session:
+        for entry in index.read_session(args.session):
+            print(json.dumps(entry))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+fake_genai.py
+
+Offline stand-in for the google-genai client.
+Wraps the real SDK `Chats`/`Chat` classes around a scripted `Models` object,
+so the orchestrator exercises the genuine history bookkeeping without network access.
+With `caching=True` the client also gets a `caches` module, and replies carry
+usage metadata (about 4 characters per token) with cache-hit counts.
+
+`OrchestratorTestCase` is the shared base for tests that drive the orchestrator
+(directly or through the API) against this client.
+"""
+import datetime
+import itertools
+import os
+import time
+import threading
+import unittest
+from unittest import mock
+
+import httpx
+from google.genai import chats, errors, models, types
+
+from execution import api, orchestrator
+from execution.session_store import SessionStore
+
+
+def text_response(text: str) -> types.GenerateContentResponse:
+    """A plain model text reply."""
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        finish_reason=types.FinishReason.STOP,
+    )])
+
+
+def function_call_response(name: str, args: dict) -> types.GenerateContentResponse:
+    """A model turn requesting a single tool call."""
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(name=name, args=args))
+        ]),
+        finish_reason=types.FinishReason.STOP,
+    )])
+
+
+def malformed_response() -> types.GenerateContentResponse:
+    """The empty MALFORMED_FUNCTION_CALL reply Gemini sometimes returns."""
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        finish_reason=types.FinishReason.MALFORMED_FUNCTION_CALL,
+    )])
+
+
+def echo_responder(contents, config):
+    """Default script: echo the last user text back."""
+    last = contents[-1]
+    text = "".join(p.text or "" for p in (last.parts or []) if p.text)
+    return text_response(f"echo: {text}" if text else "ok")
+
+
+def count_tokens(*items) -> int:
+    """Rough token count of strings, Contents and Tools (4 characters per token)."""
+    return sum(len(item if isinstance(item, str) else str(item)) for item in items if item) // 4
+
+
+class FakeCaches:
+    """Scripted replacement for `client.caches`: stores cached contents until their TTL runs out."""
+
+    def __init__(self):
+        self.contents = {}
+        self.created = []
+        self._ids = itertools.count(1)
+
+    def create(self, *, model, config=None):
+        name = f"cachedContents/fake-{next(self._ids)}"
+        ttl = float(str(config.ttl or "3600s").rstrip("s"))
+        cache = types.CachedContent(
+            name=name,
+            model=model,
+            display_name=config.display_name,
+            expire_time=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=ttl),
+            usage_metadata=types.CachedContentUsageMetadata(
+                total_token_count=count_tokens(config.system_instruction, *(config.tools or []))
+            ),
+        )
+        self.contents[name] = (cache, config)
+        self.created.append(name)
+        return cache
+
+    def get(self, *, name, config=None):
+        cache, _ = self.contents.get(name, (None, None))
+        if cache is None or cache.expire_time <= datetime.datetime.now(datetime.timezone.utc):
+            self.contents.pop(name, None)
+            raise errors.ClientError(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": f"CachedContent not found (or permission denied): {name}"}})
+        return cache
+
+    def delete(self, *, name, config=None):
+        self.contents.pop(name, None)
+
+
+class FakeModels(models.Models):
+    """Scripted replacement for `client.models` (subclassed so streaming chats accept it)."""
+
+    def __init__(self, responder=None, delay: float = 0.0, caches: FakeCaches = None):
+        self._responder = responder or echo_responder
+        self.delay = delay
+        self.caches = caches
+        self.calls = []
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def generate_content(self, *, model, contents, config=None):
+        with self._lock:
+            self.calls.append({"model": model, "contents": list(contents), "config": config})
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            cached_tokens = 0
+            if config is not None and config.cached_content:
+                if config.system_instruction or config.tools:
+                    raise errors.ClientError(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT", "message": "CachedContent can not be used with system_instruction or tools"}})
+                if self.caches is None:
+                    raise errors.ClientError(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": "CachedContent not found (or permission denied)"}})
+                cached_tokens = self.caches.get(name=config.cached_content).usage_metadata.total_token_count
+            response = self._responder(contents, config)
+            inline = count_tokens(config.system_instruction, *(config.tools or [])) if config is not None else 0
+            response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=cached_tokens + inline + count_tokens(*contents),
+                cached_content_token_count=cached_tokens or None,
+            )
+            return response
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        response = self.generate_content(model=model, contents=contents, config=config)
+        candidate = response.candidates[0] if response.candidates else None
+        parts = candidate.content.parts if candidate and candidate.content else []
+        texts = [p.text for p in parts if p.text]
+        if len(parts) != len(texts) or not texts:
+            # Tool calls and empty replies arrive as a single chunk
+            yield response
+            return
+        words = "".join(texts).split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield types.GenerateContentResponse(candidates=[types.Candidate(
+                content=types.Content(role="model", parts=[
+                    types.Part(text=word if last else word + " ")
+                ]),
+                finish_reason=candidate.finish_reason if last else None,
+            )], usage_metadata=response.usage_metadata if last else None)
+
+
+class FakeClient:
+    """Drop-in for `genai.Client` exposing `models` and `chats` (and `caches` if `caching`)."""
+
+    def __init__(self, responder=None, delay: float = 0.0, caching: bool = False):
+        if caching:
+            self.caches = FakeCaches()
+        self.models = FakeModels(responder, delay, getattr(self, "caches", None))
+        self.chats = chats.Chats(modules=self.models)
+
+
+class OrchestratorTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs the orchestrator offline: a FakeClient scripted by `responder`, a fresh
+    session store, no persistent backend, no transcript log or index, and a test
+    API key. Subclasses add their own patches with `patch()`.
+    """
+
+    responder = None
+    delay = 0.0
+    caching = False
+
+    def setUp(self):
+        self.client = FakeClient(responder=self.responder, delay=self.delay, caching=self.caching)
+        self.patch(
+            mock.patch.object(orchestrator, "_client", self.client),
+            mock.patch.object(orchestrator, "_sessions", SessionStore(sizer=orchestrator.estimate_session_bytes)),
+            mock.patch.object(orchestrator, "_backend", None),
+            mock.patch.object(orchestrator, "read_session_messages", return_value=[]),
+            mock.patch.object(api, "log_message"),
+            mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"}),
+        )
+
+    def patch(self, *patchers) -> None:
+        """Starts the patchers; each is undone after the test."""
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def http(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test")
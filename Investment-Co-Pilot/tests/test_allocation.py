@@ -12,6 +12,9 @@ from pathlib import Path
 # Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from fastapi.testclient import TestClient
+
+from execution import api
 from execution.financial_utils import calculate_holistic_allocation
 
 
@@ -147,5 +150,22 @@ class TestRelationships(unittest.TestCase):
             assert owner['equity_pct'] <= renter['equity_pct'], f"Failed at age {age}"
 
 
+class TestAllocationEndpoint(unittest.TestCase):
+
+    def test_wealth_context_is_applied(self):
+        client = TestClient(api.app)
+        response = client.post("/calculate-allocation", json={
+            "age": 40, "risk": "moderate", "goal": "longevity",
+            "wealth_context": {"housing_status": "own", "months_savings": 6},
+        })
+        assert response.status_code == 200
+        assert response.json() == calculate_holistic_allocation(age=40, housing_status="own")
+
+        response = client.post("/calculate-allocation", json={
+            "age": 40, "wealth_context": {"has_high_interest_debt": True},
+        })
+        assert response.json()["strategy"] == "DEBT_PAYOFF"
+
+
 # if __name__ == "__main__":
 #     pytest.main([__file__, "-v"])
@@ -0,0 +1,118 @@
+"""
+test_backtest.py
+
+Checks the rebalancing-policy backtester: band decisions agree with
+check_rebalancing, vectorized windows match a one-window replay, and the
+policy metrics behave as expected on synthetic return series.
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from execution.backtest import DEFAULT_POLICIES, _breach, backtest, load_returns, run_policy
+from execution.check_rebalancing import check_rebalancing
+
+
+def synthetic_series(periods: int = 12 * 40, seed: int = 3) -> dict:
+    rng = np.random.default_rng(seed)
+    returns = np.column_stack([rng.normal(0.007, 0.045, periods), rng.normal(0.002, 0.012, periods)])
+    return {"assets": ["equity", "bonds"], "returns": returns, "dates": None}
+
+
+class TestBandMatchesLiveCheck(unittest.TestCase):
+
+    def test_absolute_band_agrees_with_check_rebalancing(self):
+        rng = np.random.default_rng(0)
+        holdings = rng.uniform(0, 100_000, (5_000, 2))
+        target_pct = np.array([80.0, 20.0])
+        breach = _breach(DEFAULT_POLICIES["5% absolute band"], holdings, target_pct, 0, 12)
+        for (equity, bonds), decided in zip(holdings, breach):
+            report = check_rebalancing(
+                {"equity_value": equity, "bonds_value": bonds}, {"equity_pct": 80, "bonds_pct": 20}, 0
+            )
+            assert (report["status"] == "Drift Detected") == decided
+
+    def test_absolute_band_ignores_fun_like_check_rebalancing(self):
+        holdings = np.array([[78.0, 14.0, 8.0]])  # fun is 7pp over its 1% target, equity/bonds within 5pp
+        target_pct = np.array([80.0, 19.0, 1.0])
+        report = check_rebalancing(
+            {"equity_value": 78, "bonds_value": 14, "fun_value": 8}, {"equity_pct": 80, "bonds_pct": 19, "fun_bucket_pct": 1}, 0
+        )
+        assert report["status"] == "Balanced"
+        banded = np.array([True, True, False])
+        assert not _breach(DEFAULT_POLICIES["5% absolute band"], holdings, target_pct, 0, 12, banded)[0]
+        assert _breach(DEFAULT_POLICIES["5/25 relative band"], holdings, target_pct, 0, 12, banded)[0]
+
+        series = {"assets": ["equity", "bonds", "fun"], "returns": np.zeros((24, 3)), "dates": None}
+        series["returns"][0, 2] = 4.0  # the fun bucket jumps 5x, equity and bonds stay inside the band
+        results = {r["policy"]: r for r in backtest(
+            series, {"equity_pct": 80, "bonds_pct": 19, "fun_bucket_pct": 1}, window_years=2, workers=1)}
+        assert results["5% absolute band"]["trades_per_year"] == 0
+        assert results["5/25 relative band"]["trades_per_year"] > 0
+
+    def test_relative_band_is_tighter_for_small_targets(self):
+        holdings = np.array([[86.0, 10.0, 4.0]])  # fun is 1pp off a 3% target (33% relative)
+        target_pct = np.array([85.0, 12.0, 3.0])
+        assert not _breach(DEFAULT_POLICIES["5% absolute band"], holdings, target_pct, 0, 12)[0]
+        assert _breach(DEFAULT_POLICIES["5/25 relative band"], holdings, target_pct, 0, 12)[0]
+
+
+class TestPolicies(unittest.TestCase):
+
+    def test_windows_match_single_replay(self):
+        series = synthetic_series()
+        length = 120
+        results = backtest(series, {"equity_pct": 80, "bonds_pct": 20}, window_years=10, step=12, workers=1)
+        for policy_name, summary in zip(DEFAULT_POLICIES, results):
+            wealth = []
+            for start in range(0, len(series["returns"]) - length + 1, 12):
+                window = series["returns"][None, start:start + length]
+                wealth.append(run_policy(DEFAULT_POLICIES[policy_name], window, np.array([80.0, 20.0]))["terminal_wealth"][0])
+            assert summary["windows"] == len(wealth)
+            assert abs(summary["terminal_wealth_mean"] - np.mean(wealth)) < 1e-4
+
+    def test_policy_metrics(self):
+        results = {r["policy"]: r for r in backtest(synthetic_series(), {"equity_pct": 80, "bonds_pct": 20}, workers=2)}
+        assert results["never"]["trades_per_year"] == 0
+        assert results["never"]["turnover_per_year_pct"] == 0
+        assert results["annual"]["trades_per_year"] == 1.0
+        assert results["never"]["tracking_error_pct"] > results["annual"]["tracking_error_pct"]
+        assert 0 < results["5% absolute band"]["trades_per_year"] < 1.0
+
+    def test_always_rebalanced_has_no_tracking_error(self):
+        monthly = {"every month": {"type": "calendar", "months": 1}}
+        result = backtest(synthetic_series(), {"equity_pct": 60, "bonds_pct": 40}, policies=monthly, workers=1)[0]
+        assert result["tracking_error_pct"] < 1e-9
+        assert result["trades_per_year"] == 12
+
+
+class TestLoadReturns(unittest.TestCase):
+
+    def test_csv_and_npz(self):
+        series = synthetic_series(periods=24)
+        with tempfile.TemporaryDirectory() as tmp:
+            frame = pd.DataFrame(series["returns"], columns=series["assets"])
+            frame.insert(0, "date", pd.date_range("2000-01-31", periods=24, freq="ME").strftime("%Y-%m-%d"))
+            frame.to_csv(Path(tmp) / "returns.csv", index=False)
+            np.savez(Path(tmp) / "returns.npz", returns=series["returns"], assets=np.array(series["assets"]))
+
+            csv = load_returns(str(Path(tmp) / "returns.csv"))
+            npz = load_returns(str(Path(tmp) / "returns.npz"))
+        assert csv["assets"] == npz["assets"] == ["equity", "bonds"]
+        assert csv["dates"][0] == "2000-01-31" and npz["dates"] is None
+        assert np.allclose(csv["returns"], npz["returns"])
+
+    def test_window_longer_than_series(self):
+        with self.assertRaises(ValueError):
+            backtest(synthetic_series(periods=60), {"equity_pct": 80, "bonds_pct": 20}, window_years=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+test_batch_allocation.py
+
+Checks that the vectorized batch allocation matches calculate_holistic_allocation
+exactly over the full input grid, and exercises the bulk endpoint.
+"""
+import itertools
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from execution import api
+from execution.batch_allocation import calculate_allocation_batch
+from execution.financial_utils import calculate_holistic_allocation
+
+
+AGES = list(range(18, 100))
+RISKS = ["aggressive", "moderate", "conservative", "Aggressive"]
+GOALS = ["longevity", "legacy", "liquidity", "LEGACY"]
+FUN = [0, 1, 3, 5, 7, 10, 33, 50, 99, 100, 120]
+HOUSING = ["rent", "own", "own_with_mortgage", "Own_no_mortgage"]
+
+
+def grid() -> pd.DataFrame:
+    rows = itertools.product(AGES, RISKS, GOALS, FUN, HOUSING, [False, True], [0, 2, 3, 6])
+    return pd.DataFrame(rows, columns=[
+        "age", "risk_profile", "goal", "fun_bucket_pct", "housing_status",
+        "has_high_interest_debt", "months_savings",
+    ])
+
+
+class TestBatchMatchesScalar(unittest.TestCase):
+
+    def test_full_grid(self):
+        profiles = grid()
+        results = calculate_allocation_batch(profiles)
+        assert len(results) == len(profiles)
+        for profile, row in zip(profiles.to_dict(orient="records"), results.to_dict(orient="records")):
+            expected = calculate_holistic_allocation(**profile)
+            for key in ("equity_pct", "bonds_pct", "fun_bucket_pct", "strategy"):
+                assert row[key] == expected[key], (profile, key, row[key], expected[key])
+            assert row["housing_adjustment"] == expected.get("housing_adjustment", False), profile
+
+    def test_accepts_numpy_columns_and_defaults(self):
+        ages = np.array([30, 60, 70])
+        results = calculate_allocation_batch(age=ages, risk_profile=np.array(["aggressive"] * 3))
+        assert list(results["equity_pct"]) == [100, 90, 75]
+        assert list(results["strategy"]) == ["LIFECYCLE_V2"] * 3
+        assert "trace" not in results.columns
+
+    def test_trace_on_demand(self):
+        results = calculate_allocation_batch({"age": [40], "housing_status": ["own"]}, include_trace=True)
+        expected = calculate_holistic_allocation(age=40, housing_status="own")
+        assert results["trace"][0] == expected["trace"]
+
+    def test_requires_age(self):
+        with self.assertRaises(ValueError):
+            calculate_allocation_batch({"risk_profile": ["moderate"]})
+
+
+class TestBatchEndpoint(unittest.TestCase):
+
+    def test_results_in_request_order(self):
+        client = TestClient(api.app)
+        response = client.post("/calculate-allocation/batch", json={"profiles": [
+            {"age": 30, "risk": "aggressive"},
+            {"age": 40, "wealth_context": {"has_high_interest_debt": True}},
+            {"age": 50, "goal": "liquidity", "fun_bucket_pct": 10},
+        ]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["count"] == 3
+        assert [r["strategy"] for r in body["results"]] == ["LIFECYCLE_V2", "DEBT_PAYOFF", "LIQUIDITY_FOCUS"]
+        assert body["results"][2]["equity_pct"] == 18
+
+
+if __name__ == "__main__":
+    unittest.main()
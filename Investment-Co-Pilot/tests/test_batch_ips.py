@@ -0,0 +1,159 @@
+"""
+test_batch_ips.py
+
+Bulk IPS generation: record parsing, per-record error isolation, ordered
+process-pool output, and the JSONL / zip streams (CLI helper and endpoint).
+"""
+import io
+import json
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from execution import api, batch_ips, profiling
+from execution.batch_ips import create_pool, generate_ips_batch, iter_zip, read_profiles, render_profile, write_batch
+from execution.data_mapper import build_ips_context
+from execution.financial_utils import calculate_holistic_allocation
+from execution.generate_ips import generate_ips_markdown
+
+
+PROFILES = [
+    {"id": "c1", "age": 30, "risk_profile": "aggressive", "region": "US"},
+    {"name": "Jane Doe", "age": 70, "goal": "legacy", "esg_preference": True},
+    {"age": 45, "housing_status": "own", "fun_bucket_pct": 5},
+    {"id": "broken", "age": "forty"},
+    {"age": 38, "has_high_interest_debt": True},
+]
+
+
+def jsonl(profiles) -> str:
+    return "".join(json.dumps(p) + "\n" for p in profiles)
+
+
+class TestBatchIPS(unittest.TestCase):
+
+    def test_render_matches_tool_chain(self):
+        profile = {"age": 52, "risk_profile": "conservative", "goal": "longevity", "housing_status": "own"}
+        expected = generate_ips_markdown(**build_ips_context(calculate_holistic_allocation(**profile), profile))
+        assert render_profile(profile)["markdown"] == expected
+
+    def test_errors_are_reported_per_record(self):
+        source = io.StringIO(jsonl(PROFILES[:2]) + "not json\n\n[1, 2]\n" + jsonl(PROFILES[3:]))
+        results = list(generate_ips_batch(read_profiles(source), workers=0))
+        assert [r["status"] for r in results] == ["ok", "ok", "error", "error", "error", "ok"]
+        assert [r["line"] for r in results] == [1, 2, 3, 5, 6, 7]
+        assert results[1]["id"] == "Jane Doe"
+        assert results[4]["id"] == "broken"
+        assert results[5]["strategy"] == "DEBT_PAYOFF"
+
+    def test_csv_input(self):
+        source = io.StringIO("id,age,risk_profile,esg_preference,fun_bucket_pct\nx,30,aggressive,yes,\ny,31,moderate,maybe,\n")
+        records = list(read_profiles(source, "csv"))
+        assert records[0] == (2, {"id": "x", "age": 30, "risk_profile": "aggressive", "esg_preference": True}, None)
+        assert records[1][1] is None and "maybe" in records[1][2]
+
+    def test_process_pool_keeps_input_order(self):
+        profiles = [{"id": f"p{i}", "age": 20 + i % 60, "fun_bucket_pct": i % 11} for i in range(120)]
+        inline = list(generate_ips_batch(read_profiles(io.StringIO(jsonl(profiles))), workers=0))
+        pooled = list(generate_ips_batch(
+            read_profiles(io.StringIO(jsonl(profiles))), workers=2, chunk_size=7, max_in_flight=3
+        ))
+        assert [r["id"] for r in pooled] == [f"p{i}" for i in range(120)]
+        assert [r["markdown"] for r in pooled] == [r["markdown"] for r in inline]
+
+    def test_shared_pool_is_reused_and_not_forked(self):
+        pool = create_pool(2)
+        self.addCleanup(pool.shutdown)
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+        profiles = [{"id": f"p{i}", "age": 30 + i} for i in range(20)]
+        for _ in range(2):
+            results = list(generate_ips_batch(read_profiles(io.StringIO(jsonl(profiles))), workers=2, chunk_size=3, pool=pool))
+            assert [r["id"] for r in results] == [f"p{i}" for i in range(20)]
+
+    def test_zip_output(self):
+        results = generate_ips_batch(read_profiles(io.StringIO(jsonl(PROFILES))), workers=0)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(results))))
+        names = archive.namelist()
+        assert names == ["000001-c1.md", "000002-Jane_Doe.md", "000003-record-3.md",
+                         "errors/000004.json", "000005-record-5.md", "manifest.jsonl"]
+        manifest = [json.loads(line) for line in archive.read("manifest.jsonl").decode().splitlines()]
+        assert [m["file"] for m in manifest] == names[:-1]
+        assert "markdown" not in manifest[0]
+        assert archive.read("000001-c1.md").decode().startswith("# Investment Policy Statement")
+
+    def test_write_batch_counts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "profiles.jsonl"
+            source.write_text(jsonl(PROFILES))
+            counts = write_batch(str(source), str(Path(tmp) / "out" / "ips.jsonl"), workers=0)
+            assert counts == {"ok": 4, "error": 1}
+            assert len((Path(tmp) / "out" / "ips.jsonl").read_text().splitlines()) == 5
+
+
+class TestBatchEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in (mock.patch.object(api, "BATCH_IPS_WORKERS", 0),
+                        mock.patch.object(profiling, "PROFILE_ADMIN_KEY", "secret")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(api.app, headers={"X-Admin-Key": "secret"})
+
+    def test_jsonl_stream(self):
+        response = self.client.post("/generate-ips/batch", content=jsonl(PROFILES))
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [l["status"] for l in lines] == ["ok", "ok", "ok", "error", "ok"]
+
+    def test_zip_stream_from_csv(self):
+        response = self.client.post(
+            "/generate-ips/batch?format=zip",
+            content="id,age\na,30\nb,\n",
+            headers={"Content-Type": "text/csv"},
+        )
+        assert response.headers["content-type"] == "application/zip"
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.namelist() == ["000002-a.md", "errors/000003.json", "manifest.jsonl"]
+
+    def test_large_body_spooled_to_disk(self):
+        profiles = [{"id": f"p{i}", "age": 20 + i % 60} for i in range(300)]
+        body = jsonl(profiles).encode() + b'{"id": "bad\xff"}\r\n'
+        with mock.patch.object(api, "BATCH_IPS_SPOOL_BYTES", 1024):
+            response = self.client.post("/generate-ips/batch", content=iter([body[i:i + 777] for i in range(0, len(body), 777)]))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [l["id"] for l in lines] == [f"p{i}" for i in range(300)] + ["bad\ufffd"]
+        assert lines[-1]["status"] == "error"
+
+    def test_admin_only(self):
+        assert TestClient(api.app).post("/generate-ips/batch", content=jsonl(PROFILES)).status_code == 403
+        with mock.patch.object(profiling, "PROFILE_ADMIN_KEY", ""):
+            assert self.client.post("/generate-ips/batch", content=jsonl(PROFILES)).status_code == 404
+
+    def test_rejects_oversized_upload(self):
+        body = jsonl(PROFILES * 20).encode()
+        with mock.patch.object(api, "BATCH_IPS_MAX_BYTES", 1000):
+            assert self.client.post("/generate-ips/batch", content=body).status_code == 413
+            # Without a Content-Length the limit is enforced while reading
+            chunked = self.client.post("/generate-ips/batch", content=iter([body[i:i + 300] for i in range(0, len(body), 300)]))
+            assert chunked.status_code == 413
+
+    def test_pool_not_started_with_the_app(self):
+        with mock.patch.object(api, "BATCH_IPS_WORKERS", 2), TestClient(api.app) as client:
+            assert client.get("/health").status_code == 200
+            assert batch_ips._pool is None
+
+    def test_rejects_unknown_format(self):
+        response = self.client.post("/generate-ips/batch?format=pdf", content=jsonl(PROFILES))
+        assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+test_batch_rebalancing.py
+
+Checks that the vectorized rebalancing check agrees with check_rebalancing on
+random books, streams files in chunks, and exercises the HTTP endpoints.
+"""
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from execution import api
+from execution.batch_rebalancing import check_rebalancing_batch, write_rebalancing_batch
+from execution.check_rebalancing import check_rebalancing
+
+
+def random_book(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    equity_pct = rng.choice([0, 18, 45, 72, 80, 85, 100], n)
+    fun_pct = rng.choice([0, 5, 10], n)
+    return pd.DataFrame({
+        "account_id": [f"a{i}" for i in range(n)],
+        "equity_value": rng.integers(0, 200_000, n).astype(float),
+        "bonds_value": rng.integers(0, 80_000, n).astype(float),
+        "fun_value": rng.choice([0.0, 0.0, 2_500.0, 10_000.0], n),
+        "cash_value": rng.integers(0, 20_000, n).astype(float),
+        "equity_pct": equity_pct,
+        "bonds_pct": np.maximum(0, 100 - equity_pct - fun_pct),
+        "fun_bucket_pct": fun_pct,
+    })
+
+
+def parse_actions(actions: list) -> dict:
+    """'BUY Equity: $123.4' -> {'equity': 123.4}; sells are negative."""
+    trades = {}
+    for action in actions:
+        if action.startswith(("BUY", "SELL")):
+            side, rest = action.split(" ", 1)
+            asset, amount = rest.split(": $")
+            trades[asset.lower()] = float(amount) * (1 if side == "BUY" else -1)
+    return trades
+
+
+class TestBatchMatchesScalar(unittest.TestCase):
+
+    def test_random_book(self):
+        book = random_book(20_000)
+        book.loc[:9, ["equity_value", "bonds_value", "fun_value"]] = 0  # Some empty accounts
+        results = check_rebalancing_batch(book)
+        assert list(results["account_id"]) == list(book["account_id"])
+        for portfolio, row in zip(book.to_dict(orient="records"), results.to_dict(orient="records")):
+            report = check_rebalancing(portfolio, portfolio, 0)
+            if isinstance(report, str):
+                assert row["status"] == "Empty"
+                continue
+            assert row["status"] == report["status"], portfolio
+            assert abs(row["equity_drift"] - report["analysis"]["equity"]["drift"]) < 0.011
+            assert abs(row["bonds_drift"] - report["analysis"]["bonds"]["drift"]) < 0.011
+            trades = parse_actions(report["actions"])
+            assert abs(row["equity_trade"] - trades.get("equity", 0.0)) < 0.011, portfolio
+            assert abs(row["bonds_trade"] - trades.get("bonds", 0.0)) < 0.011, portfolio
+
+    def test_scalar_targets_and_cash_shortfall(self):
+        results = check_rebalancing_batch(
+            equity_value=np.array([60_000.0, 80_000.0]),
+            bonds_value=np.array([22_000.0, 20_000.0]),
+            fun_value=np.array([10_000.0, 0.0]),
+            cash_value=np.array([1_000.0, 0.0]),
+            equity_pct=80, bonds_pct=20,
+        )
+        assert list(results["status"]) == ["Drift Detected", "Balanced"]
+        assert results["equity_trade"][0] == 13_600.0
+        assert results["bonds_trade"][0] == -3_600.0
+        assert results["cash_shortfall"][0] == 9_000.0
+        assert results["net_trade"][1] == 0.0
+
+    def test_threshold(self):
+        book = {"equity_value": [76.0], "bonds_value": [24.0], "equity_pct": [80], "bonds_pct": [20]}
+        assert check_rebalancing_batch(book)["status"][0] == "Balanced"
+        assert check_rebalancing_batch(book, threshold=3.0)["status"][0] == "Drift Detected"
+
+
+class TestStreamingFile(unittest.TestCase):
+
+    def test_chunked_csv_and_jsonl(self):
+        book = random_book(2_500)
+        expected = check_rebalancing_batch(book)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "accounts.csv"
+            book.to_csv(source, index=False)
+            counts = write_rebalancing_batch(str(source), str(Path(tmp) / "out.csv"), chunk_size=1_000)
+            written = pd.read_csv(Path(tmp) / "out.csv")
+            assert len(written) == len(book)
+            assert list(written["status"]) == list(expected["status"])
+            assert counts == expected["status"].value_counts().to_dict()
+
+            jsonl_source = Path(tmp) / "accounts.jsonl"
+            book.to_json(jsonl_source, orient="records", lines=True)
+            write_rebalancing_batch(str(jsonl_source), str(Path(tmp) / "out.jsonl"), chunk_size=700)
+            lines = (Path(tmp) / "out.jsonl").read_text().splitlines()
+            assert [json.loads(l)["account_id"] for l in lines] == list(book["account_id"])
+
+
+class TestRebalancingEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(api.app)
+
+    def test_single(self):
+        response = self.client.post("/check-rebalancing", json={
+            "current_portfolio": {"equity_value": 60000, "bonds_value": 22000},
+            "target_allocation": {"equity_pct": 80, "bonds_pct": 20},
+        })
+        assert response.status_code == 200
+        assert response.json()["status"] == "Drift Detected"
+
+        empty = self.client.post("/check-rebalancing", json={
+            "current_portfolio": {}, "target_allocation": {"equity_pct": 80},
+        })
+        assert empty.status_code == 400
+
+    def test_single_with_solver(self):
+        request = {
+            "current_portfolio": {"equity_value": 60000, "bonds_value": 22000, "cash_value": 18000},
+            "target_allocation": {"equity_pct": 80, "bonds_pct": 20},
+        }
+        # The cash closes the gap without selling bonds
+        report = self.client.post("/check-rebalancing?solver=true", json=request).json()
+        assert report["actions"] == ["BUY Equity: $18000.0"]
+        assert report["analysis"]["equity"]["drift_after"] == -2.0
+        assert "SELL Bonds: $5600.0" in self.client.post("/check-rebalancing", json=request).json()["actions"]
+
+        empty = self.client.post("/check-rebalancing?solver=true", json={
+            "current_portfolio": {}, "target_allocation": {"equity_pct": 80},
+        })
+        assert empty.status_code == 400
+
+    def test_batch(self):
+        response = self.client.post("/check-rebalancing/batch", json={"portfolios": [
+            {"id": "x", "current_portfolio": {"equity_value": 60000, "bonds_value": 22000},
+             "target_allocation": {"equity_pct": 80, "bonds_pct": 20}},
+            {"current_portfolio": {"equity_value": 80, "bonds_value": 20},
+             "target_allocation": {"equity_pct": 80, "bonds_pct": 20}},
+        ]})
+        body = response.json()
+        assert body["count"] == 2
+        assert [r["id"] for r in body["results"]] == ["x", "1"]
+        assert [r["status"] for r in body["results"]] == ["Drift Detected", "Balanced"]
+
+
+if __name__ == "__main__":
+    unittest.main()
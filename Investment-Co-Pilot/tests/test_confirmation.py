@@ -0,0 +1,123 @@
+"""
+test_confirmation.py
+
+Checks the confirmation fast path: the model's confirmation block is captured
+as slots when it is printed, and a plain "yes" is answered with the IPS locally,
+without a model round trip. Runs against the offline fake client.
+"""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import orchestrator
+from execution.confirmation import confirmed_args, is_affirmative, is_complete, parse_confirmation
+from execution.data_mapper import build_ips_context
+from execution.financial_utils import calculate_holistic_allocation
+from execution.generate_ips import generate_ips_markdown
+from tests.fake_genai import OrchestratorTestCase, echo_responder, function_call_response, text_response
+
+
+CONFIRMATION = """Let me confirm the inputs for your portfolio model:
+- **Age:** 44
+- **Region:** US
+- **Housing:** Own
+- **Goal:** Longevity
+- **Risk Profile:** Conservative
+- **Fun Bucket:** 2%
+- **ESG:** Yes
+
+Does this look correct?"""
+
+
+def confirmation_block_responder(contents, config):
+    """Prints the confirmation block on 'details'; calls the tool itself on 'yes'."""
+    parts = contents[-1].parts or []
+    if any(p.function_response for p in parts):
+        return text_response("Noted.")
+    text = "".join(p.text or "" for p in parts)
+    if text == "details":
+        return text_response(CONFIRMATION)
+    if text == "partial":
+        return text_response("- **Age:** 44\n- **Region:** US\n\nAnything else?")
+    if text.lower().startswith("yes"):
+        return function_call_response("calculate_holistic_allocation", confirmed_args(parse_confirmation(CONFIRMATION)))
+    return echo_responder(contents, config)
+
+
+class TestParsing(unittest.TestCase):
+
+    def test_parse_block(self):
+        slots = parse_confirmation(CONFIRMATION)
+        assert slots == {"age": 44, "region": "US", "housing_status": "own", "goal": "longevity",
+                         "risk_profile": "conservative", "fun_bucket_pct": 2, "esg_preference": True}
+        assert is_complete(slots)
+        assert parse_confirmation("Thanks! How old are you?") is None
+        assert not is_complete(parse_confirmation("**Age:** 44, **Region:** US"))
+
+    def test_affirmative(self):
+        for message in ["yes", "Yes!", "yep, thanks", "Looks good, go ahead.", "That's correct", "ok proceed", "Yes please"]:
+            assert is_affirmative(message), message
+        for message in ["", "no", "yes but I'm 45", "yes, and what is ESG?", "actually I rent", "Is that correct?"]:
+            assert not is_affirmative(message), message
+
+
+class TestFastPath(OrchestratorTestCase):
+
+    responder = staticmethod(confirmation_block_responder)
+
+    def setUp(self):
+        super().setUp()
+        self.chat = orchestrator.create_chat(session_id="s")
+
+    def expected_ips(self) -> str:
+        args = confirmed_args(parse_confirmation(CONFIRMATION))
+        return generate_ips_markdown(**build_ips_context(calculate_holistic_allocation(**args), args))
+
+    def test_yes_answered_locally(self):
+        self.chat.send_message("details")
+        assert self.chat.send_message("Yes!") == self.expected_ips()
+        assert len(self.client.models.calls) == 1
+        # Follow-ups see the tool exchange and the post-report summary
+        self.chat.send_message("thanks")
+        contents = self.client.models.calls[-1]["contents"]
+        assert [c.role for c in contents[-5:]] == ["user", "model", "user", "model", "user"]
+        assert contents[-3].parts[0].function_response.response["ips_summary"]["allocation"]["fun_bucket_pct"] == 2
+
+    def test_streamed_yes_answered_locally(self):
+        "".join(self.chat.stream_message("details"))
+        assert "".join(self.chat.stream_message("looks good")) == self.expected_ips()
+        assert len(self.client.models.calls) == 1
+
+    def test_fast_path_matches_model_path(self):
+        self.chat.send_message("details")
+        with mock.patch.object(orchestrator, "CONFIRMATION_FAST_PATH", False):
+            via_model = self.chat.send_message("yes")
+        assert len(self.client.models.calls) == 3  # Block, tool call, post-report injection
+        assert via_model == self.expected_ips()
+
+    def test_other_replies_go_to_model(self):
+        self.chat.send_message("details")
+        assert self.chat.send_message("what is ESG?") == "echo: what is ESG?"
+        # The block is no longer the last reply
+        self.chat.send_message("yes")
+        assert len(self.client.models.calls) == 4
+
+    def test_incomplete_block_goes_to_model(self):
+        self.chat.send_message("partial")
+        self.chat.send_message("yes")
+        assert self.client.models.calls[-2]["contents"][-1].parts[0].text == "yes"
+
+    def test_restored_session(self):
+        self.chat.send_message("details")
+        orchestrator.clear_session("s")
+        rebuilt = orchestrator.create_chat(session_id="s", history=self.chat.get_history())
+        assert rebuilt.send_message("yes") == self.expected_ips()
+        assert len(self.client.models.calls) == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+test_context_cache.py
+
+Checks that chats share one cached directive + tools context: turns reference the
+cache instead of re-sending the instruction, the cache is recreated when the
+directive changes or the TTL runs out, and chats fall back to the inline
+instruction when caching is unavailable. Runs against the offline fake client.
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.genai import errors
+
+from execution import orchestrator
+from execution.context_cache import ContextCache
+from tests.fake_genai import OrchestratorTestCase
+
+
+DIRECTIVE = orchestrator.DIRECTIVE_PATH.read_text()
+
+
+class ContextCacheTestCase(OrchestratorTestCase):
+    """Installs a caching fake client and a fresh context cache over a temporary directive file."""
+
+    caching = True
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directive = Path(tmp.name) / "directive.md"
+        self.directive.write_text(DIRECTIVE)
+        self.cache = ContextCache(self.directive, ttl_seconds=3600, retry_seconds=300, refresh_margin_seconds=300, enabled=True)
+        self.patch(mock.patch.object(orchestrator, "_context_cache", self.cache))
+
+    def config(self, call: int = -1):
+        return self.client.models.calls[call]["config"]
+
+
+class TestCachedContext(ContextCacheTestCase):
+
+    def test_sessions_share_one_cache(self):
+        for i in range(3):
+            chat = orchestrator.create_chat(session_id=f"s-{i}")
+            assert chat.send_message("hi") == "echo: hi"
+            assert self.config().cached_content == self.client.caches.created[0]
+            assert self.config().system_instruction is None and self.config().tools is None
+        stats = orchestrator.get_context_cache_stats()
+        assert (stats["created"], stats["cached_sessions"], stats["inline_sessions"]) == (1, 3, 0)
+
+    def test_cache_created_on_first_turn_not_in_create_chat(self):
+        chat = orchestrator.create_chat(session_id="s")
+        assert self.client.caches.created == []
+        assert orchestrator.get_context_cache_stats()["cached_sessions"] == 0
+        chat.send_message("hi")
+        assert self.config().cached_content == self.client.caches.created[0]
+        assert orchestrator.get_context_cache_stats()["cached_sessions"] == 1
+
+    def test_cache_hit_tokens_reported(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("hi")
+        "".join(chat.stream_message("how are you"))
+        stats = orchestrator.get_context_cache_stats()
+        assert stats["cached_tokens"] > 2 * len(DIRECTIVE) // 4
+        assert stats["cache_hit_rate"] > 0.9
+
+    def test_directive_change_refreshes_cache(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("first")
+        self.directive.write_text("Updated directive.\n" + DIRECTIVE)
+        later = self.directive.stat().st_mtime_ns + 1_000_000_000
+        os.utime(self.directive, ns=(later, later))
+
+        assert chat.send_message("second") == "echo: second"
+        first, second = self.client.caches.created
+        assert self.config().cached_content == second
+        assert first not in self.client.caches.contents  # The replaced cache is deleted
+        assert self.client.caches.contents[second][1].system_instruction.startswith("Updated directive.")
+        # The chat moved over with its history
+        assert [c.parts[0].text for c in self.client.models.calls[-1]["contents"]][::2] == ["first", "second"]
+
+    def test_ttl_refreshes_cache(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("first")
+        soon = time.monotonic() + 3600 - 299
+        with mock.patch("execution.context_cache.time.monotonic", return_value=soon):
+            chat.send_message("second")
+        assert len(self.client.caches.created) == 2
+        assert self.config().cached_content == self.client.caches.created[1]
+        assert list(self.client.caches.contents) == [self.client.caches.created[1]]
+
+    def test_expired_cache_retried_on_fresh_one(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("first")
+        self.client.caches.delete(name=self.client.caches.created[0])
+
+        assert chat.send_message("second") == "echo: second"
+        self.client.caches.delete(name=self.client.caches.created[1])
+        assert "".join(chat.stream_message("third")) == "echo: third"
+        assert len(self.client.caches.created) == 3
+        assert [c.parts[0].text for c in chat.get_history() if c.role == "user"] == ["first", "second", "third"]
+
+    def test_other_errors_not_retried(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("first")
+        for error in (RuntimeError("cache warmer crashed"),
+                      errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE", "message": "overloaded"}})):
+            with mock.patch.object(self.client.models, "_responder", side_effect=error):
+                with self.assertRaises(type(error)):
+                    chat.send_message("second")
+        assert len(self.client.caches.created) == 1
+        assert chat.send_message("third") == "echo: third"
+        assert self.config().cached_content == self.client.caches.created[0]
+
+    def test_user_name_uses_inline_instruction(self):
+        chat = orchestrator.create_chat(session_id="s", user_name="Ada")
+        chat.send_message("hi")
+        assert self.config().cached_content is None
+        assert self.config().system_instruction.startswith("User Name: Ada")
+        assert self.client.caches.created == []
+
+
+class TestFallback(ContextCacheTestCase):
+
+    caching = False
+
+    def test_inline_when_caching_unavailable(self):
+        for i in range(2):
+            chat = orchestrator.create_chat(session_id=f"s-{i}")
+            assert chat.send_message("hi") == "echo: hi"
+            assert self.config().cached_content is None
+            assert self.config().system_instruction == DIRECTIVE
+            assert len(self.config().tools) == len(orchestrator.InvestmentCoPilotOrchestrator._tools())
+        stats = orchestrator.get_context_cache_stats()
+        # One failed attempt, then the retry backoff keeps later sessions from retrying
+        assert (stats["failures"], stats["inline_sessions"], stats["cached_tokens"]) == (1, 2, 0)
+
+    def test_disabled(self):
+        self.cache.enabled = False
+        orchestrator.create_chat(session_id="s").send_message("hi")
+        assert orchestrator.get_context_cache_stats()["failures"] == 0
+        assert self.config().cached_content is None
+
+
+if __name__ == "__main__":
+    unittest.main()
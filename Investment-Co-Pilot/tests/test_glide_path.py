@@ -0,0 +1,98 @@
+"""
+test_glide_path.py
+
+Checks the year-by-year glide path: it matches calculate_holistic_allocation at
+every age, is cached per profile class, and is rendered in the IPS Looking Ahead
+section and served by /glide-path.
+"""
+import itertools
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from execution import api
+from execution.batch_allocation import GLIDE_PATH_MAX_AGE, _glide_path_for_class, glide_path
+from execution.data_mapper import build_ips_context
+from execution.financial_utils import calculate_holistic_allocation
+from execution.generate_ips import generate_ips_markdown
+
+
+class TestGlidePath(unittest.TestCase):
+
+    def test_matches_scalar_at_every_age(self):
+        classes = itertools.product(
+            ["aggressive", "moderate", "conservative"], ["longevity", "legacy", "liquidity"],
+            [0, 5], ["rent", "own_with_mortgage"], [False, True], [2, 6],
+        )
+        for risk, goal, fun, housing, debt, months in classes:
+            profile = dict(risk_profile=risk, goal=goal, fun_bucket_pct=fun, housing_status=housing,
+                           has_high_interest_debt=debt, months_savings=months)
+            path = glide_path(30, **profile)
+            assert [row["age"] for row in path] == list(range(30, GLIDE_PATH_MAX_AGE + 1))
+            for row in path:
+                expected = calculate_holistic_allocation(age=row["age"], **profile)
+                for key in ("equity_pct", "bonds_pct", "fun_bucket_pct", "strategy"):
+                    assert row[key] == expected[key], (profile, row)
+
+    def test_cached_per_profile_class(self):
+        _glide_path_for_class.cache_clear()
+        glide_path(30, housing_status="own_with_mortgage", months_savings=6, region="EU")
+        glide_path(45, housing_status="Own_no_mortgage", months_savings=12)
+        glide_path(60, risk_profile="Aggressive", goal="LONGEVITY", housing_status="own")
+        info = _glide_path_for_class.cache_info()
+        assert (info.misses, info.hits) == (1, 2)
+
+    def test_rows_are_copies(self):
+        glide_path(40)[0]["equity_pct"] = -1
+        assert glide_path(40)[0]["equity_pct"] == 90
+
+
+class TestGlidePathInIPS(unittest.TestCase):
+
+    def test_table_in_looking_ahead(self):
+        profile = {"age": 35, "fun_bucket_pct": 5, "housing_status": "own"}
+        context = build_ips_context(calculate_holistic_allocation(**profile), profile)
+        assert context["glide_path"][0]["age"] == 35
+        markdown = generate_ips_markdown(**context)
+        section = markdown[markdown.index("## 5."):markdown.index("## 6.")]
+        assert "| 35–49 | 76% | 19% | 5% |" in section
+        assert "| 50–64 | 61% | 34% | 5% |" in section
+        assert "| 65–100 | 52% | 43% | 5% |" in section
+        assert section.index("| Age |") < section.index("*   **Action:**")
+
+    def test_gated_profile_shows_post_gate_path(self):
+        for profile in ({"age": 30, "has_high_interest_debt": True}, {"age": 30, "months_savings": 1}):
+            context = build_ips_context(calculate_holistic_allocation(**profile), profile)
+            assert context["allocation"]["strategy"] in ("DEBT_PAYOFF", "CASH_BUILDER")
+            assert context["glide_path"] == glide_path(30)
+            markdown = generate_ips_markdown(**context)
+            section = markdown[markdown.index("## 5."):markdown.index("## 6.")]
+            assert "transition to a Lifecycle strategy" in section
+            assert "| 30–49 | 90% | 10% | 0% |" in section
+            assert "| 0% | 0% | 0% |" not in section
+
+    def test_single_age_row(self):
+        markdown = generate_ips_markdown(age=100, glide_path=glide_path(100))
+        assert "| 100 | 65% | 35% | 0% |" in markdown
+
+
+class TestGlidePathEndpoint(unittest.TestCase):
+
+    def test_endpoint(self):
+        client = TestClient(api.app)
+        response = client.post("/glide-path", json={
+            "age": 55, "risk": "conservative", "wealth_context": {"housing_status": "own"},
+        })
+        body = response.json()
+        assert response.status_code == 200
+        assert (body["from_age"], body["to_age"], len(body["path"])) == (55, 100, 46)
+        assert body["path"] == glide_path(55, risk_profile="conservative", housing_status="own")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+test_history_manager.py
+
+Checks that chat histories stay within their token budget: older turns are folded
+into a rolling summary, the confirmation block and IPS summary stay pinned, and
+the orchestrator keeps working (including the malformed-call fallback) on
+compacted histories.
+"""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.genai import types
+
+from execution import orchestrator
+from execution.history_manager import SUMMARY_MARKER, HistoryManager, history_tokens
+from tests.fake_genai import OrchestratorTestCase, echo_responder, malformed_response, text_response
+
+
+CONFIRMATION = """Please confirm your details:
+*   **Age:** 52
+*   **Region:** US
+*   **Housing:** Own
+*   **Goal:** Legacy
+*   **Risk Profile:** Aggressive
+*   **Fun Bucket:** 3%
+*   **ESG:** No"""
+
+
+def message(role: str, text: str) -> types.Content:
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+
+def conversation(turns: int, size: int = 400) -> list:
+    history = []
+    for i in range(turns):
+        history += [message("user", f"question {i} " + "x" * size), message("model", f"answer {i} " + "y" * size)]
+    return history
+
+
+def malformed_on_yes_responder(contents, config):
+    """Prints the confirmation block on 'details', fails with MALFORMED_FUNCTION_CALL on 'yes'."""
+    text = "".join(p.text or "" for p in contents[-1].parts or [])
+    if text == "details":
+        return text_response(CONFIRMATION)
+    if text == "yes":
+        return malformed_response()
+    return echo_responder(contents, config)
+
+
+class TestCompaction(unittest.TestCase):
+
+    def test_under_budget_untouched(self):
+        history = conversation(3)
+        assert HistoryManager(token_budget=10_000).compact(history) == (history, False)
+        assert HistoryManager(token_budget=0).compact(conversation(100)) == (conversation(100), False)
+
+    def test_keeps_last_turns_verbatim(self):
+        manager = HistoryManager(token_budget=2_000, keep_turns=3)
+        history = conversation(20)
+        compacted, changed = manager.compact(history)
+        assert changed
+        assert compacted[0].parts[0].text.startswith(SUMMARY_MARKER)
+        assert compacted[2:] == history[-6:]
+        assert history_tokens(compacted) < manager.token_budget
+        stats = manager.stats()
+        assert (stats["compactions"], stats["turns_folded"]) == (1, 17)
+        assert stats["tokens_saved"] > 1_500
+
+    def test_confirmation_and_ips_summary_pinned(self):
+        history = [message("user", "hi"), message("model", CONFIRMATION), message("user", "yes"),
+                   types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(
+                       name="calculate_holistic_allocation", args={"age": 52}))]),
+                   types.Content(role="user", parts=[types.Part.from_function_response(
+                       name="calculate_holistic_allocation", response={"ips_summary": {"strategy": "LEGACY_GROWTH"}})]),
+                   message("model", "Noted.")] + conversation(10)
+        manager = HistoryManager(token_budget=1_000, keep_turns=2, summary_max_tokens=50)
+        compacted, _ = manager.compact(history)
+        # Fold again after more turns: the pins survive even though old lines are dropped
+        compacted, _ = manager.compact(compacted + conversation(10))
+        pinned = compacted[1].parts[0].text
+        assert CONFIRMATION in pinned and "LEGACY_GROWTH" in pinned
+        assert compacted[0].parts[0].text.split("\n")[1] == "(older messages omitted)"
+        # Kept turns start with the user, after the summary pair
+        assert [c.role for c in compacted[:3]] == ["user", "model", "user"]
+
+    def test_rolling_summary_accumulates(self):
+        manager = HistoryManager(token_budget=1_500, keep_turns=2, summary_max_tokens=10_000)
+        compacted, _ = manager.compact(conversation(10))
+        compacted, _ = manager.compact(compacted + conversation(10, size=401))
+        lines = compacted[0].parts[0].text.split("\n")
+        assert lines[1].startswith("User: question 0 ")
+        assert sum(line.startswith("User: ") for line in lines) == 18
+
+    def test_dict_history_accepted(self):
+        history = [c.model_dump(exclude_none=True) for c in conversation(20)]
+        compacted, changed = HistoryManager(token_budget=2_000, keep_turns=2).compact(history)
+        assert changed and len(compacted) == 6
+
+
+class TestOrchestratorHistory(OrchestratorTestCase):
+
+    responder = staticmethod(malformed_on_yes_responder)
+
+    def setUp(self):
+        super().setUp()
+        self.manager = HistoryManager(token_budget=1_500, keep_turns=2)
+        self.patch(mock.patch.object(orchestrator, "_history", self.manager))
+
+    def test_prompt_stays_bounded(self):
+        chat = orchestrator.create_chat(session_id="s")
+        for i in range(40):
+            assert chat.send_message(f"message {i} " + "z" * 300) == f"echo: message {i} " + "z" * 300
+        sizes = [history_tokens(call["contents"]) for call in self.client.models.calls]
+        assert max(sizes[10:]) < 2 * self.manager.token_budget
+        assert orchestrator.get_history_stats()["tokens_saved"] > 0
+
+    def test_malformed_fallback_after_compaction(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("details")
+        for i in range(20):
+            chat.send_message(f"message {i} " + "z" * 300)
+        assert self.manager.stats()["compactions"] > 0
+        reply = chat.send_message("yes")
+        assert reply.startswith("# Investment Policy Statement")
+        assert "| **3. Age** | **52** |" in reply
+
+    def test_replayed_history_compacted(self):
+        history = [c.model_dump(exclude_none=True) for c in conversation(30)]
+        chat = orchestrator.create_chat(session_id="s", history=history)
+        assert len(chat.get_history()) == 2 + 2 * 2
+        chat.send_message("hi")
+        assert self.client.models.calls[0]["contents"][0].parts[0].text.startswith(SUMMARY_MARKER)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+test_ips_cache.py
+
+Checks the IPS memoization layer: canonical keys, LRU eviction, date rollover,
+and that cached output is identical to a fresh render.
+"""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import ips_cache
+from execution.generate_ips import generate_ips_markdown
+from execution.ips_cache import IPSCache, ips_cache_key
+
+
+INPUTS = {
+    "age": 35,
+    "region": "EU",
+    "esg_preference": False,
+    "goals": {"liquidity": "Emergency Fund", "longevity": "Retirement"},
+    "wealth_context": {"housing_status": "rent", "income_stability": "stable"},
+    "allocation": {"equity_pct": 85, "bonds_pct": 10, "fun_bucket_pct": 5, "strategy": "LIFECYCLE_V2"},
+}
+
+
+class TestIPSCacheKey(unittest.TestCase):
+
+    def test_key_ignores_dict_order_and_unused_kwargs(self):
+        reordered = dict(reversed(list(INPUTS.items())))
+        reordered["allocation"] = dict(reversed(list(INPUTS["allocation"].items())))
+        reordered["session_note"] = "ignored by the renderer"
+        assert ips_cache_key(INPUTS, "2026-01-01") == ips_cache_key(reordered, "2026-01-01")
+
+    def test_key_changes_with_inputs_and_date(self):
+        base = ips_cache_key(INPUTS, "2026-01-01")
+        assert ips_cache_key(INPUTS, "2026-01-02") != base
+        assert ips_cache_key({**INPUTS, "age": 36}, "2026-01-01") != base
+        assert ips_cache_key({**INPUTS, "esg_preference": 1}, "2026-01-01") != base
+
+
+class TestIPSCache(unittest.TestCase):
+
+    def test_hit_returns_identical_markdown(self):
+        cache = IPSCache(max_entries=4)
+        first = cache.render(**INPUTS)
+        second = cache.render(**INPUTS)
+        assert first == second == generate_ips_markdown(**INPUTS)
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hit_rate"] == 0.5
+
+    def test_lru_eviction(self):
+        cache = IPSCache(max_entries=2)
+        for age in (30, 31, 30, 32):  # 30 is refreshed, so 31 is the one evicted
+            cache.render(**{**INPUTS, "age": age})
+        assert len(cache) == 2
+        assert cache.stats()["evictions"] == 1
+        cache.render(**{**INPUTS, "age": 30})
+        assert cache.stats()["hits"] == 2
+
+    def test_date_rollover_renders_again(self):
+        cache = IPSCache(max_entries=4)
+        with mock.patch.object(ips_cache, "datetime") as fake:
+            fake.now.return_value.strftime.return_value = "2026-01-01"
+            cache.render(**INPUTS)
+            fake.now.return_value.strftime.return_value = "2026-01-02"
+            cache.render(**INPUTS)
+        assert cache.stats()["misses"] == 2
+
+    def test_disabled_cache_always_renders(self):
+        cache = IPSCache(max_entries=0)
+        cache.render(**INPUTS)
+        cache.render(**INPUTS)
+        assert len(cache) == 0
+        assert cache.stats()["hits"] == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+test_ips_golden.py
+
+Byte-for-byte regression check for the IPS renderer.
+Renders a fixed grid of inputs (with the date pinned) and compares the sha256 of
+every document against tests/ips_golden_hashes.json.
+
+After an intentional change to the IPS text, regenerate the hashes with:
+    python tests/test_ips_golden.py --update
+"""
+import hashlib
+import itertools
+import json
+import random
+import sys
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import generate_ips
+from execution.generate_ips import generate_ips_markdown
+
+
+GOLDEN_FILE = Path(__file__).parent / "ips_golden_hashes.json"
+PINNED_DATE = datetime(2026, 1, 15, 9, 30)
+
+TRACE = [
+    "1. Starting Capital: 95% (after 5% Fun Bucket)",
+    "2. Base Equity Ratio: 90% (Age 35, Risk 'moderate')",
+    "3. Housing Adjustment: None (Renter - no real estate exposure)",
+    "4. Final Equity: 85%",
+]
+
+
+def golden_cases() -> list:
+    """Deterministic sample of renderer inputs covering every branch."""
+    rng = random.Random(2026)
+    cases = []
+    strategies = ["LIFECYCLE_V2", "LIQUIDITY_FOCUS", "LEGACY_GROWTH", "DEBT_PAYOFF", None]
+    ages = [25, 49, 50, 59, 60, 64, 65, 80]
+    for strategy, age in itertools.product(strategies, ages):
+        for _ in range(6):
+            allocation = {
+                "equity_pct": rng.choice([0, 18, 45, 72, 85, 100]),
+                "bonds_pct": rng.choice([0, 5, 9, 10, 28, 55]),
+                "fun_bucket_pct": rng.choice([0, 0, 5, 10]),
+            }
+            if strategy:
+                allocation["strategy"] = strategy
+            if rng.random() < 0.3:
+                allocation["housing_adjustment"] = rng.choice([True, False])
+            if rng.random() < 0.5:
+                allocation["trace"] = TRACE[:rng.randint(1, 4)]
+            cases.append({
+                "age": age,
+                "region": rng.choice(["US", "EU", "eu ", "UK", None]),
+                "esg_preference": rng.choice([True, False]),
+                "goals": rng.choice([
+                    {"liquidity": "Emergency Fund", "longevity": "Retirement"},
+                    {"liquidity": True, "longevity": False},
+                    {"liquidity": False, "longevity": True},
+                    {"liquidity": "House Deposit", "longevity": "Legacy"},
+                    {"longevity": "longevity planning"},
+                    {},
+                ]),
+                "wealth_context": {
+                    "housing_status": rng.choice(["rent", "own", "own_with_mortgage", "Own_no_mortgage"]),
+                    "income_stability": rng.choice(["stable", "volatile", "Volatile"]),
+                    "has_high_interest_debt": rng.choice([True, False, False]),
+                    "risk_profile": rng.choice(["aggressive", "moderate", "conservative", "Aggressive"]),
+                },
+                "allocation": allocation,
+            })
+    # Defaults and sparse inputs
+    cases.append({})
+    cases.append({"age": 45, "wealth_context": {}, "allocation": {"strategy": "LIFECYCLE_V2"}})
+    return cases
+
+
+def render_hashes() -> list:
+    with mock.patch.object(generate_ips, "datetime") as fake_datetime:
+        fake_datetime.now.return_value = PINNED_DATE
+        return [
+            hashlib.sha256(generate_ips_markdown(**case).encode("utf-8")).hexdigest()
+            for case in golden_cases()
+        ]
+
+
+class TestIPSGolden(unittest.TestCase):
+
+    def test_output_is_byte_identical(self):
+        expected = json.loads(GOLDEN_FILE.read_text())
+        actual = render_hashes()
+        assert len(actual) == len(expected)
+        for i, (case, want, got) in enumerate(zip(golden_cases(), expected, actual)):
+            assert got == want, f"IPS output changed for case {i}: {case}"
+
+
+if __name__ == "__main__":
+    if "--update" in sys.argv:
+        GOLDEN_FILE.write_text(json.dumps(render_hashes(), indent=0) + "\n")
+        print(f"Wrote {GOLDEN_FILE}")
+    else:
+        unittest.main()
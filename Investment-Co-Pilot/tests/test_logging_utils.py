@@ -0,0 +1,212 @@
+"""
+test_logging_utils.py
+
+Verifies the background transcript writer: group commits, flush-on-demand,
+and that concurrent writers (threads and processes) never interleave lines.
+Also covers segment rotation and reading sessions back through the index.
+"""
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from unittest.mock import patch
+
+from execution import logging_utils, orchestrator
+from execution.logging_utils import TranscriptWriter
+from execution.transcript_index import TranscriptIndex, rebuild_index
+
+
+def _append_from_process(path, worker, count):
+    writer = TranscriptWriter(path, flush_entries=16, flush_ms=5, fsync="never")
+    for i in range(count):
+        writer.write(json.dumps({"worker": worker, "i": i, "pad": "x" * 8192}) + "\n")
+    writer.close()
+
+
+class TestTranscriptWriter(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "transcripts.jsonl"
+
+    def read_lines(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_flush_commits_queued_lines(self):
+        writer = TranscriptWriter(self.path, flush_entries=1000, flush_ms=60_000, fsync="never")
+        self.addCleanup(writer.close)
+        writer.write('{"n": 1}\n')
+        writer.write('{"n": 2}\n')
+        assert writer.flush(timeout=2)
+        assert self.read_lines() == [{"n": 1}, {"n": 2}]
+
+    def test_group_commit(self):
+        """Many queued lines are written in far fewer commits"""
+        writer = TranscriptWriter(self.path, flush_entries=50, flush_ms=50, fsync="batch")
+        for n in range(500):
+            writer.write(json.dumps({"n": n}) + "\n")
+        writer.close()
+        assert [e["n"] for e in self.read_lines()] == list(range(500))
+        assert writer.commits <= 500 // 50 + 2
+
+    def test_interval_elapses_without_flush(self):
+        writer = TranscriptWriter(self.path, flush_entries=1000, flush_ms=20, fsync="interval")
+        self.addCleanup(writer.close)
+        writer.write('{"n": 1}\n')
+        threading.Event().wait(0.3)
+        assert self.read_lines() == [{"n": 1}]
+
+    def test_threads_do_not_interleave(self):
+        writer = TranscriptWriter(self.path, flush_entries=32, flush_ms=5, fsync="never")
+
+        def worker(w):
+            for i in range(200):
+                writer.write(json.dumps({"worker": w, "i": i}) + "\n")
+
+        threads = [threading.Thread(target=worker, args=(w,)) for w in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.close()
+        entries = self.read_lines()
+        assert len(entries) == 1600
+        for w in range(8):
+            assert [e["i"] for e in entries if e["worker"] == w] == list(range(200))
+
+    def test_processes_do_not_interleave(self):
+        """Large lines from several processes appending to one file stay intact"""
+        procs = [
+            multiprocessing.Process(target=_append_from_process, args=(str(self.path), w, 100))
+            for w in range(4)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        entries = self.read_lines()  # Raises if any line was torn
+        assert len(entries) == 400
+
+    def test_rejects_unknown_fsync_policy(self):
+        with self.assertRaises(ValueError):
+            TranscriptWriter(self.path, fsync="sometimes")
+
+
+def _entry(session_id, role, message):
+    return json.dumps({"timestamp": "2026-01-01T00:00:00+00:00", "sessionId": session_id,
+                       "role": role, "message": message}) + "\n"
+
+
+class TestTranscriptRotation(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.path = self.dir / "transcripts.jsonl"
+        self.index = TranscriptIndex(self.dir / "index.sqlite3", self.dir)
+
+    def make_writer(self, **kwargs):
+        kwargs.setdefault("rotate_bytes", 2048)
+        writer = TranscriptWriter(self.path, flush_entries=4, flush_ms=1, fsync="never",
+                                  index=self.index, **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def write_conversation(self, writer, turns=60):
+        for i in range(turns):
+            writer.write(_entry("a", "user", f"question {i} " + "x" * 40), key="a")
+            writer.write(_entry("b", "user", f"other {i}"), key="b")
+            writer.write(_entry("a", "model", f"answer {i}"), key="a")
+            writer.flush()
+
+    def test_rotates_by_size_into_compressed_segments(self):
+        writer = self.make_writer()
+        self.write_conversation(writer)
+        archives = sorted(self.dir.glob("transcripts-*.jsonl.gz"))
+        assert writer.rotations >= 2
+        assert len(archives) == writer.rotations
+        assert not list(self.dir.glob("transcripts-*.jsonl"))  # Plain archives were compressed
+        assert self.path.stat().st_size < 2048 + 512
+
+    def test_reads_session_across_segments_in_order(self):
+        writer = self.make_writer()
+        self.write_conversation(writer)
+        messages = [e["message"] for e in self.index.read_session("a")]
+        expected = []
+        for i in range(60):
+            expected += [f"question {i} " + "x" * 40, f"answer {i}"]
+        assert messages == expected
+        assert len(self.index.read_session("b")) == 60
+        assert self.index.read_session("missing") == []
+
+    def test_read_includes_pending_lines_without_commit(self):
+        writer = self.make_writer(rotate_bytes=0)
+        writer.write(_entry("a", "user", "committed"), key="a")
+        writer.flush()
+        writer.flush_seconds = 60  # Nothing else is committed during the test
+        writer.write(_entry("a", "model", "queued"), key="a")
+        writer.write(_entry("b", "user", "other"), key="b")
+        commits = writer.commits
+        with patch.object(logging_utils, "_writer", writer), patch.object(logging_utils, "_index", self.index):
+            messages = [e["message"] for e in logging_utils.read_session_messages("a")]
+        assert messages == ["committed", "queued"]
+        assert writer.commits == commits
+
+    def test_rotates_by_age(self):
+        writer = self.make_writer(rotate_bytes=0, rotate_seconds=60)
+        writer.write(_entry("a", "user", "old"), key="a")  # Timestamp far in the past
+        writer.flush()
+        writer.write(_entry("a", "user", "new"), key="a")
+        writer.flush()
+        assert writer.rotations == 1
+        assert [e["message"] for e in self.index.read_session("a")] == ["old", "new"]
+
+    def test_rebuild_index_matches_live_index(self):
+        writer = self.make_writer()
+        self.write_conversation(writer, turns=30)
+        before = self.index.read_session("a")
+        assert rebuild_index(self.index) == 90
+        assert self.index.read_session("a") == before
+
+
+class TestRebuildFromTranscript(unittest.TestCase):
+
+    def test_history_skips_failed_turns_and_pending_message(self):
+        entries = [
+            {"role": "user", "message": "hi"},
+            {"role": "model", "message": "hello"},
+            {"role": "user", "message": "broken"},
+            {"role": "model", "message": "[ERROR] boom"},
+            {"role": "user", "message": "current message"},
+        ]
+        history = orchestrator.history_from_transcript(entries)
+        assert [(c.role, c.parts[0].text) for c in history] == [("user", "hi"), ("model", "hello")]
+
+    def test_create_chat_rebuilds_evicted_session(self):
+        entries = [
+            {"sessionId": "s", "role": "user", "message": "My name is Ann"},
+            {"sessionId": "s", "role": "model", "message": "Hi Ann"},
+            {"sessionId": "s", "role": "user", "message": "next"},
+        ]
+        with patch.object(orchestrator, "read_session_messages", return_value=entries), \
+             patch.object(orchestrator, "_sessions", orchestrator.SessionStore()), \
+             patch.object(orchestrator, "_backend", None), \
+             patch.dict("os.environ", {"GEMINI_API_KEY": "test-key"}), \
+             patch.object(orchestrator.InvestmentCoPilotOrchestrator, "start_session") as start:
+            orchestrator.create_chat("s")
+        history = start.call_args.kwargs["history"]
+        assert [c.parts[0].text for c in history] == ["My name is Ann", "Hi Ann"]
+
+
+if __name__ == "__main__":
+    unittest.main()
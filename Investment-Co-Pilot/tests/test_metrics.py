@@ -0,0 +1,111 @@
+"""
+test_metrics.py
+
+Checks the Prometheus exposition (histogram buckets, label escaping) and that a
+/chat request records every stage it passes through: rate limit, transcript log,
+create_chat hit/new, the Gemini call, tool time, post-report injection and the
+malformed-call fallback.
+"""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import metrics
+from execution.metrics import Counter, Histogram
+from tests.fake_genai import OrchestratorTestCase, echo_responder, function_call_response, malformed_response
+from tests.test_orchestrator import CONFIRMED_ARGS
+
+
+def metrics_responder(contents, config):
+    text = "".join(p.text or "" for p in contents[-1].parts or [])
+    if text == "build it":
+        return function_call_response("calculate_holistic_allocation", CONFIRMED_ARGS)
+    if text == "broken":
+        return malformed_response()
+    return echo_responder(contents, config)
+
+
+class TestExposition(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("t_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, stage="a")
+        lines = histogram.render()
+        assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+        assert 't_seconds_bucket{stage="a",le="1"} 3' in lines
+        assert 't_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+        assert 't_seconds_sum{stage="a"} 6.050000' in lines
+        assert 't_seconds_count{stage="a"} 4' in lines
+        assert "# TYPE t_seconds histogram" in lines
+
+    def test_counter_labels_escaped(self):
+        counter = Counter("t_total", "Test.", ["tool"])
+        counter.inc(tool='say "hi"\n')
+        counter.inc(2, tool='say "hi"\n')
+        assert counter.render()[-1] == 't_total{tool="say \\"hi\\"\\n"} 3'
+
+    def test_timed_records_final_labels(self):
+        histogram = Histogram("t2_seconds", "Test.", ["result"])
+        with metrics.timed(histogram, "s", result="new") as labels:
+            labels["result"] = "hit"
+        assert histogram.count(result="hit") == 1 and histogram.count(result="new") == 0
+
+    def test_disabled_records_nothing(self):
+        histogram = Histogram("t3_seconds", "Test.", ["stage"])
+        with mock.patch.object(metrics, "METRICS_ENABLED", False):
+            with metrics.timed(histogram, "s", stage="x"):
+                pass
+        assert histogram.count(stage="x") == 0
+
+
+class TestRequestPath(OrchestratorTestCase):
+
+    responder = staticmethod(metrics_responder)
+
+    async def chat(self, message: str, session_id: str = "metrics-s"):
+        async with self.http() as http:
+            return (await http.post("/chat", json={"message": message, "sessionId": session_id})).json()
+
+    def counts(self) -> dict:
+        return {
+            "rate_limit": metrics.STAGE_SECONDS.count(stage="rate_limit"),
+            "transcript_log": metrics.STAGE_SECONDS.count(stage="transcript_log"),
+            "new": metrics.CREATE_CHAT_SECONDS.count(result="new"),
+            "hit": metrics.CREATE_CHAT_SECONDS.count(result="hit"),
+            "gemini": metrics.GEMINI_SECONDS.count(call="message"),
+            "tool": metrics.TOOL_SECONDS.count(tool="calculate_holistic_allocation"),
+            "post_report": metrics.STAGE_SECONDS.count(stage="post_report_injection"),
+            "malformed": metrics.MALFORMED_FALLBACKS.value(outcome="no_confirmation"),
+            "http": metrics.HTTP_REQUEST_SECONDS.count(method="POST", route="/chat", status="200"),
+        }
+
+    async def test_chat_stages_recorded(self):
+        before = self.counts()
+        await self.chat("hello")
+        await self.chat("build it")
+        await self.chat("broken")
+        after = self.counts()
+        delta = {key: after[key] - before[key] for key in before}
+        assert delta == {"rate_limit": 3, "transcript_log": 6, "new": 1, "hit": 2, "gemini": 3,
+                         "tool": 1, "post_report": 1, "malformed": 1, "http": 3}, delta
+
+    async def test_metrics_endpoint(self):
+        await self.chat("hello")
+        async with self.http() as http:
+            response = await http.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert '# TYPE copilot_stage_seconds histogram' in body
+        assert 'copilot_create_chat_seconds_count{result="new"}' in body
+        assert 'copilot_gemini_call_seconds_bucket{call="message",le="+Inf"}' in body
+        assert "copilot_sessions_in_memory 1" in body
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+test_monte_carlo.py
+
+Checks the Monte Carlo outcome simulator: seeded reproducibility independent of
+worker count, percentile accuracy of the chunked histograms, shortfall
+probability, and the IPS range-of-outcomes section.
+"""
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from execution import api, monte_carlo
+from execution.generate_ips import generate_ips_markdown
+from execution.ips_cache import ips_cache_key
+from execution.monte_carlo import simulate_outcomes
+
+
+ALLOCATION = {"equity_pct": 76, "bonds_pct": 19, "fun_bucket_pct": 5, "strategy": "LIFECYCLE_V2"}
+
+
+def exact_final_values(seed: int, paths: int, years: int, initial_value: float) -> np.ndarray:
+    """Reference: the same draws as a single chunk, without the histogram."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    mu, sigma = monte_carlo._log_return_params()
+    shocks = rng.standard_normal((paths, years, 3)) @ np.linalg.cholesky(monte_carlo.CORRELATIONS).T
+    weights = np.array([0.76, 0.19, 0.05])
+    portfolio = np.exp(mu + sigma * shocks) @ weights + (1.0 - weights.sum())
+    return initial_value * portfolio.prod(axis=1)
+
+
+class TestSimulation(unittest.TestCase):
+
+    def test_seed_is_reproducible_across_chunking_workers(self):
+        kwargs = dict(paths=3_000, years=10, seed=42, chunk_size=1_000)
+        inline = simulate_outcomes(ALLOCATION, workers=1, **kwargs)
+        pooled = simulate_outcomes(ALLOCATION, workers=2, **kwargs)
+        assert inline == pooled
+        assert simulate_outcomes(ALLOCATION, workers=1, **{**kwargs, "seed": 43}) != inline
+        assert len(inline["percentiles"][50]) == 11
+        assert inline["percentiles"][10][-1] < inline["percentiles"][50][-1] < inline["percentiles"][90][-1]
+
+    def test_unseeded_run_reports_its_seed(self):
+        first = simulate_outcomes(ALLOCATION, paths=500, years=5)
+        again = simulate_outcomes(ALLOCATION, paths=500, years=5, seed=first["seed"])
+        assert first == again
+
+    def test_histogram_percentiles_match_exact(self):
+        result = simulate_outcomes(ALLOCATION, initial_value=50_000, paths=20_000, years=20, seed=5, workers=1)
+        exact = exact_final_values(5, 20_000, 20, 50_000)
+        for pct in (10, 50, 90):
+            expected = np.percentile(exact, pct)
+            assert abs(result["percentiles"][pct][-1] / expected - 1) < 0.003, pct
+        assert abs(result["shortfall_probability"] - np.mean(exact < 50_000)) <= 5e-5  # Rounded to 4 places
+        assert abs(result["mean_final_value"] - exact.mean()) <= 0.005
+
+    def test_zero_volatility_compounds_deterministically(self):
+        flat = {name: {"mean": 0.03, "volatility": 0.0} for name in monte_carlo.RETURN_ASSUMPTIONS}
+        with mock.patch.dict(monte_carlo.RETURN_ASSUMPTIONS, flat):
+            result = simulate_outcomes(ALLOCATION, initial_value=1_000, annual_contribution=100, years=10, paths=100, seed=1)
+        expected = 1_000.0
+        for _ in range(10):
+            expected = expected * 1.03 + 100
+        for pct in (10, 50, 90):
+            # Every path lands in the same bin, so the error is up to one bin width
+            assert abs(result["percentiles"][pct][-1] / expected - 1) < 0.005
+        assert result["shortfall_probability"] == 0.0
+
+    def test_cash_only_strategies(self):
+        debt = {"equity_pct": 0, "bonds_pct": 0, "fun_bucket_pct": 0, "strategy": "DEBT_PAYOFF"}
+        assert simulate_outcomes(debt, paths=100, years=5, seed=1)["shortfall_probability"] == 0.0
+        assert simulate_outcomes(debt, paths=100, years=5, seed=1, target_value=100_001)["shortfall_probability"] == 1.0
+
+    def test_rejects_empty_inputs(self):
+        with self.assertRaises(ValueError):
+            simulate_outcomes(ALLOCATION, initial_value=0)
+
+
+class TestIPSSimulationSection(unittest.TestCase):
+
+    def test_section_is_embedded(self):
+        simulation = simulate_outcomes(ALLOCATION, paths=2_000, years=12, seed=9)
+        markdown = generate_ips_markdown(age=40, allocation=ALLOCATION, simulation=simulation)
+        section = markdown[markdown.index("## 5."):markdown.index("## 6.")]
+        assert "### 📈 Range of Outcomes (Monte Carlo)" in section
+        assert "2,000 simulated market paths over 12 years" in section
+        assert [line.split(" |")[0] for line in section.splitlines() if line[:3] in ("| 5", "| 1")] == ["| 5", "| 10", "| 12"]
+        assert f"{simulation['shortfall_probability']:.0%} chance of ending below $100,000" in section
+
+    def test_json_round_trip_and_cache_key(self):
+        simulation = simulate_outcomes(ALLOCATION, paths=500, years=5, seed=9)
+        as_json = {**simulation, "percentiles": {str(k): v for k, v in simulation["percentiles"].items()}}
+        assert generate_ips_markdown(allocation=ALLOCATION, simulation=simulation) == \
+            generate_ips_markdown(allocation=ALLOCATION, simulation=as_json)
+        base = {"allocation": ALLOCATION}
+        assert ips_cache_key(base, "2026-01-01") != ips_cache_key({**base, "simulation": simulation}, "2026-01-01")
+
+    def test_endpoint_validates_simulation(self):
+        client = TestClient(api.app)
+        simulation = json.loads(json.dumps(simulate_outcomes(ALLOCATION, paths=500, years=5, seed=9)))
+        request = {"age": 40, "wealth_context": {}, "allocation": {"equity_pct": 76, "bonds_pct": 19, "fun_bucket_pct": 5}}
+        response = client.post("/generate-ips", json={**request, "simulation": simulation})
+        assert response.status_code == 200
+        assert "500 simulated market paths over 5 years" in response.json()["content"]
+
+        short = {**simulation, "percentiles": {**simulation["percentiles"], "50": [1.0, 2.0]}}
+        missing = {k: v for k, v in simulation.items() if k != "target_value"}
+        for bad in (short, missing, {**simulation, "percentiles": {}}, {**simulation, "years": 0}):
+            assert client.post("/generate-ips", json={**request, "simulation": bad}).status_code == 422
+
+
+if __name__ == "__main__":
+    unittest.main()
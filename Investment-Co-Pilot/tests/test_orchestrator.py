@@ -0,0 +1,165 @@
+"""
+test_orchestrator.py
+
+Exercises the orchestrator and the /chat endpoint against an offline fake Gemini client.
+No network access or API key is needed.
+"""
+import asyncio
+import json
+import sys
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import orchestrator
+from execution.financial_utils import calculate_holistic_allocation
+from execution.data_mapper import build_ips_context
+from execution.generate_ips import generate_ips_markdown
+from tests.fake_genai import OrchestratorTestCase, echo_responder, function_call_response, text_response
+
+
+CONFIRMED_ARGS = {
+    "age": 35, "region": "EU", "risk_profile": "moderate", "goal": "longevity",
+    "housing_status": "rent", "fun_bucket_pct": 5, "esg_preference": False,
+}
+
+
+def confirming_responder(contents, config):
+    """Calls the allocation tool once the user says 'yes'; acknowledges tool results."""
+    parts = contents[-1].parts or []
+    if any(p.function_response for p in parts):
+        return text_response("Noted.")
+    if any((p.text or "").lower() == "yes" for p in parts):
+        return function_call_response("calculate_holistic_allocation", CONFIRMED_ARGS)
+    return echo_responder(contents, config)
+
+
+def parse_sse(body: str) -> list:
+    """Returns (event, payload) pairs from an SSE body, skipping comments."""
+    events = []
+    for frame in body.split("\n\n"):
+        event, data = "message", None
+        for line in frame.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        if data is not None:
+            events.append((event, data))
+    return events
+
+
+class TestConcurrentChat(OrchestratorTestCase):
+    """A slow Gemini call must not block other conversations"""
+
+    delay = 0.2
+
+    async def test_chats_run_in_parallel(self):
+        """50 sessions x 200ms should finish in far less than 10s of serial time"""
+        n = 50
+        async with self.http() as http:
+            start = time.perf_counter()
+            replies = await asyncio.gather(*[
+                http.post("/chat", json={"message": f"hi {i}", "sessionId": f"s-{i}"})
+                for i in range(n)
+            ])
+            elapsed = time.perf_counter() - start
+
+        for i, r in enumerate(replies):
+            assert r.json() == {"reply": f"echo: hi {i}"}
+        assert elapsed < n * self.delay / 4, f"Requests were serialized ({elapsed:.2f}s)"
+        assert self.client.models.max_in_flight > 1
+
+    async def test_health_responds_while_chat_in_flight(self):
+        """The event loop stays free while a Gemini call is pending"""
+        async with self.http() as http:
+            chat = asyncio.create_task(http.post("/chat", json={"message": "hi", "sessionId": "slow"}))
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            health = await http.get("/health")
+            assert time.perf_counter() - start < self.delay / 2
+            assert health.json()["status"] == "ok"
+            await chat
+
+    async def test_same_session_turns_are_serialized(self):
+        """Two concurrent turns on one session must not interleave the history"""
+        chat = orchestrator.create_chat(session_id="shared")
+        await asyncio.gather(chat.send_message_async("one"), chat.send_message_async("two"))
+        roles = [c.role for c in chat.chat.get_history()]
+        assert roles == ["user", "model", "user", "model"]
+        assert self.client.models.max_in_flight == 1
+
+    async def test_stalled_stream_does_not_hold_executor_threads(self):
+        """Turns queued behind a stalled stream wait on the loop, not on executor threads"""
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        self.patch(mock.patch.object(orchestrator, "_executor", executor))
+        chat = orchestrator.create_chat(session_id="stalled")
+        stream = chat.stream_message_async("tell me about bonds")
+        first = await stream.__anext__()
+
+        queued = [asyncio.create_task(chat.send_message_async(f"next {i}")) for i in range(4)]
+        other = orchestrator.create_chat(session_id="other")
+        assert await asyncio.wait_for(other.send_message_async("hi"), 1) == "echo: hi"
+        assert not any(task.done() for task in queued)
+
+        rest = [chunk async for chunk in stream]
+        assert first + "".join(rest) == "echo: tell me about bonds"
+        assert await asyncio.wait_for(asyncio.gather(*queued), 1) == [f"echo: next {i}" for i in range(4)]
+
+    def test_concurrent_sync_turn_refused(self):
+        chat = orchestrator.create_chat(session_id="busy")
+        stream = chat.stream_message("tell me about bonds")
+        next(stream)
+        with self.assertRaises(orchestrator.SessionBusyError):
+            chat.send_message("hi")
+        stream.close()
+        assert chat.send_message("hi") == "echo: hi"
+
+
+class TestStreamingChat(OrchestratorTestCase):
+    """The /chat/stream SSE endpoint"""
+
+    responder = staticmethod(confirming_responder)
+
+    async def test_text_reply_streams_tokens(self):
+        """Plain replies arrive as several deltas followed by a done frame"""
+        async with self.http() as http:
+            r = await http.post("/chat/stream", json={"message": "tell me about bonds", "sessionId": "st-1"})
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = parse_sse(r.text)
+        deltas = [d["delta"] for e, d in events if e == "message"]
+        assert len(deltas) > 1
+        assert events[-1] == ("done", {"reply": "echo: tell me about bonds"})
+        assert "".join(deltas) == events[-1][1]["reply"]
+
+    async def test_tool_call_streams_ips_sections(self):
+        """A confirmed profile streams the auto-chained IPS in section-sized chunks"""
+        expected = generate_ips_markdown(**build_ips_context(
+            calculate_holistic_allocation(**CONFIRMED_ARGS), CONFIRMED_ARGS
+        ))
+        async with self.http() as http:
+            r = await http.post("/chat/stream", json={"message": "yes", "sessionId": "st-2"})
+        events = parse_sse(r.text)
+        deltas = [d["delta"] for e, d in events if e == "message"]
+        assert len(deltas) >= 6
+        assert deltas[1].startswith("## 1. Executive Summary")
+        assert "".join(deltas) == expected
+        assert events[-1] == ("done", {"reply": expected})
+
+    async def test_stream_matches_send_message(self):
+        """Streaming and non-streaming turns leave the same history behind"""
+        streamed = orchestrator.create_chat(session_id="st-3")
+        plain = orchestrator.create_chat(session_id="st-4")
+        reply = "".join([c async for c in streamed.stream_message_async("yes")])
+        assert reply == plain.send_message("yes")
+        assert len(streamed.chat.get_history(curated=True)) == len(plain.chat.get_history(curated=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+test_post_report_context.py
+
+Checks what the model keeps after an IPS is shown: a compact summary instead of
+the full document, with exact sections fetched through get_ips_section.
+Runs against the offline fake client.
+"""
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import orchestrator
+from execution.context_cache import tool_declarations
+from execution.data_mapper import build_ips_context
+from execution.financial_utils import calculate_holistic_allocation
+from execution.generate_ips import find_ips_section, generate_ips_markdown, summarize_ips
+from tests.fake_genai import OrchestratorTestCase, count_tokens, echo_responder, function_call_response, text_response
+from tests.test_orchestrator import CONFIRMED_ARGS
+
+
+def section_responder(contents, config):
+    """Confirms on 'yes', asks for section 4 on 'rules?', acknowledges tool results."""
+    parts = contents[-1].parts or []
+    if any(p.function_response for p in parts):
+        return text_response("Noted.")
+    text = "".join(p.text or "" for p in parts).lower()
+    if text == "yes":
+        return function_call_response("calculate_holistic_allocation", CONFIRMED_ARGS)
+    if text == "rules?":
+        return function_call_response("get_ips_section", {"section": "4"})
+    return echo_responder(contents, config)
+
+
+def function_responses(call: dict) -> list:
+    return [p.function_response for c in call["contents"] for p in c.parts or [] if p.function_response]
+
+
+class PostReportTestCase(OrchestratorTestCase):
+
+    responder = staticmethod(section_responder)
+
+    def report_and_follow_up(self, session_id: str = "s"):
+        chat = orchestrator.create_chat(session_id=session_id)
+        ips = chat.send_message("yes")
+        chat.send_message("thanks")
+        return chat, ips, self.client.models.calls[-1]
+
+
+class TestSummaryInjection(PostReportTestCase):
+
+    def test_summary_replaces_full_ips(self):
+        chat, ips, follow_up = self.report_and_follow_up()
+        injected = function_responses(follow_up)[0].response
+        assert "ips_shown_to_user" not in injected
+        summary = injected["ips_summary"]
+        assert summary["allocation"] == {"equity_pct": 85, "bonds_pct": 10, "fun_bucket_pct": 5}
+        assert summary["strategy"] == "LIFECYCLE_V2"
+        assert summary["tickers"]["equity"].split(" ")[0] in ips
+        assert summary["trace"] and all(step in ips for step in summary["trace"])
+        assert len(json.dumps(summary)) < len(ips) / 4
+
+    def test_follow_up_prompt_is_smaller(self):
+        _, _, summary_turn = self.report_and_follow_up("summary")
+        with mock.patch.object(orchestrator, "POST_REPORT_CONTEXT", "full"):
+            _, _, full_turn = self.report_and_follow_up("full")
+        assert "ips_shown_to_user" in function_responses(full_turn)[0].response
+        assert count_tokens(*summary_turn["contents"]) < count_tokens(*full_turn["contents"]) / 2
+
+
+class TestGetIpsSection(PostReportTestCase):
+
+    def test_section_fetched_verbatim(self):
+        chat, ips, _ = self.report_and_follow_up()
+        assert chat.send_message("rules?") == "Noted."
+        response = function_responses(self.client.models.calls[-1])[-1].response
+        assert response["status"] == "success"
+        assert response["section"].startswith("## 4. Risk Management Rules")
+        assert response["section"] in ips
+
+    def test_rebuilt_session_regenerates_report(self):
+        chat, ips, _ = self.report_and_follow_up()
+        orchestrator.clear_session("s")
+        rebuilt = orchestrator.create_chat(session_id="s", history=chat.get_history())
+        assert rebuilt._ips is None
+        rebuilt.send_message("rules?")
+        response = function_responses(self.client.models.calls[-1])[-1].response
+        assert response["section"] == find_ips_section(ips, "4")
+
+    def test_declared_to_the_model(self):
+        declarations = tool_declarations(orchestrator.InvestmentCoPilotOrchestrator._tools())[0].function_declarations
+        declared = {d.name: d for d in declarations}["get_ips_section"]
+        assert declared.parameters.required == ["section"]
+        assert declared.parameters.properties["section"].type == "STRING"
+
+    def test_no_report_yet(self):
+        chat = orchestrator.create_chat(session_id="s")
+        chat.send_message("rules?")
+        response = function_responses(self.client.models.calls[-1])[-1].response
+        assert response["status"] == "error"
+
+
+class TestFindIpsSection(unittest.TestCase):
+
+    def setUp(self):
+        profile = {"age": 58, "housing_status": "own", "has_high_interest_debt": True}
+        self.context = build_ips_context(calculate_holistic_allocation(**profile), profile)
+        self.ips = generate_ips_markdown(**self.context)
+
+    def test_lookup(self):
+        assert find_ips_section(self.ips, "5.").startswith("## 5. Looking Ahead")
+        assert "## 6." not in find_ips_section(self.ips, "5")
+        assert find_ips_section(self.ips, "core portfolio").startswith("### The Core Portfolio")
+        assert find_ips_section(self.ips, "Disclaimer").startswith("### Legal Disclaimer")
+        assert find_ips_section(self.ips, "tax loss harvesting") is None
+
+    def test_summary_notes(self):
+        summary = summarize_ips(**self.context)
+        assert any("debt" in note for note in summary["notes"])
+        assert summary["glide_path"] == ["| 58–64 | 65% | 35% | 0% |", "| 65–100 | 55% | 45% | 0% |"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+test_profiling.py
+
+Checks opt-in request profiling: only admin-requested or sampled requests to the
+profiled endpoints are captured, the /chat profile covers the worker thread that
+talks to Gemini, and the admin endpoints list and serve the stored profiles.
+"""
+import pstats
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import profiling
+from tests.fake_genai import OrchestratorTestCase
+
+
+ADMIN = {"X-Admin-Key": "secret"}
+ALLOCATION = {"age": 40, "risk": "moderate", "goal": "longevity"}
+
+
+class ProfilingTestCase(OrchestratorTestCase):
+
+    key = "secret"
+    sample_rate = 0.0
+
+    def setUp(self):
+        super().setUp()
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.patch(
+            mock.patch.object(profiling, "PROFILE_ADMIN_KEY", self.key),
+            mock.patch.object(profiling, "PROFILE_SAMPLE_RATE", self.sample_rate),
+            mock.patch.object(profiling, "PROFILING_ENABLED", bool(self.key) or self.sample_rate > 0),
+            mock.patch.object(profiling, "PROFILE_DIR", self.dir),
+        )
+
+    def stored(self) -> list:
+        return sorted(path.stem for path in self.dir.glob("*.prof"))
+
+
+class TestDisabled(ProfilingTestCase):
+
+    key = ""
+
+    async def test_nothing_captured(self):
+        async with self.http() as http:
+            response = await http.post("/calculate-allocation", json=ALLOCATION,
+                                       headers={"X-Profile": "1", "X-Admin-Key": ""})
+            assert response.status_code == 200
+            assert "x-profile-id" not in response.headers
+            assert (await http.get("/admin/profiles")).status_code == 404
+        assert self.stored() == []
+
+    def test_bind_is_identity(self):
+        fn = lambda: None
+        assert profiling.bind(fn) is fn
+
+
+class TestCapture(ProfilingTestCase):
+
+    async def test_requested_chat_profile(self):
+        async with self.http() as http:
+            response = await http.post("/chat", json={"message": "hi", "sessionId": "p"},
+                                       headers={"X-Profile": "1", "X-Request-ID": "req-1", **ADMIN})
+        assert response.json() == {"reply": "echo: hi"}
+        assert response.headers["x-profile-id"] == "req-1"
+        assert self.stored() == ["req-1"]
+        report = profiling.render_profile(self.dir / "req-1.prof", limit=None)
+        # The executor thread running the Gemini round trip is part of the profile
+        assert "send_message" in report and "_process_response" in report
+
+    async def test_wrong_key_or_path_not_profiled(self):
+        async with self.http() as http:
+            await http.post("/calculate-allocation", json=ALLOCATION, headers={"X-Profile": "1", "X-Admin-Key": "nope"})
+            await http.get("/health", headers={"X-Profile": "1", **ADMIN})
+            await http.post("/calculate-allocation", json=ALLOCATION, headers=ADMIN)
+        assert self.stored() == []
+
+    async def test_unsafe_request_id_replaced(self):
+        async with self.http() as http:
+            response = await http.post("/calculate-allocation", json=ALLOCATION,
+                                       headers={"X-Profile": "1", "X-Request-ID": "../../etc", **ADMIN})
+        assert response.headers["x-profile-id"] != "../../etc"
+        assert self.stored() == [response.headers["x-profile-id"]]
+
+    async def test_admin_endpoints(self):
+        async with self.http() as http:
+            await http.post("/generate-ips", headers={"X-Profile": "1", "X-Request-ID": "ips-1", **ADMIN}, json={
+                "age": 40, "wealth_context": {}, "allocation": {"equity_pct": 60, "bonds_pct": 40, "fun_bucket_pct": 0},
+            })
+            assert (await http.get("/admin/profiles")).status_code == 403
+            listing = (await http.get("/admin/profiles", headers=ADMIN)).json()["profiles"]
+            assert [(p["request_id"], p["path"], p["reason"], p["status"]) for p in listing] == [
+                ("ips-1", "/generate-ips", "requested", 200)]
+
+            download = await http.get("/admin/profiles/ips-1", headers=ADMIN)
+            assert download.status_code == 200
+            copy = self.dir / "copy.prof"
+            copy.write_bytes(download.content)
+            assert pstats.Stats(str(copy)).total_calls > 0
+
+            text = await http.get("/admin/profiles/ips-1?format=text&limit=1000", headers=ADMIN)
+            assert "Ordered by: cumulative time" in text.text
+            # The sync endpoint ran on the threadpool, which is part of the profile
+            assert "generate_ips_markdown" in text.text
+            assert (await http.get("/admin/profiles/missing", headers=ADMIN)).status_code == 404
+
+    async def test_old_profiles_pruned(self):
+        with mock.patch.object(profiling, "PROFILE_MAX_FILES", 2):
+            async with self.http() as http:
+                for i in range(4):
+                    await http.post("/calculate-allocation", json=ALLOCATION,
+                                    headers={"X-Profile": "1", "X-Request-ID": f"r{i}", **ADMIN})
+        assert len(self.stored()) == 2
+        assert len(list(self.dir.glob("*.json"))) == 2
+
+
+class TestSampling(ProfilingTestCase):
+
+    key = ""
+    sample_rate = 1.0
+
+    async def test_sampled_requests_profiled(self):
+        async with self.http() as http:
+            response = await http.post("/calculate-allocation", json=ALLOCATION)
+            await http.get("/health")
+        assert self.stored() == [response.headers["x-profile-id"]]
+        assert profiling.list_profiles()[0]["reason"] == "sampled"
+
+    async def test_sampled_request_id_not_taken_from_client(self):
+        async with self.http() as http:
+            first = await http.post("/calculate-allocation", json=ALLOCATION, headers={"X-Request-ID": "victim"})
+            second = await http.post("/calculate-allocation", json=ALLOCATION, headers={"X-Request-ID": "victim"})
+        ids = {first.headers["x-profile-id"], second.headers["x-profile-id"]}
+        assert "victim" not in ids and len(ids) == 2
+        assert self.stored() == sorted(ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+test_rate_limit.py
+
+Verifies the sliding-window rate limiter: the 20-per-30-minutes session rule,
+per-IP limits, idle-key eviction and the SQLite backend shared across workers.
+"""
+import ipaddress
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from starlette.requests import Request
+
+from execution import api, rate_limit
+from execution.rate_limit import MemoryRateLimitBackend, RateLimiter, SQLiteRateLimitBackend
+
+
+class FakeClock:
+    def __init__(self, now=1_800_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitTestCase(unittest.TestCase):
+
+    def make_limiter(self, backend=None):
+        self.clock = getattr(self, "clock", None) or FakeClock()
+        return RateLimiter(backend, clock=self.clock, sweep_interval=0)
+
+
+class TestSessionRule(RateLimitTestCase):
+    """20 requests per 30 minutes per session"""
+
+    def test_blocks_after_limit(self):
+        limiter = self.make_limiter()
+        assert all(limiter.check("s") for _ in range(20))
+        assert not limiter.check("s")
+        assert limiter.check("other")  # Other sessions are unaffected
+
+    def test_window_slides(self):
+        """Half a window later, half of the previous window's requests still count"""
+        limiter = self.make_limiter()
+        for _ in range(20):
+            limiter.check("s")
+        self.clock.now += 1800 * 1.5
+        allowed = sum(limiter.check("s") for _ in range(20))
+        assert allowed == 10
+
+    def test_old_windows_forgotten(self):
+        limiter = self.make_limiter()
+        for _ in range(20):
+            limiter.check("s")
+        self.clock.now += 1800 * 2
+        assert all(limiter.check("s") for _ in range(20))
+
+    def test_rejected_requests_are_not_counted(self):
+        limiter = self.make_limiter()
+        for _ in range(25):
+            limiter.check("s")
+        assert limiter.stats()["allowed"] == 20 and limiter.stats()["rejected"] == 5
+
+
+class TestIpAndGlobalRules(RateLimitTestCase):
+
+    def test_rotating_session_ids_hit_ip_limit(self):
+        with mock.patch.object(rate_limit, "RATE_LIMIT_IP_MAX_REQUESTS", 50):
+            limiter = self.make_limiter()
+            allowed = sum(limiter.check(f"session-{i}", "203.0.113.7") for i in range(100))
+            assert allowed == 50
+            assert limiter.check("fresh", "198.51.100.1")
+
+    def test_global_limit(self):
+        with mock.patch.object(rate_limit, "RATE_LIMIT_GLOBAL_MAX_REQUESTS", 30):
+            limiter = self.make_limiter()
+            allowed = sum(limiter.check(f"s-{i}", f"ip-{i}") for i in range(40))
+            assert allowed == 30
+
+
+class TestEviction(RateLimitTestCase):
+
+    def test_idle_keys_are_swept(self):
+        backend = MemoryRateLimitBackend()
+        limiter = self.make_limiter(backend)
+        for i in range(1000):
+            limiter.check(f"s-{i}")
+        assert len(backend) == 1000
+        self.clock.now += 1800
+        limiter.check("active")
+        self.clock.now += 1800
+        assert backend.sweep(self.clock.now) == 1000
+        assert len(backend) == 1
+
+
+class TestSharedBackend(RateLimitTestCase):
+    """Two worker processes sharing one SQLite file share one budget"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "ratelimit.sqlite3"
+
+    def test_limit_holds_across_workers(self):
+        worker_a = self.make_limiter(SQLiteRateLimitBackend(self.path))
+        worker_b = self.make_limiter(SQLiteRateLimitBackend(self.path))
+        allowed = sum((worker_a if i % 2 else worker_b).check("s") for i in range(40))
+        assert allowed == 20
+
+    def test_sweep(self):
+        backend = SQLiteRateLimitBackend(self.path)
+        limiter = self.make_limiter(backend)
+        limiter.check("s")
+        self.clock.now += 3600
+        assert backend.sweep(self.clock.now) == 1
+        assert len(backend) == 0
+
+
+class TestClientIp(unittest.TestCase):
+    """X-Forwarded-For only names the client when it comes from a trusted proxy"""
+
+    def request(self, peer: str, forwarded: str = None) -> Request:
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+    def test_header_ignored_without_trusted_proxies(self):
+        with mock.patch.object(rate_limit, "TRUSTED_PROXIES", []):
+            assert api.get_client_ip(self.request("203.0.113.9", "1.2.3.4")) == "203.0.113.9"
+
+    def test_trusted_proxy_hop_used(self):
+        with mock.patch.object(rate_limit, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")]):
+            assert api.get_client_ip(self.request("10.0.1.5", "1.2.3.4, 198.51.100.7")) == "198.51.100.7"
+            assert api.get_client_ip(self.request("10.0.1.5")) == "10.0.1.5"
+            # A client reaching the app directly cannot pick its own bucket
+            assert api.get_client_ip(self.request("203.0.113.9", "1.2.3.4")) == "203.0.113.9"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+test_rebalance_solver.py
+
+Checks the N-asset-class rebalancer: inflow is invested before anything is sold,
+every class ends inside its band, and the traded volume is the minimum needed.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from execution.rebalance_solver import plan_rebalance, solve_rebalance
+
+
+def random_book(n: int, classes: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    values = rng.exponential(10_000, (n, classes))
+    targets = rng.dirichlet(np.ones(classes), n) * 100
+    cash = rng.choice([0.0, 0.0, 500.0, 5_000.0, 50_000.0], n)
+    return values, targets, cash
+
+
+class TestSolverInvariants(unittest.TestCase):
+
+    def test_random_books(self):
+        for classes in (2, 3, 5, 12):
+            values, targets, cash = random_book(5_000, classes, seed=classes)
+            plan = solve_rebalance(values, targets, cash)
+            buys, sells = plan["buys"], plan["sells"]
+
+            # Inside the band, cash fully invested, nothing bought and sold at once
+            assert (np.abs(plan["drift_after"]) <= 5.0 + 1e-7).all(), classes
+            assert np.allclose(buys.sum(axis=1) - sells.sum(axis=1), cash), classes
+            assert (buys >= 0).all() and (sells >= 0).all()
+            assert not ((buys > 1e-6) & (sells > 1e-6)).any(), classes
+
+            # Minimal: overweight classes must shed their out-of-band excess, and
+            # out-of-band shortfalls not covered by cash must be funded by sells
+            total = values.sum(axis=1) + cash
+            target_values = targets / targets.sum(axis=1, keepdims=True) * total[:, None]
+            band = 0.05 * total[:, None]
+            after = values + buys - sells
+            unavoidable = np.maximum(
+                np.maximum(values - target_values - band, 0).sum(axis=1),
+                np.maximum(target_values - values - band, 0).sum(axis=1) - cash,
+            )
+            assert np.allclose(sells.sum(axis=1), np.maximum(unavoidable, 0), atol=1e-6), classes
+            assert np.allclose(after.sum(axis=1), total)
+
+    def test_inflow_first_avoids_sells(self):
+        # 73/27 against an 80/20 target: 10k of new cash fixes it without selling bonds
+        plan = solve_rebalance([60_000, 22_000], [80, 20], cash=10_000)
+        assert plan["sells"].sum() == 0
+        assert plan["buys"][0].tolist() == [10_000, 0]
+        assert not plan["rebalanced"][0]
+
+    def test_sells_only_to_band_edge(self):
+        plan = solve_rebalance([60_000, 22_000], [80, 20])
+        assert np.allclose(plan["sells"][0], [0, 1_500])
+        assert np.allclose(plan["buys"][0], [1_500, 0])
+        assert np.allclose(plan["drift_after"][0], [-5, 5])
+
+    def test_balanced_book_trades_nothing(self):
+        plan = solve_rebalance([[80, 20], [76, 24]], [80, 20])
+        assert plan["buys"].sum() == 0 and plan["sells"].sum() == 0
+        assert not plan["rebalanced"].any()
+
+
+class TestPlanReport(unittest.TestCase):
+
+    def test_speculation_classes(self):
+        report = plan_rebalance(
+            {"equity_value": 90_000, "bonds_value": 5_000, "fun_value": 5_000, "cash_value": 1_000, "gold_value": 0},
+            {"equity_pct": 65, "bonds_pct": 25, "fun_bucket_pct": 5, "gold_pct": 5},
+        )
+        assert report["status"] == "Drift Detected"
+        assert set(report["analysis"]) == {"equity", "bonds", "fun", "gold"}
+        assert report["actions"] == ["SELL Equity: $19300.0", "BUY Bonds: $17750.0", "BUY Gold: $2550.0"]
+        assert report["analysis"]["equity"]["drift"] == 25.0
+
+    def test_empty_and_balanced(self):
+        assert plan_rebalance({"equity_value": 0}, {"equity_pct": 100}) == "Portfolio is empty."
+        report = plan_rebalance({"equity_value": 81, "bonds_value": 19}, {"equity_pct": 80, "bonds_pct": 20})
+        assert report["status"] == "Balanced"
+        assert report["actions"][0].startswith("No Action Needed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+"""
+test_session_store.py
+
+Verifies the bounded session store (LRU, byte budget, idle TTL), that
+create_chat rebuilds evicted sessions transparently, and that the session
+endpoints are admin only.
+"""
+import asyncio
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from execution import orchestrator, profiling
+from execution.session_store import SessionStore
+from execution.session_backend import SQLiteSessionBackend, StaleSessionError
+from tests.fake_genai import OrchestratorTestCase
+from google.genai import types
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore(unittest.TestCase):
+    """LRU + TTL mechanics"""
+
+    def test_lru_eviction_by_count(self):
+        """Oldest-accessed session is evicted first"""
+        store = SessionStore(max_entries=2, max_bytes=10**9, idle_ttl_seconds=60)
+        store.put("a", 1)
+        store.put("b", 2)
+        assert store.get("a") == 1  # 'b' is now least recently used
+        store.put("c", 3)
+        assert "b" not in store
+        assert store.get("a") == 1 and store.get("c") == 3
+        assert store.stats()["evictions"] == 1
+
+    def test_byte_budget(self):
+        """Entries are evicted until the byte budget holds"""
+        store = SessionStore(max_entries=100, max_bytes=100, idle_ttl_seconds=60, sizer=len)
+        store.put("a", "x" * 60)
+        store.put("b", "y" * 60)
+        assert "a" not in store
+        assert store.stats()["bytes"] == 60
+
+    def test_resize_on_put(self):
+        """Re-putting a session re-measures it"""
+        store = SessionStore(max_entries=100, max_bytes=1000, idle_ttl_seconds=60, sizer=len)
+        store.put("a", "x" * 10)
+        store.put("a", "x" * 500)
+        assert store.stats()["bytes"] == 500
+        assert len(store) == 1
+
+    def test_idle_ttl_expiry(self):
+        """Idle sessions expire and count as misses"""
+        clock = FakeClock()
+        store = SessionStore(max_entries=10, max_bytes=10**9, idle_ttl_seconds=30, clock=clock)
+        store.put("a", 1)
+        store.put("b", 2)
+        clock.now = 20
+        assert store.get("a") == 1  # refreshes 'a'
+        clock.now = 40
+        assert store.get("b") is None
+        assert store.get("a") == 1
+        stats = store.stats()
+        assert stats["expirations"] == 1
+        assert (stats["hits"], stats["misses"]) == (2, 1)
+
+    def test_put_sweeps_expired_entries(self):
+        """Expired sessions are reclaimed even if never looked up again"""
+        clock = FakeClock()
+        store = SessionStore(max_entries=10, max_bytes=10**9, idle_ttl_seconds=30, clock=clock)
+        for i in range(5):
+            store.put(f"s{i}", i)
+        clock.now = 31
+        store.put("fresh", 0)
+        assert len(store) == 1
+
+
+class TestCreateChatEviction(OrchestratorTestCase):
+    """create_chat must keep working once a session has been evicted"""
+
+    def setUp(self):
+        super().setUp()
+        self.patch(mock.patch.object(orchestrator, "_sessions", SessionStore(
+            max_entries=1, max_bytes=10**9, idle_ttl_seconds=60,
+            sizer=orchestrator.estimate_session_bytes,
+        )))
+
+    def test_hit_returns_same_orchestrator(self):
+        first = orchestrator.create_chat(session_id="a")
+        assert orchestrator.create_chat(session_id="a") is first
+        assert orchestrator.get_session_stats()["hits"] == 1
+
+    def test_evicted_session_rebuilt_from_history(self):
+        chat_a = orchestrator.create_chat(session_id="a")
+        chat_a.send_message("I am 35")
+        history = [c.model_dump(exclude_none=True) for c in chat_a.get_history()]
+
+        orchestrator.create_chat(session_id="b")  # evicts 'a'
+        assert orchestrator.get_session_stats()["evictions"] == 1
+
+        rebuilt = orchestrator.create_chat(session_id="a", history=history)
+        assert rebuilt is not chat_a
+        assert [c.parts[0].text for c in rebuilt.get_history()] == ["I am 35", "echo: I am 35"]
+        assert rebuilt.send_message("hello") == "echo: hello"
+
+    def test_session_size_tracks_history(self):
+        chat = orchestrator.create_chat(session_id="a")
+        chat.send_message("x" * 100)
+        assert orchestrator.get_session_stats()["bytes"] >= 200
+
+
+
+def make_store(**kwargs):
+    return SessionStore(sizer=orchestrator.estimate_session_bytes, **kwargs)
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """Persistent history storage"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.backend = SQLiteSessionBackend(Path(tmp.name) / "sessions.sqlite3")
+
+    def history(self, n):
+        return [
+            types.Content(role="user" if i % 2 == 0 else "model", parts=[types.Part(text=f"msg {i}")])
+            for i in range(n)
+        ]
+
+    def test_roundtrip_with_tool_calls(self):
+        history = self.history(2) + [types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(name="calculate_holistic_allocation", args={"age": 35}),
+                       thought_signature=b"\xff\x00sig"),
+        ])]
+        revision = self.backend.save("s", history)
+        loaded, loaded_revision = self.backend.load("s")
+        assert loaded == history
+        assert loaded_revision == revision == 1
+
+    def test_append_and_rewrite(self):
+        self.backend.save("s", self.history(2))
+        assert self.backend.save("s", self.history(4), persisted=2, revision=1) == 2
+        assert [c.parts[0].text for c in self.backend.load("s")[0]] == ["msg 0", "msg 1", "msg 2", "msg 3"]
+        # A shorter history (e.g. compacted) replaces the stored one
+        self.backend.save("s", self.history(1), persisted=4, revision=2)
+        assert len(self.backend.load("s")[0]) == 1
+
+    def test_stale_revision_refused(self):
+        self.backend.save("s", self.history(2))
+        self.backend.save("s", self.history(4), persisted=2, revision=1)
+        with self.assertRaises(StaleSessionError):
+            self.backend.save("s", self.history(3), persisted=2, revision=1)
+        with self.assertRaises(StaleSessionError):
+            self.backend.save("s", self.history(1))  # "new" session that already exists
+        assert self.backend.load("s") == (self.history(4), 2)
+
+    def test_unknown_and_delete(self):
+        assert self.backend.load("missing") == ([], 0)
+        self.backend.save("s", self.history(2))
+        assert self.backend.delete("s")
+        assert self.backend.revision("s") == 0
+
+
+class TestPersistentSessions(OrchestratorTestCase):
+    """Sessions survive restarts and move between workers"""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.backend = SQLiteSessionBackend(Path(tmp.name) / "sessions.sqlite3")
+        self.patch(mock.patch.object(orchestrator, "_backend", self.backend))
+
+    def test_session_survives_restart(self):
+        orchestrator.create_chat(session_id="a").send_message("I am 35")
+        with mock.patch.object(orchestrator, "_sessions", make_store()):  # fresh process
+            resumed = orchestrator.create_chat(session_id="a", history=[])
+            assert [c.parts[0].text for c in resumed.get_history()] == ["I am 35", "echo: I am 35"]
+
+    def test_stale_worker_reloads(self):
+        worker_a, worker_b = make_store(), make_store()
+        with mock.patch.object(orchestrator, "_sessions", worker_a):
+            orchestrator.create_chat(session_id="a").send_message("one")
+        with mock.patch.object(orchestrator, "_sessions", worker_b):
+            orchestrator.create_chat(session_id="a").send_message("two")
+        with mock.patch.object(orchestrator, "_sessions", worker_a):
+            chat = orchestrator.create_chat(session_id="a")
+            assert len(chat.get_history()) == 4
+            chat.send_message("three")
+        assert self.backend.load("a")[0][-1].parts[0].text == "echo: three"
+
+    def test_concurrent_turns_not_interleaved(self):
+        orchestrator.create_chat(session_id="a").send_message("one")
+        with mock.patch.object(orchestrator, "_sessions", make_store()):
+            chat_b = orchestrator.create_chat(session_id="a")
+        chat_a = orchestrator.create_chat(session_id="a")
+        chat_a.send_message("two")
+        # Worker B answers from the revision it loaded; its save must not land on top of A's turn
+        chat_b.send_message("three")
+        assert [c.parts[0].text for c in self.backend.load("a")[0]] == ["one", "echo: one", "two", "echo: two"]
+        with mock.patch.object(orchestrator, "_sessions", make_store()):
+            assert len(orchestrator.create_chat(session_id="a").get_history()) == 4
+
+    async def test_same_session_saves_not_raced(self):
+        save = self.backend.save
+
+        def slow_save(*args):
+            time.sleep(0.1)
+            return save(*args)
+
+        chat = orchestrator.create_chat(session_id="a")
+        with mock.patch.object(self.backend, "save", side_effect=slow_save):
+            await asyncio.gather(chat.send_message_async("one"), chat.send_message_async("two"))
+        assert len(self.backend.load("a")[0]) == 4
+        assert orchestrator._sessions.get("a") is chat
+
+    def test_clear_session_removes_persisted_copy(self):
+        orchestrator.create_chat(session_id="a").send_message("hi")
+        assert orchestrator.clear_session("a")
+        assert self.backend.revision("a") == 0
+
+
+class TestSessionEndpoints(OrchestratorTestCase):
+    """GET /sessions and DELETE /session/{id} need the admin key"""
+
+    def setUp(self):
+        super().setUp()
+        self.patch(mock.patch.object(profiling, "PROFILE_ADMIN_KEY", "secret"))
+        orchestrator.create_chat(session_id="a")
+
+    async def test_requires_admin_key(self):
+        async with self.http() as http:
+            assert (await http.get("/sessions")).status_code == 403
+            assert (await http.delete("/session/a", headers={"X-Admin-Key": "nope"})).status_code == 403
+            with mock.patch.object(profiling, "PROFILE_ADMIN_KEY", ""):
+                assert (await http.delete("/session/a")).status_code == 404
+        assert orchestrator.get_session_stats()["entries"] == 1
+
+    async def test_admin_can_list_and_delete(self):
+        admin = {"X-Admin-Key": "secret"}
+        async with self.http() as http:
+            assert (await http.get("/sessions", headers=admin)).json()["entries"] == 1
+            assert (await http.delete("/session/a", headers=admin)).json() == {"status": "deleted", "session_id": "a"}
+            assert (await http.delete("/session/a", headers=admin)).status_code == 404
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+test_tool_calls.py
+
+Checks that every function call in a model turn is executed, concurrently and
+with per-tool timeouts, that the results go back in one message, and that tool
+loops are capped. Runs against the offline fake client.
+"""
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.genai import types
+
+from execution import orchestrator
+from tests.fake_genai import OrchestratorTestCase, echo_responder, text_response
+from tests.test_orchestrator import CONFIRMED_ARGS
+
+
+def slow_tool(value: int, seconds: float = 0.2) -> dict:
+    time.sleep(seconds)
+    return {"value": value * 2}
+
+
+def calls_response(*calls) -> types.GenerateContentResponse:
+    """A model turn requesting several tool calls at once."""
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(name=name, args=args)) for name, args in calls
+        ]),
+        finish_reason=types.FinishReason.STOP,
+    )])
+
+
+def multi_responder(contents, config):
+    parts = contents[-1].parts or []
+    results = [p.function_response for p in parts if p.function_response]
+    if results:
+        return text_response(" | ".join(f"{r.name}={r.response}" for r in results))
+    text = "".join(p.text or "" for p in parts)
+    if text == "both":
+        return calls_response(("slow_tool", {"value": 1}), ("slow_tool", {"value": 2}))
+    if text == "loop":
+        return calls_response(("slow_tool", {"value": 0, "seconds": 0}))
+    if text == "report":
+        return calls_response(("calculate_holistic_allocation", CONFIRMED_ARGS), ("generate_ips_markdown", {"age": 35}))
+    return echo_responder(contents, config)
+
+
+class ToolCallTestCase(OrchestratorTestCase):
+
+    responder = staticmethod(multi_responder)
+
+    def setUp(self):
+        super().setUp()
+        self.patch(mock.patch.dict(orchestrator.TOOLS, {"slow_tool": slow_tool}))
+        self.chat = orchestrator.create_chat(session_id="s")
+
+    def sent_responses(self, call: int = -1) -> list:
+        return [p.function_response for p in self.client.models.calls[call]["contents"][-1].parts if p.function_response]
+
+
+class TestConcurrentCalls(ToolCallTestCase):
+
+    def test_all_calls_run_concurrently_and_answer_together(self):
+        start = time.perf_counter()
+        reply = self.chat.send_message("both")
+        elapsed = time.perf_counter() - start
+        assert reply == "slow_tool={'value': 2} | slow_tool={'value': 4}"
+        assert elapsed < 0.35, f"Tool calls ran serially ({elapsed:.2f}s)"
+        # One model round trip for the request, one for both results
+        assert len(self.client.models.calls) == 2
+        assert len(self.sent_responses()) == 2
+
+    def test_streamed_turn_runs_all_calls(self):
+        assert "".join(self.chat.stream_message("both")) == "slow_tool={'value': 2} | slow_tool={'value': 4}"
+
+    def test_per_tool_timeout(self):
+        with mock.patch.dict(orchestrator.TOOL_TIMEOUTS, {"slow_tool": 0.05}):
+            reply = self.chat.send_message("both")
+        assert reply == "I encountered an error while calculating: slow_tool timed out after 0.05s"
+
+    def test_partial_failure_reported_to_model(self):
+        with mock.patch.dict(orchestrator.TOOLS, {"slow_tool": lambda value: {"value": 1 / (value - 1)}}):
+            self.chat.send_message("both")
+        first, second = self.sent_responses()
+        assert first.response["status"] == "error" and "division by zero" in first.response["message"]
+        assert second.response == {"value": 1.0}
+
+    def test_ips_shown_when_requested_with_other_calls(self):
+        reply = self.chat.send_message("report")
+        assert reply.startswith("# Investment Policy Statement")
+        assert "| **3. Age** | **35** |" in reply
+        names = [r.name for r in self.sent_responses()]
+        assert names == ["calculate_holistic_allocation", "generate_ips_markdown"]
+        assert len(self.client.models.calls) == 2
+
+
+class TestToolLoopCap(ToolCallTestCase):
+
+    @staticmethod
+    def responder(contents, config):
+        # Always asks for another tool call
+        return calls_response(("slow_tool", {"value": 0, "seconds": 0}))
+
+    def test_loop_is_capped(self):
+        reply = self.chat.send_message("loop")
+        assert reply == "I'm sorry, I couldn't complete that request. Could you rephrase it?"
+        assert len(self.client.models.calls) == orchestrator.MAX_TOOL_ROUNDS
+
+
+if __name__ == "__main__":
+    unittest.main()